@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Performance benchmarks of the XMP library.
+
+Benchmarks are not part of the test suite; each module can be run on its own, e.g.
+``python -m benchmarks.set_path`` from the repository root.
+
+:mod:`benchmarks.micro` runs the in-memory operations of the library, including the
+path writes of :mod:`benchmarks.set_path`, on packets made by the deterministic
+generator of :mod:`benchmarks.packets`, and can write its results as JSON.
+:mod:`benchmarks.fileio` measures opening, reading or modifying and closing whole
+files of each storage mode, on a corpus it builds, and :mod:`benchmarks.rewrites` the
+bytes written and the files rewritten by repeated updates with each write strategy.
+:mod:`benchmarks.regression` compares the micro-benchmarks to the baseline of
+``benchmarks/baseline.json``, and fails on regressions.
+:mod:`benchmarks.memory` checks the estimates of ``XMPMetadata.memory_report``
+against the memory actually used.
+"""
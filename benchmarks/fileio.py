@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+End-to-end benchmarks of XMP file input/output.
+
+A corpus of files is built for each storage mode of :class:`xmp.xmp.XMPFile`:
+JPEG, PNG and TIFF images with embedded packets, textual ".xmp" files, and
+arbitrary files with sidecar files. Each file of the corpus is then opened,
+read or modified, and closed, first with the corpus evicted from the page cache,
+then again with a warm cache.
+
+Throughputs, latency percentiles, and the bytes and read/write system calls of
+the process are reported; the latter are taken from ``/proc/self/io``, and are
+only available on Linux.
+
+:Example:
+
+>>> python -m benchmarks.fileio --count 100 --shape medium --output results.json
+"""
+
+# Standard Library
+import argparse
+import collections
+import ctypes
+import ctypes.util
+import datetime
+import json
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import timeit
+import zlib
+# Xmp
+from xmp.xmp import XMPFile
+from . import packets
+from . import stats
+
+# ──────
+# Corpus
+
+EMBEDDED = "embedded"
+TEXTUAL = "textual"
+SIDECAR = "sidecar"
+
+def jpegImage():
+	""" Returns a minimal 1x1 grey baseline JPEG image """
+	def segment(marker, payload):
+		return struct.pack(">BBH", 0xFF, marker, len(payload) + 2) + payload
+	one_symbol_table = struct.pack(">16B", 1, *[0]*15) + "\x00"
+	return ("\xFF\xD8"
+	        + segment(0xE0, "JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00")
+	        + segment(0xDB, "\x00" + "\x01"*64)
+	        + segment(0xC0, "\x08\x00\x01\x00\x01\x01\x01\x11\x00")
+	        + segment(0xC4, "\x00" + one_symbol_table)
+	        + segment(0xC4, "\x10" + one_symbol_table)
+	        + segment(0xDA, "\x01\x01\x00\x00\x3F\x00")
+	        + "\x3F"  # DC difference 0, end of block, padding bits
+	        + "\xFF\xD9")
+
+def pngImage():
+	""" Returns a minimal 1x1 grey PNG image """
+	def chunk(kind, data):
+		return (struct.pack(">I", len(data)) + kind + data
+		        + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+	return ("\x89PNG\r\n\x1A\n"
+	        + chunk("IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 0, 0, 0, 0))
+	        + chunk("IDAT", zlib.compress("\x00\x80"))
+	        + chunk("IEND", ""))
+
+def tiffImage():
+	""" Returns a minimal 1x1 grey uncompressed TIFF image """
+	SHORT, LONG = 3, 4
+	entries = [(256, SHORT, 1), (257, SHORT, 1), (258, SHORT, 8), (259, SHORT, 1),
+	           (262, SHORT, 1), (273, LONG, None), (277, SHORT, 1), (278, SHORT, 1),
+	           (279, LONG, 1)]
+	pixels_offset = 8 + 2 + 12*len(entries) + 4
+	ifd = struct.pack("<H", len(entries))
+	for tag, kind, value in entries:
+		ifd += struct.pack("<HHII", tag, kind, 1, pixels_offset if value is None else value)
+	return "II*\x00" + struct.pack("<I", 8) + ifd + struct.pack("<I", 0) + "\x80"
+
+# Kinds of corpus files: their storage mode, extension, and contents maker
+KINDS = collections.OrderedDict([
+	("jpeg",    (EMBEDDED, ".jpg", jpegImage)),
+	("png",     (EMBEDDED, ".png", pngImage)),
+	("tiff",    (EMBEDDED, ".tif", tiffImage)),
+	("xmp",     (TEXTUAL,  ".xmp", None)),
+	("sidecar", (SIDECAR,  ".bin", None)),
+])
+
+def buildCorpus(directory, kinds, count, shape, seed = 0, file_size = 4096):
+	"""
+	Builds a corpus of files holding generated XMP packets.
+
+	Arguments:
+		directory: Where to create the files
+		kinds:     Kinds of files to create, among :data:`KINDS`
+		count:     Number of files of each kind
+		shape:     The :class:`benchmarks.packets.Shape` of the packets
+		seed:      The seed of the packet generator, and of the sidecar files' contents
+		file_size: The size of the arbitrary files annotated with sidecar files
+
+	Returns:
+		A mapping from kinds to the sorted paths of their files.
+	"""
+	packet = packets.generatePacket(shape, seed)
+	serialized_packet = packet.serialize_to_str().encode("utf-8")
+	rng = random.Random(seed)
+	corpus = collections.OrderedDict()
+	for kind in kinds:
+		mode, extension, makeContents = KINDS[kind]
+		corpus[kind] = []
+		for i in range(count):
+			file_path = os.path.join(directory, "{}{:06d}{}".format(kind, i, extension))
+			if mode == EMBEDDED:
+				with open(file_path, "wb") as file_handle:
+					file_handle.write(makeContents())
+				with XMPFile(file_path, rw = True, sidecar = False) as xmp_file:
+					xmp_file.libxmp_metadata = packet
+			elif mode == TEXTUAL:
+				with open(file_path, "wb") as file_handle:
+					file_handle.write(serialized_packet)
+			else:
+				with open(file_path, "wb") as file_handle:
+					file_handle.write("".join(chr(rng.getrandbits(8)) for _ in range(file_size)))
+				with open(file_path + ".xmp", "wb") as file_handle:
+					file_handle.write(serialized_packet)
+			corpus[kind].append(file_path)
+	return corpus
+
+# ────────────
+# System state
+
+POSIX_FADV_DONTNEED = 4
+
+def evict(file_paths):
+	"""
+	Evicts files, and their sidecar files, from the page cache.
+
+	Returns:
+		Whether the files could be evicted; posix_fadvise is needed.
+	"""
+	try:
+		fadvise = ctypes.CDLL(ctypes.util.find_library("c"), use_errno = True).posix_fadvise
+	except (OSError, AttributeError):
+		return False
+	fadvise.argtypes = [ctypes.c_int, ctypes.c_int64, ctypes.c_int64, ctypes.c_int]
+	for file_path in file_paths:
+		for path in [file_path, file_path + ".xmp"]:
+			if not os.path.exists(path):
+				continue
+			descriptor = os.open(path, os.O_RDONLY)
+			try:
+				os.fsync(descriptor)
+				if fadvise(descriptor, 0, 0, POSIX_FADV_DONTNEED) != 0:
+					return False
+			finally:
+				os.close(descriptor)
+	return True
+
+def ioCounters():
+	"""
+	Returns the I/O counters of the process, or None where /proc/self/io is missing
+
+	Counters are the bytes read and written through system calls ("rchar" and
+	"wchar"), the read and write system calls ("syscr" and "syscw"), and the bytes
+	actually fetched from or sent to storage ("read_bytes" and "write_bytes").
+	"""
+	try:
+		with open("/proc/self/io") as io_file:
+			return {name: int(value) for name, value in (line.split(":") for line in io_file)}
+	except IOError:
+		return None
+
+# ──────────
+# Operations
+
+PHASES = ["open", "access", "close", "total"]
+
+def readFile(file_path):
+	""" Opens a file read-only, dumps the values of its packet and closes it """
+	xmp_file = XMPFile(file_path)
+	start = timeit.default_timer()
+	xmp_file.open()
+	opened = timeit.default_timer()
+	[namespace.value for namespace in xmp_file.metadata.namespaces]
+	accessed = timeit.default_timer()
+	xmp_file.close()
+	return start, opened, accessed, timeit.default_timer()
+
+def updateFile(file_path):
+	""" Opens a file for writing, modifies one value of its packet and closes it """
+	namespace_uid = packets.namespaceUids(1)[0]
+	xmp_file = XMPFile(file_path, rw = True)
+	start = timeit.default_timer()
+	xmp_file.open()
+	opened = timeit.default_timer()
+	xmp_file.metadata.set_many([((namespace_uid, "touched"), repr(start))])
+	accessed = timeit.default_timer()
+	xmp_file.close()
+	return start, opened, accessed, timeit.default_timer()
+
+OPERATIONS = collections.OrderedDict([("read", readFile), ("update", updateFile)])
+
+# ───────
+# Running
+
+def measure(operation, file_paths):
+	""" Runs an operation on files, and returns its throughput, latencies and I/O counts """
+	counters = ioCounters()
+	start = timeit.default_timer()
+	latencies = collections.defaultdict(list)
+	for file_path in file_paths:
+		t0, t1, t2, t3 = operation(file_path)
+		for phase, seconds in zip(PHASES, [t1 - t0, t2 - t1, t3 - t2, t3 - t0]):
+			latencies[phase].append(seconds)
+	seconds = timeit.default_timer() - start
+	after_counters = ioCounters()
+
+	result = collections.OrderedDict([
+		("files",          len(file_paths)),
+		("seconds",        seconds),
+		("files_per_second", len(file_paths)/seconds if seconds else None),
+		("io",             None if counters is None else
+		                   {name: after_counters[name] - value for name, value in counters.iteritems()}),
+	])
+	for phase in PHASES:
+		values = latencies[phase]
+		result[phase] = collections.OrderedDict(
+		  [(name, stats.percentile(values, fraction)) for name, fraction in [("p50", 0.5), ("p95", 0.95), ("p99", 0.99)]]
+		  + [("max", max(values))])
+	return result
+
+def runBenchmarks(corpus, operations = OPERATIONS.keys()):
+	"""
+	Runs operations on each kind of files of a corpus, with cold and warm page caches.
+
+	Returns:
+		The results, as a JSON-serializable dictionary. Cold-cache results are None
+		where files can't be evicted from the page cache.
+	"""
+	results = collections.OrderedDict()
+	for kind, file_paths in corpus.iteritems():
+		for operation in operations:
+			cold = measure(OPERATIONS[operation], file_paths) if evict(file_paths) else None
+			warm = measure(OPERATIONS[operation], file_paths)
+			results["{}/{}".format(kind, operation)] = collections.OrderedDict([
+				("mode",  KINDS[kind][0]),
+				("cold",  cold),
+				("warm",  warm),
+			])
+	return results
+
+def formatResults(results):
+	""" Returns the results as a table """
+	lines = ["{:<16} {:<5} {:>9} {:>10} {:>10} {:>10} {:>8} {:>8} {:>9} {:>9}".format(
+	         "benchmark", "cache", "files/s", "read KB", "written KB", "storage KB", "reads", "writes",
+	         "p50 ms", "p99 ms")]
+	for name, result in results.iteritems():
+		for cache in ["cold", "warm"]:
+			measures = result[cache]
+			if measures is None:
+				lines.append("{:<16} {:<5} {:>9}".format(name, cache, "n/a"))
+				continue
+			io = measures["io"] or collections.defaultdict(lambda: float("nan"))
+			lines.append("{:<16} {:<5} {:9.1f} {:10.1f} {:10.1f} {:10.1f} {:8} {:8} {:9.3f} {:9.3f}".format(
+			             name, cache, measures["files_per_second"], io["rchar"]/1024., io["wchar"]/1024.,
+			             io["read_bytes"]/1024., io["syscr"], io["syscw"],
+			             measures["total"]["p50"]*1000, measures["total"]["p99"]*1000))
+	return "\n".join(lines)
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+	parser.add_argument("--kinds", nargs = "+", choices = KINDS.keys(), default = KINDS.keys())
+	parser.add_argument("--operations", nargs = "+", choices = OPERATIONS.keys(), default = OPERATIONS.keys())
+	parser.add_argument("--count", type = int, default = 50, help = "number of files of each kind")
+	parser.add_argument("--shape", choices = packets.SHAPES.keys(), default = "small",
+	                    help = "shape of the packets of the corpus")
+	parser.add_argument("--seed", type = int, default = 0)
+	parser.add_argument("--file-size", type = int, default = 4096,
+	                    help = "size of the files annotated with sidecar files")
+	parser.add_argument("--directory", help = "where to build the corpus; a temporary directory by default")
+	parser.add_argument("-o", "--output", help = "JSON file to write the results to")
+	args = parser.parse_args(argv)
+
+	directory = args.directory or tempfile.mkdtemp(prefix = "xmp-fileio-")
+	if not os.path.isdir(directory):
+		os.makedirs(directory)
+	try:
+		shape = packets.SHAPES[args.shape]
+		corpus = buildCorpus(directory, args.kinds, args.count, shape, args.seed, args.file_size)
+		results = collections.OrderedDict([
+			("date",       datetime.datetime.utcnow().isoformat()),
+			("python",     sys.version.split()[0]),
+			("shape",      shape._asdict()),
+			("seed",       args.seed),
+			("count",      args.count),
+			("benchmarks", runBenchmarks(corpus, args.operations)),
+		])
+	finally:
+		if args.directory is None:
+			shutil.rmtree(directory)
+
+	print formatResults(results["benchmarks"])
+	if args.output:
+		with open(args.output, "w") as output:
+			json.dump(results, output, indent = 2)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Validates the memory estimates of ``XMPMetadata.memory_report``.
+
+The object tree of generated packets is built, and the memory it actually uses
+is compared to the estimate. Memory is traced with tracemalloc where available
+(Python 3, or a Python 2 patched with pytracemalloc); otherwise the growth of the
+resident set size of the process is measured, which is coarser as the interpreter
+allocates memory by arenas.
+
+:Example:
+
+>>> python -m benchmarks.memory --shapes small medium large
+"""
+
+# Standard Library
+import argparse
+import gc
+import os
+try:
+	import tracemalloc
+except ImportError:
+	tracemalloc = None
+# Xmp
+from xmp.xmp import XMPMetadata
+from . import packets
+
+def residentBytes():
+	""" Returns the resident set size of the process, from /proc/self/statm """
+	with open("/proc/self/statm") as statm:
+		return int(statm.read().split()[1])*os.sysconf("SC_PAGE_SIZE")
+
+def tracedBytes():
+	return tracemalloc.get_traced_memory()[0]
+
+def measure(shape, seed, usedBytes, copies = 10):
+	"""
+	Builds copies of the object tree of a generated packet.
+
+	The memory used by a tree is the growth of the used memory from the first copy
+	to the last, divided by the number of copies in between: the first copy may
+	reuse memory freed by the generation of the packet, and isn't counted.
+
+	Returns:
+		The memory report of the metadata, and the bytes a tree actually uses.
+	"""
+	packet = packets.generatePacket(shape, seed)
+	trees = [XMPMetadata(packet)]
+	gc.collect()
+	before = usedBytes()
+	trees.extend(XMPMetadata(packet) for _ in range(copies - 1))
+	gc.collect()
+	used = (usedBytes() - before)/(copies - 1)
+	return trees[0].memory_report(), used
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+	parser.add_argument("--shapes", nargs = "+", choices = packets.SHAPES.keys(), default = packets.SHAPES.keys())
+	parser.add_argument("--seed", type = int, default = 0)
+	parser.add_argument("--copies", type = int, default = 10, help = "number of trees built for each shape")
+	parser.add_argument("--method", choices = ["tracemalloc", "rss"],
+	                    default = "rss" if tracemalloc is None else "tracemalloc")
+	args = parser.parse_args(argv)
+
+	if args.method == "tracemalloc":
+		if tracemalloc is None:
+			parser.error("tracemalloc is not available")
+		tracemalloc.start()
+		usedBytes = tracedBytes
+	else:
+		usedBytes = residentBytes
+
+	print "{:<8} {:>9} {:>14} {:>14} {:>7}".format("shape", "elements", "estimated KB", "measured KB", "ratio")
+	for name in args.shapes:
+		report, used = measure(packets.SHAPES[name], args.seed, usedBytes, args.copies)
+		print "{:<8} {:>9} {:>14.1f} {:>14.1f} {:>7.2f}".format(
+		      name, sum(report["elements"].itervalues()), report["estimated_bytes"]/1024.,
+		      used/1024., float(report["estimated_bytes"])/used if used > 0 else float("nan"))
+
+if __name__ == "__main__":
+	main()
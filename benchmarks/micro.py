@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Micro-benchmarks of in-memory XMP packet operations.
+
+Operations run on a packet made by the synthetic generator of
+:mod:`benchmarks.packets`; results are printed, and optionally written as JSON.
+
+:Example:
+
+>>> python -m benchmarks.micro --shape medium --output results.json
+"""
+
+# Standard Library
+import argparse
+import collections
+import datetime
+import json
+import sys
+import timeit
+# Xmp
+from xmp.xmp import XMPMetadata, PathResolver
+from . import packets
+from . import set_path
+from . import stats
+
+Workload = collections.namedtuple("Workload", ["shape", "packet", "values"])
+
+# ──────────
+# Benchmarks
+
+# Each benchmark takes a workload and returns the function to time; what it does
+# before returning is setup, and is not timed. Mutations get a packet of their own.
+# Elements only weakly reference their metadata, which the timed function keeps alive.
+
+BENCHMARKS = collections.OrderedDict()
+
+def benchmark(function):
+	BENCHMARKS[function.__name__] = function
+	return function
+
+def fresh(workload):
+	return XMPMetadata(workload.packet.clone())
+
+@benchmark
+def build(workload):
+	return lambda: XMPMetadata(workload.packet)
+
+@benchmark
+def read_leaves(workload):
+	metadata = XMPMetadata(workload.packet)
+	leaves = packets.pathsOfKind(workload.values, "value")
+	return lambda: metadata.get_many(leaves)
+
+@benchmark
+def read_elements(workload):
+	metadata = XMPMetadata(workload.packet)
+	leaves = packets.pathsOfKind(workload.values, "value")
+	def run():
+		resolver = PathResolver(metadata)
+		for uid, path in leaves:
+			resolver.get(uid, path).value
+	return run
+
+@benchmark
+def dump_values(workload):
+	metadata = XMPMetadata(workload.packet)
+	return lambda: [namespace.value for namespace in metadata.namespaces]
+
+@benchmark
+def set_leaves(workload):
+	metadata = fresh(workload)
+	leaves = packets.pathsOfKind(workload.values, "value")
+	return lambda: metadata.set_many((path, u"updated") for path in leaves)
+
+@benchmark
+def set_struct_fields(workload):
+	metadata = fresh(workload)
+	structs = packets.pathsOfKind(workload.values, "struct")
+	return lambda: metadata.set_many(((uid, path + "/added"), u"added") for uid, path in structs)
+
+@benchmark
+def append_array_items(workload):
+	metadata = fresh(workload)
+	resolver = PathResolver(metadata)
+	arrays = [resolver.get(uid, path) for uid, path in packets.pathsOfKind(workload.values, "array")]
+	def run():
+		for array in arrays:
+			array.append(u"appended")
+		return metadata
+	return run
+
+@benchmark
+def add_set_items(workload):
+	metadata = fresh(workload)
+	resolver = PathResolver(metadata)
+	sets = [resolver.get(uid, path) for uid, path in packets.pathsOfKind(workload.values, "set")]
+	def run():
+		for element in sets:
+			element.add(u"added")
+		return metadata
+	return run
+
+@benchmark
+def textualize(workload):
+	metadata = XMPMetadata(workload.packet)
+	return lambda: unicode(metadata)
+
+@benchmark
+def serialize(workload):
+	return lambda: workload.packet.serialize_to_str()
+
+@benchmark
+def serialize_formatted(workload):
+	metadata = XMPMetadata(workload.packet)
+	return lambda: metadata.xml()
+
+@benchmark
+def export_dict(workload):
+	metadata = XMPMetadata(workload.packet)
+	return lambda: metadata.to_dict()
+
+@benchmark
+def import_dict(workload):
+	values = XMPMetadata(workload.packet).to_dict()
+	return lambda: XMPMetadata.from_dict(values)
+
+def pathWrites(function, size):
+	""" Adapts a :mod:`benchmarks.set_path` benchmark, sized from the workload shape """
+	def setup(workload):
+		return lambda: function(getattr(workload.shape, size))
+	return setup
+
+for function in set_path.DEEP_BENCHMARKS:
+	BENCHMARKS["path_" + function.__name__] = pathWrites(function, "depth")
+for function in set_path.WIDE_BENCHMARKS:
+	BENCHMARKS["path_" + function.__name__] = pathWrites(function, "width")
+
+# ───────
+# Running
+
+def measure(setup, workload, repeat):
+	""" Returns the times in seconds of repeat runs of a benchmark, each after its own setup """
+	times = []
+	for _ in range(repeat):
+		run = setup(workload)
+		start = timeit.default_timer()
+		run()
+		times.append(timeit.default_timer() - start)
+	return times
+
+def runBenchmarks(shape, seed = 0, repeat = 5, names = None):
+	"""
+	Runs benchmarks on a generated packet.
+
+	Arguments:
+		shape:  The :class:`benchmarks.packets.Shape` of the packet
+		seed:   The seed of the packet generator
+		repeat: The number of runs of each benchmark
+		names:  The names of the benchmarks to run; all of them by default
+
+	Returns:
+		The results, as a JSON-serializable dictionary.
+	"""
+	values = packets.generateValues(shape, seed)
+	workload = Workload(shape, packets.generatePacket(shape, seed), values)
+	results = collections.OrderedDict()
+	for name in (names or BENCHMARKS):
+		times = measure(BENCHMARKS[name], workload, repeat)
+		results[name] = stats.summarize(times)
+		results[name]["times"] = times
+	return collections.OrderedDict([
+		("date",       datetime.datetime.utcnow().isoformat()),
+		("python",     sys.version.split()[0]),
+		("shape",      shape._asdict()),
+		("seed",       seed),
+		("elements",   sum(1 for _ in packets.iterPaths(values))),
+		("repeat",     repeat),
+		("benchmarks", results),
+	])
+
+def formatResults(results):
+	""" Returns the results as a table of minimum and median times """
+	lines = []
+	for name, result in results["benchmarks"].iteritems():
+		lines.append("{:<26} min {:10.3f} ms   median {:10.3f} ms".format(name, result["min"]*1000,
+		                                                                   result["median"]*1000))
+	return "\n".join(lines)
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+	parser.add_argument("--shape", choices = packets.SHAPES.keys(), default = "medium",
+	                    help = "packet shape preset, refined by the options below")
+	for field in packets.Shape._fields:
+		parser.add_argument("--" + field.replace("_", "-"), type = int)
+	parser.add_argument("--seed", type = int, default = 0)
+	parser.add_argument("--repeat", type = int, default = 5)
+	parser.add_argument("-b", "--benchmark", dest = "names", action = "append",
+	                    choices = BENCHMARKS.keys(), help = "benchmark to run (repeatable); all by default")
+	parser.add_argument("-o", "--output", help = "JSON file to write the results to")
+	args = parser.parse_args(argv)
+
+	shape = packets.SHAPES[args.shape]._replace(**{f:getattr(args, f) for f in packets.Shape._fields
+	                                               if getattr(args, f) is not None})
+	results = runBenchmarks(shape, args.seed, args.repeat, args.names)
+	print "{} elements, shape {}".format(results["elements"], dict(shape._asdict()))
+	print formatResults(results)
+	if args.output:
+		with open(args.output, "w") as output:
+			json.dump(results, output, indent = 2)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Deterministic generator of synthetic XMP packets.
+
+Packets are shaped by their number of namespaces, the depth of their trees, the
+number of fields of their structures, the length of their arrays and sets and the
+size of their values. The same shape and seed always generate the same packet.
+"""
+
+# Standard Library
+import collections
+import random
+import string
+# Xmp
+from xmp.xmp import XMPMetadata, appendStep, registerNamespace
+
+Shape = collections.namedtuple("Shape", ["namespaces", "depth", "width", "array_length", "value_size"])
+
+SHAPES = collections.OrderedDict([
+	("small",  Shape(namespaces = 1, depth = 2, width = 4, array_length = 4, value_size = 8)),
+	("medium", Shape(namespaces = 2, depth = 3, width = 6, array_length = 4, value_size = 32)),
+	("large",  Shape(namespaces = 4, depth = 4, width = 6, array_length = 6, value_size = 128)),
+])
+
+NAMESPACE_URI = u"http://benchmark.xmp/packets/{}/"
+NAMESPACE_PREFIX = "pkt{}"
+
+VALUE_CHARACTERS = string.ascii_letters + string.digits
+
+def namespaceUids(count):
+	""" Registers and returns the uids of the first count benchmark namespaces """
+	uids = []
+	for i in range(count):
+		uid = NAMESPACE_URI.format(i)
+		registerNamespace(uid, NAMESPACE_PREFIX.format(i))
+		uids.append(uid)
+	return uids
+
+# ──────────
+# Generation
+
+def generateValues(shape, seed = 0):
+	"""
+	Generates the values of a packet.
+
+	Each namespace has shape.width top-level properties. Each property is a value,
+	an array or a set of shape.array_length values, or, above the last level of
+	depth, a structure of shape.width properties or an array of such structures.
+	The number of elements grows exponentially with the depth: from tens for the
+	"small" shape to tens of thousands for the "large" one.
+
+	Arguments:
+		shape: The :class:`Shape` of the packet
+		seed:  The seed of the pseudo-random choices of kinds and values
+
+	Returns:
+		An ordered mapping from (namespace uid, property name) pairs to values, as
+		accepted by :meth:`XMPMetadata.set_many`; structures are ordered mappings,
+		arrays are lists and sets are sets.
+	"""
+	rng = random.Random(seed)
+
+	def text():
+		return u"".join(rng.choice(VALUE_CHARACTERS) for _ in range(shape.value_size))
+
+	def struct(depth):
+		return collections.OrderedDict(("f%d"%i, element(depth)) for i in range(shape.width))
+
+	def element(depth):
+		kinds = ["value", "array", "set"] + (["struct", "struct_array"] if depth > 1 else [])
+		kind = rng.choice(kinds)
+		if kind == "value":
+			return text()
+		elif kind == "array":
+			return [text() for _ in range(shape.array_length)]
+		elif kind == "set":
+			return set(text() for _ in range(shape.array_length))
+		elif kind == "struct":
+			return struct(depth - 1)
+		else:
+			return [struct(depth - 1) for _ in range(shape.array_length)]
+
+	values = collections.OrderedDict()
+	for uid in namespaceUids(shape.namespaces):
+		for name, value in struct(shape.depth).iteritems():
+			values[(uid, name)] = value
+	return values
+
+def generatePacket(shape, seed = 0):
+	"""
+	Generates a packet.
+
+	Returns:
+		The libxmp packet of the values generated by :func:`generateValues`.
+	"""
+	metadata = XMPMetadata()
+	metadata.set_many(generateValues(shape, seed))
+	return metadata.libxmp_metadata
+
+# ──────────
+# Inspection
+
+def iterPaths(values):
+	"""
+	Iterates over the elements of generated values.
+
+	Yields:
+		(namespace uid, path, kind) tuples, parents before their children, where
+		kind is "value", "struct", "array" or "set" as in :func:`xmp.xmp.elementKind`.
+	"""
+	def walk(uid, path, value):
+		if isinstance(value, collections.Mapping):
+			yield uid, path, "struct"
+			for name, child in value.iteritems():
+				for item in walk(uid, appendStep(path, name), child):
+					yield item
+		elif isinstance(value, list):
+			yield uid, path, "array"
+			for i, child in enumerate(value):
+				for item in walk(uid, appendStep(path, i + 1), child):
+					yield item
+		elif isinstance(value, set):
+			yield uid, path, "set"
+		else:
+			yield uid, path, "value"
+
+	for (uid, name), value in values.iteritems():
+		for item in walk(uid, name, value):
+			yield item
+
+def pathsOfKind(values, kind):
+	""" Returns the (namespace uid, path) pairs of the elements of a kind in generated values """
+	return [(uid, path) for uid, path, element_kind in iterPaths(values) if element_kind == kind]
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Performance regression gate.
+
+Runs the micro-benchmarks of :mod:`benchmarks.micro` several times, and compares
+their median times to those of a baseline. The command exits with status 1 if
+any benchmark regressed. Benchmarks without statistics in the baseline are
+skipped with a warning, unless ``--require-baseline`` is given, which makes them
+fail the gate too.
+
+A benchmark regresses when its median time exceeds the baseline's by more than
+its tolerance, a fraction of the baseline median, and by more than three median
+absolute deviations, so that noisy benchmarks don't fail the gate on noise alone.
+
+The baseline is a JSON file holding the settings of the runs (packet shape,
+seed, repeat and runs), a default tolerance, and per-benchmark tolerances and
+statistics. ``--update`` records the current statistics in the baseline, keeping
+its settings and tolerances. Statistics depend on the machine and the libxmp
+build, so the committed baseline holds none: record them on the machine running
+the gate, then pass ``--require-baseline`` there.
+
+:Example:
+
+>>> python -m benchmarks.regression --update
+>>> python -m benchmarks.regression
+"""
+
+# Standard Library
+import argparse
+import collections
+import json
+import os
+import sys
+# Xmp
+from . import micro
+from . import packets
+from . import stats
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "baseline.json")
+
+NOISE_DEVIATIONS = 3
+
+OK = "ok"
+REGRESSED = "REGRESSED"
+IMPROVED = "improved"
+UNKNOWN = "skipped"
+
+# ───────
+# Running
+
+def runBenchmarks(shape, seed, repeat, runs, names = None):
+	"""
+	Runs the micro-benchmarks several times.
+
+	Returns:
+		An ordered mapping from benchmark names to the statistics of all their times.
+	"""
+	times = collections.OrderedDict()
+	for _ in range(runs):
+		results = micro.runBenchmarks(shape, seed, repeat, names)
+		for name, result in results["benchmarks"].iteritems():
+			times.setdefault(name, []).extend(result["times"])
+	return collections.OrderedDict((name, stats.summarize(values)) for name, values in times.iteritems())
+
+# ──────────
+# Comparison
+
+def compare(baseline, current):
+	"""
+	Compares statistics to a baseline.
+
+	Arguments:
+		baseline: The baseline, as loaded from its JSON file
+		current:  The statistics of the benchmarks, as returned by :func:`runBenchmarks`
+
+	Returns:
+		A list of (name, baseline statistics or None, current statistics, relative
+		delta of the medians or None, tolerance, status) tuples.
+	"""
+	comparisons = []
+	for name, statistics in current.iteritems():
+		reference = baseline["benchmarks"].get(name, {})
+		tolerance = reference.get("tolerance", baseline["default_tolerance"])
+		if reference.get("median") is None:
+			comparisons.append((name, None, statistics, None, tolerance, UNKNOWN))
+			continue
+
+		difference = statistics["median"] - reference["median"]
+		delta = difference/reference["median"]
+		noise = NOISE_DEVIATIONS*max(reference["mad"], statistics["mad"])
+		if delta > tolerance and difference > noise:
+			status = REGRESSED
+		elif delta < -tolerance and -difference > noise:
+			status = IMPROVED
+		else:
+			status = OK
+		comparisons.append((name, reference, statistics, delta, tolerance, status))
+	return comparisons
+
+def formatComparisons(comparisons):
+	""" Returns the comparisons as a table of medians, 95th percentiles and deltas """
+	lines = ["{:<26} {:>12} {:>12} {:>12} {:>9} {:>9}  {}".format(
+	         "benchmark", "base median", "median", "p95", "delta", "tolerance", "status")]
+	for name, reference, statistics, delta, tolerance, status in comparisons:
+		lines.append("{:<26} {:>12} {:>9.3f} ms {:>9.3f} ms {:>9} {:>8.0f}%  {}".format(
+		             name,
+		             "-" if reference is None else "{:.3f} ms".format(reference["median"]*1000),
+		             statistics["median"]*1000,
+		             statistics["p95"]*1000,
+		             "-" if delta is None else "{:+.1f}%".format(delta*100),
+		             tolerance*100,
+		             status))
+	return "\n".join(lines)
+
+def updateBaseline(baseline, current):
+	""" Records the current statistics in a baseline, keeping its tolerances """
+	for name, statistics in current.iteritems():
+		reference = baseline["benchmarks"].setdefault(name, collections.OrderedDict())
+		reference.update((key, statistics[key]) for key in ["median", "mad", "p95"])
+
+# ───────
+# Baseline
+
+def loadBaseline(path):
+	with open(path) as baseline_file:
+		return json.load(baseline_file, object_pairs_hook = collections.OrderedDict)
+
+def saveBaseline(baseline, path):
+	with open(path, "w") as baseline_file:
+		json.dump(baseline, baseline_file, indent = 2, separators = (",", ": "))
+		baseline_file.write("\n")
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+	parser.add_argument("--baseline", default = DEFAULT_BASELINE_PATH, help = "baseline JSON file")
+	parser.add_argument("--runs", type = int, help = "number of runs of the benchmarks; from the baseline by default")
+	parser.add_argument("-b", "--benchmark", dest = "names", action = "append",
+	                    choices = micro.BENCHMARKS.keys(), help = "benchmark to run (repeatable); all by default")
+	parser.add_argument("--update", action = "store_true",
+	                    help = "record the current statistics in the baseline instead of failing on regressions")
+	parser.add_argument("--require-baseline", action = "store_true",
+	                    help = "fail on benchmarks without statistics in the baseline instead of skipping them")
+	args = parser.parse_args(argv)
+
+	baseline = loadBaseline(args.baseline)
+	settings = baseline["settings"]
+	current = runBenchmarks(packets.SHAPES[settings["shape"]], settings["seed"], settings["repeat"],
+	                        args.runs or settings["runs"], args.names)
+	comparisons = compare(baseline, current)
+	print formatComparisons(comparisons)
+
+	if args.update:
+		updateBaseline(baseline, current)
+		saveBaseline(baseline, args.baseline)
+		print "Baseline {} updated".format(args.baseline)
+		return
+
+	regressions = [c[0] for c in comparisons if c[-1] == REGRESSED]
+	missing = [c[0] for c in comparisons if c[-1] == UNKNOWN]
+	if regressions:
+		print "{} benchmark(s) regressed: {}".format(len(regressions), ", ".join(regressions))
+	if missing:
+		sys.stderr.write("warning: {} benchmark(s) have no baseline, record it with --update: {}\n"
+		                 .format(len(missing), ", ".join(missing)))
+	if regressions or (missing and args.require_baseline):
+		sys.exit(1)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Benchmarks of the bytes written and the files rewritten by repeated XMP updates.
+
+The files of a corpus built by :mod:`benchmarks.fileio` are first written with
+each write strategy, i.e. a set of serialization options of
+:class:`xmp.xmp.XMPFile`, then updated several times with a value growing at each
+update. Each update either fits in the current packet of a file, and is written in
+place, or rewrites the file; a file counts as rewritten when its inode or size
+changes.
+
+The bytes written through system calls are taken from ``/proc/self/io``, and are
+only available on Linux. Strategies only change the packets serialized by the
+library, i.e. of sidecar and textual files; embedded packets are laid out by the
+file handlers of libxmp.
+
+:Example:
+
+>>> python -m benchmarks.rewrites --count 100 --updates 20 --kinds sidecar xmp
+"""
+
+# Standard Library
+import argparse
+import collections
+import datetime
+import json
+import os
+import shutil
+import sys
+import tempfile
+# Xmp
+from xmp.xmp import XMPFile
+from . import fileio
+from . import packets
+
+# ──────────
+# Strategies
+
+def strategies(padding):
+	""" Returns the write strategies, with the padding of the padded ones """
+	return collections.OrderedDict([
+		("default",         {}),
+		("compact",         {"compact": True}),
+		("in_place",        {"in_place": True}),
+		("padded",          {"padding": padding}),
+		("padded_in_place", {"padding": padding, "in_place": True}),
+	])
+
+def metadataPath(kind, file_path):
+	""" Returns the path of the file holding the packet of a corpus file """
+	return file_path + ".xmp" if fileio.KINDS[kind][0] == fileio.SIDECAR else file_path
+
+def identity(file_path):
+	return os.stat(file_path).st_ino, os.path.getsize(file_path)
+
+def update(file_path, options, value):
+	""" Sets a value in the packet of a file, written with the given options """
+	namespace_uid = packets.namespaceUids(1)[0]
+	with XMPFile(file_path, rw = True, **options) as xmp_file:
+		xmp_file.metadata.set_many([((namespace_uid, "edit"), value)])
+
+# ───────
+# Running
+
+def measure(kind, file_paths, options, updates, growth):
+	"""
+	Writes files with a strategy, then updates them.
+
+	Returns:
+		The bytes written and the number of rewritten files by update, and the size
+		of the packet files after the last update.
+	"""
+	metadata_paths = [metadataPath(kind, file_path) for file_path in file_paths]
+	for file_path in file_paths:
+		update(file_path, options, "")
+
+	rounds = []
+	for i in range(1, updates + 1):
+		identities = [identity(path) for path in metadata_paths]
+		counters = fileio.ioCounters()
+		for file_path in file_paths:
+			update(file_path, options, "x" * (i * growth))
+		after_counters = fileio.ioCounters()
+		rounds.append(collections.OrderedDict([
+			("bytes_written", None if counters is None else after_counters["wchar"] - counters["wchar"]),
+			("rewrites",      sum(1 for path, before in zip(metadata_paths, identities)
+			                      if identity(path) != before)),
+		]))
+
+	return collections.OrderedDict([
+		("files",         len(file_paths)),
+		("updates",       rounds),
+		("bytes_written", None if rounds and rounds[0]["bytes_written"] is None
+		                  else sum(r["bytes_written"] for r in rounds)),
+		("rewrite_rate",  float(sum(r["rewrites"] for r in rounds))/(len(file_paths)*updates)
+		                  if file_paths and updates else None),
+		("storage_bytes", sum(os.path.getsize(path) for path in metadata_paths)),
+	])
+
+def runBenchmarks(directory, kinds, count, shape, seed, write_strategies, updates, growth):
+	"""
+	Runs the updates of each write strategy on a fresh corpus.
+
+	Returns:
+		The results, as a JSON-serializable dictionary.
+	"""
+	results = collections.OrderedDict()
+	for strategy, options in write_strategies.iteritems():
+		strategy_directory = os.path.join(directory, strategy)
+		os.makedirs(strategy_directory)
+		corpus = fileio.buildCorpus(strategy_directory, kinds, count, shape, seed)
+		for kind, file_paths in corpus.iteritems():
+			result = measure(kind, file_paths, options, updates, growth)
+			result["mode"] = fileio.KINDS[kind][0]
+			results["{}/{}".format(kind, strategy)] = result
+	return results
+
+def formatResults(results):
+	""" Returns the results as a table """
+	lines = ["{:<24} {:>14} {:>10} {:>14}".format(
+	         "benchmark", "written B/file", "rewrites %", "stored B/file")]
+	for name, result in results.iteritems():
+		written = result["bytes_written"]
+		lines.append("{:<24} {:>14} {:10.1f} {:14.1f}".format(
+		             name,
+		             "n/a" if written is None else "{:.1f}".format(float(written)/(result["files"]*len(result["updates"]))),
+		             result["rewrite_rate"]*100,
+		             float(result["storage_bytes"])/result["files"]))
+	return "\n".join(lines)
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+	parser.add_argument("--kinds", nargs = "+", choices = fileio.KINDS.keys(), default = fileio.KINDS.keys())
+	parser.add_argument("--strategies", nargs = "+", choices = strategies(0).keys(),
+	                    default = strategies(0).keys())
+	parser.add_argument("--count", type = int, default = 20, help = "number of files of each kind")
+	parser.add_argument("--updates", type = int, default = 10, help = "number of updates of each file")
+	parser.add_argument("--growth", type = int, default = 256,
+	                    help = "bytes by which the updated value grows at each update")
+	parser.add_argument("--padding", type = int, default = 8192,
+	                    help = "padding of the packets of the padded strategies")
+	parser.add_argument("--shape", choices = packets.SHAPES.keys(), default = "small",
+	                    help = "shape of the packets of the corpus")
+	parser.add_argument("--seed", type = int, default = 0)
+	parser.add_argument("--directory", help = "where to build the corpora; a temporary directory by default")
+	parser.add_argument("-o", "--output", help = "JSON file to write the results to")
+	args = parser.parse_args(argv)
+
+	directory = args.directory or tempfile.mkdtemp(prefix = "xmp-rewrites-")
+	if not os.path.isdir(directory):
+		os.makedirs(directory)
+	write_strategies = collections.OrderedDict((name, options)
+	                                           for name, options in strategies(args.padding).iteritems()
+	                                           if name in args.strategies)
+	try:
+		shape = packets.SHAPES[args.shape]
+		results = collections.OrderedDict([
+			("date",       datetime.datetime.utcnow().isoformat()),
+			("python",     sys.version.split()[0]),
+			("shape",      shape._asdict()),
+			("seed",       args.seed),
+			("count",      args.count),
+			("growth",     args.growth),
+			("padding",    args.padding),
+			("benchmarks", runBenchmarks(directory, args.kinds, args.count, shape, args.seed,
+			                             write_strategies, args.updates, args.growth)),
+		])
+	finally:
+		if args.directory is None:
+			shutil.rmtree(directory)
+
+	print formatResults(results["benchmarks"])
+	if args.output:
+		with open(args.output, "w") as output:
+			json.dump(results, output, indent = 2)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Benchmarks deep and wide property path writes.
+
+Deep writes set one property at the end of a long path of nested structs and
+arrays; wide writes set many sibling properties of a single struct. Both are
+measured through ``XMPNamespace.set_path``, through chained attribute assignment
+of virtual elements, and, for wide writes, through ``XMPMetadata.set_many``.
+"""
+
+# Standard Library
+import argparse
+import timeit
+# Xmp
+from xmp.xmp import XMPMetadata, registerNamespace
+
+BENCHMARK_NS = u"http://benchmark.xmp/1"
+registerNamespace(BENCHMARK_NS, "bench")
+
+# ───────────
+# Path makers
+
+def deepPath(depth):
+	"""
+	Returns a path alternating struct fields and array items, of the given depth
+
+	e.g. deepPath(4) == "s0/a1[2]/s2/a3[2]"
+	"""
+	return "/".join("s%d"%i if i%2 == 0 else "a%d[2]"%i for i in range(depth))
+
+def deepSteps(depth):
+	""" Returns the Python keys of deepPath(depth), to chain virtual elements. """
+	steps = []
+	for i in range(depth):
+		if i%2 == 0:
+			steps.append("s%d"%i)
+		else:
+			steps.extend(["a%d"%i, 1])
+	return steps
+
+# ──────────
+# Benchmarks
+
+def deepSetPath(depth):
+	metadata = XMPMetadata()
+	metadata[BENCHMARK_NS].set_path(deepPath(depth), "value")
+
+def deepVirtual(depth):
+	metadata = XMPMetadata()
+	element = metadata[BENCHMARK_NS]
+	steps = deepSteps(depth)
+	for step in steps[:-1]:
+		element = getattr(element, step) if isinstance(step, basestring) else element[step]
+	if isinstance(steps[-1], basestring):
+		setattr(element, steps[-1], "value")
+	else:
+		element[steps[-1]].__set__(element, "value")
+
+def wideSetPath(width):
+	metadata = XMPMetadata()
+	namespace = metadata[BENCHMARK_NS]
+	for i in range(width):
+		namespace.set_path("wide/f%d"%i, i)
+
+def wideVirtual(width):
+	metadata = XMPMetadata()
+	namespace = metadata[BENCHMARK_NS]
+	for i in range(width):
+		setattr(namespace.wide, "f%d"%i, i)
+
+def wideSetMany(width):
+	metadata = XMPMetadata()
+	metadata.set_many(((BENCHMARK_NS, "wide/f%d"%i), i) for i in range(width))
+
+DEEP_BENCHMARKS = [deepSetPath, deepVirtual]
+WIDE_BENCHMARKS = [wideSetPath, wideVirtual, wideSetMany]
+
+# ───────
+# Running
+
+def measure(function, size, repeat):
+	""" Returns the best time in seconds of a call to function(size) """
+	return min(timeit.repeat(lambda: function(size), number = 1, repeat = repeat))
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+	parser.add_argument("--depths", type = int, nargs = "+", default = [2, 8, 32])
+	parser.add_argument("--widths", type = int, nargs = "+", default = [10, 100, 1000])
+	parser.add_argument("--repeat", type = int, default = 5)
+	args = parser.parse_args(argv)
+
+	for benchmarks, sizes, kind in [(DEEP_BENCHMARKS, args.depths, "depth"),
+	                                (WIDE_BENCHMARKS, args.widths, "width")]:
+		for function in benchmarks:
+			for size in sizes:
+				print "{:<12} {}={:<6} {:10.3f} ms".format(function.__name__, kind, size,
+				                                           measure(function, size, args.repeat)*1000)
+
+if __name__ == "__main__":
+	main()
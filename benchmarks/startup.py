@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Benchmarks the startup time of the xmp command.
+
+Each command line is run in a new interpreter, as from a shell; the bare
+interpreter startup is measured too, as a baseline.
+"""
+
+# Standard Library
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+XMP_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "bin", "xmp")
+
+COMMAND_LINES = [
+	("python",             ["-c", "pass"]),
+	("import xmp",         ["-c", "import xmp"]),
+	("import xmp.xmp",     ["-c", "import xmp.xmp"]),
+	("xmp --version",      [XMP_SCRIPT, "--version"]),
+	("xmp --help",         [XMP_SCRIPT, "--help"]),
+	("xmp show --help",    [XMP_SCRIPT, "show", "--help"]),
+]
+
+def measure(arguments, repeat):
+	""" Returns the sorted wall-clock times in seconds of runs of a Python command line """
+	times = []
+	with open(os.devnull, "w") as devnull:
+		for _ in range(repeat):
+			start = time.time()
+			subprocess.call([sys.executable] + arguments, stdout = devnull, stderr = devnull)
+			times.append(time.time() - start)
+	return sorted(times)
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+	parser.add_argument("--repeat", type = int, default = 20)
+	args = parser.parse_args(argv)
+
+	for name, arguments in COMMAND_LINES:
+		times = measure(arguments, args.repeat)
+		print "{:<18} min {:8.1f} ms   median {:8.1f} ms".format(name, times[0]*1000,
+		                                                         times[len(times)//2]*1000)
+
+if __name__ == "__main__":
+	main()
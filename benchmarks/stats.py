@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Robust statistics of benchmark timings.
+
+Timings are skewed by the occasional slow run, so benchmarks are summarized by
+their median and median absolute deviation rather than by their mean and
+standard deviation.
+"""
+
+# Standard Library
+import collections
+import math
+
+def percentile(values, fraction):
+	""" Returns the nearest-rank percentile of values, e.g. their 95th for a fraction of 0.95 """
+	values = sorted(values)
+	return values[max(0, int(math.ceil(fraction*len(values))) - 1)]
+
+def median(values):
+	values = sorted(values)
+	middle = len(values)//2
+	return values[middle] if len(values)%2 else (values[middle - 1] + values[middle])/2.
+
+def mad(values):
+	""" Returns the median absolute deviation of values from their median """
+	center = median(values)
+	return median([abs(value - center) for value in values])
+
+def summarize(values):
+	""" Returns the minimum, median, median absolute deviation and 95th percentile of values """
+	return collections.OrderedDict([
+		("min",    min(values)),
+		("median", median(values)),
+		("mad",    mad(values)),
+		("p95",    percentile(values, 0.95)),
+	])
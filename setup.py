@@ -21,5 +21,8 @@ setup(
     test_suite="tests",
     install_requires=[
         "python-xmp-toolkit >= 2.0.1",
-    ]
+    ],
+    extras_require={
+        "async": ["futures"],
+    }
 )
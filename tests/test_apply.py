@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# Standard Library
+import json
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+# libXMP
+import libxmp.consts
+# Xmp
+from xmp.apply import Edit, EditError, applyEdits, groupEdits, readEdits
+from xmp.batch import Checkpoint
+from xmp.xmp import XMPFile
+import fixtures
+
+class ReadEditsTests(unittest.TestCase):
+	def test_read(self):
+		edits = list(readEdits(['{"file": "a.jpg", "path": "exif:Artist", "value": "Bob"}\n',
+		                        '\n',
+		                        '{"file": "a.jpg", "namespace": "ns", "path": "a", "delete": true}\n',
+		                        'invalid\n',
+		                        '{"file": "a.jpg", "path": "exif:Artist"}\n']))
+		self.assertEqual(edits[:2], [Edit(1, "a.jpg", libxmp.consts.XMP_NS_EXIF, "exif:Artist", "Bob", False),
+		                             Edit(3, "a.jpg", "ns", "a", None, True)])
+		self.assertEqual([e.line for e in edits[2:]], [4, 5])
+		self.assertTrue(all(isinstance(e, EditError) for e in edits[2:]))
+
+	def test_skip(self):
+		lines = ['{"file": "a.jpg", "namespace": "ns", "path": "a", "value": %d}' % i for i in range(4)]
+		self.assertEqual([e.line for e in readEdits(lines, skip = lambda l: l % 2)], [2, 4])
+
+	def test_group(self):
+		edits = [Edit(i, f, "ns", "a", i, False) for i, f in enumerate("abacb")]
+		groups = list(groupEdits(edits, buffer_size = 2))
+		self.assertEqual([(f, [e.line for e in g]) for f, g in groups],
+		                 [("a", [0, 2]), ("b", [1, 4]), ("c", [3])])
+
+class ApplyEditsTests(unittest.TestCase):
+	def setUp(self):
+		self.jpg_path = fixtures.sandboxedData(fixtures.JPG_PHOTO)
+		self.directory = tempfile.mkdtemp()
+		self.checkpoint_path = os.path.join(self.directory, "checkpoint")
+		self.edits = [json.dumps(dict(file = self.jpg_path, path = "exif:Artist", value = "Bob")),
+		              json.dumps(dict(file = "/inexistent.jpg", path = "exif:Artist", value = "Bob")),
+		              json.dumps(dict(file = self.jpg_path, path = "exif:FNumber", delete = True))]
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_apply(self):
+		log = StringIO.StringIO()
+		summary = applyEdits(self.edits, log, checkpoint_path = self.checkpoint_path, jobs = 1)
+		self.assertEqual(summary, dict(files = 2, edits = 3, errors = 1))
+		self.assertEqual(len(log.getvalue().splitlines()), 2)
+
+		with XMPFile(self.jpg_path) as xmp_file:
+			exif = xmp_file.metadata[libxmp.consts.XMP_NS_EXIF]
+			self.assertEqual(exif.Artist.value, "Bob")
+			self.assertNotIn("FNumber", exif)
+
+	def test_apply_all_or_none(self):
+		edits = [json.dumps(dict(file = self.jpg_path, path = "exif:Artist", value = "Bob")),
+		         json.dumps(dict(file = self.jpg_path, path = "exif:FNumber", delete = True)),
+		         json.dumps(dict(file = self.jpg_path, path = "exif:Artist[5]", value = "Bob"))]
+		log = StringIO.StringIO()
+		self.assertEqual(applyEdits(edits, log, jobs = 1), dict(files = 1, edits = 3, errors = 1))
+		result = json.loads(log.getvalue())
+		self.assertEqual((result["set"], result["deleted"]), (0, 0))
+		self.assertIn("error", result)
+
+		with XMPFile(self.jpg_path) as xmp_file:
+			exif = xmp_file.metadata[libxmp.consts.XMP_NS_EXIF]
+			self.assertNotIn("Artist", exif)
+			self.assertIn("FNumber", exif)
+
+	def test_apply_same_file_paths(self):
+		link_path = os.path.join(self.directory, "link.jpg")
+		os.symlink(self.jpg_path, link_path)
+		# Appending to an array through either path, one file at a time, in order
+		edits = [json.dumps(dict(file = path, path = "dc:subject[%d]" % i, value = str(i)))
+		         for i, path in enumerate([self.jpg_path, link_path] * 4, 1)]
+		self.assertEqual(applyEdits(edits, StringIO.StringIO(), jobs = 2, buffer_size = 1),
+		                 dict(files = 8, edits = 8, errors = 0))
+
+		with XMPFile(self.jpg_path) as xmp_file:
+			subject = xmp_file.metadata[libxmp.consts.XMP_NS_DC].subject
+			self.assertEqual([item.value for item in subject], [str(i) for i in range(1, 9)])
+
+	def test_resume(self):
+		applyEdits(self.edits[:2], StringIO.StringIO(), checkpoint_path = self.checkpoint_path, jobs = 1)
+		summary = applyEdits(self.edits, StringIO.StringIO(), checkpoint_path = self.checkpoint_path, jobs = 1)
+		self.assertEqual(summary, dict(files = 1, edits = 1, errors = 0))
+
+	def test_checkpoint_each_file(self):
+		# The edits of a file are checkpointed before those of the next one are applied
+		checkpointed_lines = []
+		class Log(StringIO.StringIO):
+			def write(log, data):
+				checkpointed_lines.append(Checkpoint.load(self.checkpoint_path).count())
+				StringIO.StringIO.write(log, data)
+		applyEdits(self.edits, Log(), checkpoint_path = self.checkpoint_path, jobs = 1)
+		self.assertEqual(checkpointed_lines, [0, 2])
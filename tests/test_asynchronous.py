@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Standard Library
+import os
+import unittest
+# libXMP
+import libxmp.consts
+# Xmp
+from xmp.asynchronous import AsyncXMPFile, iterOpen, has_futures
+import fixtures
+
+@unittest.skipUnless(has_futures, "concurrent.futures is not available")
+class AsyncXMPFileTests(unittest.TestCase):
+	def setUp(self):
+		self.jpg_path = fixtures.sandboxedData(fixtures.JPG_PHOTO)
+
+	def test_open_close(self):
+		xmp_file = AsyncXMPFile(self.jpg_path)
+		self.assertIs(xmp_file.open().result(), xmp_file)
+		self.assertTrue(xmp_file.is_open)
+		self.assertEqual(xmp_file.metadata[libxmp.consts.XMP_NS_EXIF].FNumber.value, "32/10")
+		xmp_file.close().result()
+		self.assertFalse(xmp_file.is_open)
+
+	def test_contextmanager(self):
+		with AsyncXMPFile(self.jpg_path) as xmp_file:
+			self.assertEqual(len(xmp_file.metadata), len(fixtures.JPG_PHOTO_NS_UIDS))
+		self.assertFalse(xmp_file.is_open)
+
+	def test_iter_open(self):
+		paths = [self.jpg_path, fixtures.sandboxedData("foo.xmp")]
+		opened_paths = [f.file_path for f in iterOpen(paths, max_pending = 1)]
+		self.assertItemsEqual(opened_paths, [os.path.abspath(p) for p in paths])
+
+	def test_iter_open_errors(self):
+		errors = []
+		paths = [self.jpg_path, "/inexistent/file.jpg"]
+		opened_paths = [f.file_path for f in iterOpen(paths,
+		                                              on_error = lambda p, e: errors.append(p))]
+		self.assertEqual(opened_paths, [self.jpg_path])
+		self.assertEqual(errors, ["/inexistent/file.jpg"])
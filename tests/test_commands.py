@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# Standard Library
+import json
+import os
+import shutil
+import StringIO
+import subprocess
+import sys
+import tempfile
+import unittest
+# libXMP
+import libxmp.consts
+# Xmp
+from xmp.batch import POOL_MIN_TASKS, Checkpoint, JobRunner, imapExclusive, imapFiles, pathKey
+from xmp.commands.paths import iterPaths
+from xmp.commands.predicates import Predicate
+from xmp.commands.xmp import findFile, showFile
+import fixtures
+
+class PathsTests(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		for relative_path in ["a.png", "a.png.xmp", "b.xmp", "sub/c.jpg"]:
+			path = os.path.join(self.directory, relative_path)
+			if not os.path.isdir(os.path.dirname(path)):
+				os.makedirs(os.path.dirname(path))
+			open(path, "w").close()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def path(self, relative_path):
+		return os.path.join(self.directory, relative_path)
+
+	def test_files(self):
+		self.assertEqual(list(iterPaths([self.path("a.png"), self.path("missing")])),
+		                 [self.path("a.png"), self.path("missing")])
+
+	def test_glob(self):
+		self.assertEqual(list(iterPaths([self.path("*.xmp")])),
+		                 [self.path("a.png.xmp"), self.path("b.xmp")])
+
+	def test_recursive(self):
+		self.assertEqual(list(iterPaths([self.directory])), [self.directory])
+		self.assertEqual(list(iterPaths([self.directory], recursive = True)),
+		                 [self.path("a.png"), self.path("b.xmp"), self.path("sub/c.jpg")])
+
+	def test_stdin(self):
+		stdin = StringIO.StringIO("{}\n\n{}\n".format(self.path("a.png"), self.path("sub")))
+		self.assertEqual(list(iterPaths(["-"], recursive = True, stdin = stdin)),
+		                 [self.path("a.png"), self.path("sub/c.jpg")])
+
+def pathLength(file_path):
+	return len(file_path)
+
+def processId(file_path):
+	return os.getpid()
+
+def failOnBad(file_path):
+	return dict(error = "bad file") if file_path == "bad" else dict(path = file_path)
+
+class BatchTests(unittest.TestCase):
+	def test_imap_files(self):
+		paths = ["a", "bb", "ccc", "dddd"]
+		self.assertItemsEqual(imapFiles(pathLength, paths, jobs = 2), [1, 2, 3, 4])
+		self.assertEqual(list(imapFiles(pathLength, paths, jobs = 2, ordered = True)), [1, 2, 3, 4])
+		self.assertEqual(list(imapFiles(pathLength, iter(paths), jobs = 1)), [1, 2, 3, 4])
+
+	def test_default_jobs(self):
+		# A few files are processed in this process
+		self.assertEqual(set(imapFiles(processId, ["a"])), {os.getpid()})
+		self.assertEqual(set(imapExclusive(processId, ["a", "b"], key = lambda t: t)), {os.getpid()})
+		# Files read ahead to count them are processed too
+		paths = [str(i) for i in range(POOL_MIN_TASKS + 1)]
+		self.assertItemsEqual(imapFiles(pathLength, iter(paths)), [1]*len(paths))
+
+	def test_imap_exclusive(self):
+		tasks = ["a", "bb", "a", "ccc", "a"]
+		self.assertItemsEqual(imapExclusive(pathLength, tasks, key = lambda t: t, jobs = 2),
+		                      [1, 2, 1, 3, 1])
+		self.assertEqual(list(imapExclusive(pathLength, tasks, key = lambda t: t, jobs = 1)),
+		                 [1, 2, 1, 3, 1])
+
+class CheckpointTests(unittest.TestCase):
+	def test_add(self):
+		checkpoint = Checkpoint()
+		checkpoint.add([2, 4])
+		self.assertEqual((checkpoint.next_position, checkpoint.done), (1, {2, 4}))
+		checkpoint.add([1, 3])
+		self.assertEqual((checkpoint.next_position, checkpoint.done), (5, set()))
+		self.assertTrue(checkpoint.isDone(4))
+		self.assertFalse(checkpoint.isDone(5))
+
+	def test_failures(self):
+		checkpoint = Checkpoint()
+		checkpoint.add([1], failure = ("a", "error"))
+		self.assertTrue(checkpoint.isDone(1))
+		self.assertFalse(checkpoint.isDone(1, retry_failures = True))
+		checkpoint.add([1])
+		self.assertEqual(checkpoint.failures, {})
+
+	def test_keys(self):
+		checkpoint = Checkpoint()
+		checkpoint.add([1, pathKey("a")], failure = ("a", "error"))
+		self.assertTrue(checkpoint.isDone(pathKey("a")))
+		self.assertFalse(checkpoint.isDone(pathKey("b")))
+		self.assertEqual((checkpoint.next_position, checkpoint.count()), (2, 2))
+
+	def test_journal(self):
+		temporary_directory = tempfile.mkdtemp()
+		try:
+			path = os.path.join(temporary_directory, "checkpoint")
+			checkpoint = Checkpoint.load(path)
+			checkpoint.add([2], failure = ("b", "error"))
+			checkpoint.save(sync = False)
+			checkpoint.add([1, pathKey("a")])
+			checkpoint.save()
+			with open(path) as checkpoint_file:
+				self.assertEqual(len(checkpoint_file.readlines()), 2)
+			with open(path, "a") as checkpoint_file:
+				checkpoint_file.write('{"keys": [3')
+
+			checkpoint = Checkpoint.load(path)
+			self.assertEqual((checkpoint.next_position, checkpoint.done), (3, {pathKey("a")}))
+			self.assertEqual(checkpoint.failures, {2: ("b", "error")})
+			# Loading compacts the journal into a snapshot
+			with open(path) as checkpoint_file:
+				self.assertEqual(len(checkpoint_file.readlines()), 1)
+		finally:
+			shutil.rmtree(temporary_directory)
+
+class JobRunnerTests(unittest.TestCase):
+	def setUp(self):
+		self.temporary_directory = tempfile.mkdtemp()
+		self.checkpoint_path = os.path.join(self.temporary_directory, "checkpoint")
+
+	def tearDown(self):
+		shutil.rmtree(self.temporary_directory)
+
+	def test_resume(self):
+		paths = ["a", "bb", "ccc", "dddd"]
+		runner = JobRunner(pathLength, checkpoint_path = self.checkpoint_path, jobs = 1)
+		results = runner.run(paths)
+		self.assertEqual([next(results), next(results)], [1, 2])
+		results.close()
+		self.assertEqual(Checkpoint.load(self.checkpoint_path).count(), 2)
+
+		progress = StringIO.StringIO()
+		runner = JobRunner(pathLength, checkpoint_path = self.checkpoint_path, jobs = 2, progress = progress)
+		self.assertItemsEqual(runner.run(paths), [3, 4])
+		self.assertEqual(runner.summary["files"], 2)
+		self.assertIn("2/2 files", progress.getvalue())
+		self.assertEqual(list(runner.run(paths)), [])
+
+	def test_resume_changed_manifest(self):
+		runner = JobRunner(pathLength, checkpoint_path = self.checkpoint_path, jobs = 1)
+		self.assertEqual(list(runner.run(["bb", "dddd"])), [2, 4])
+		# Files added to or removed from the manifest don't shift the processed ones
+		self.assertEqual(list(runner.run(["a", "bb", "ccc", "dddd"])), [1, 3])
+
+	def test_retry_failures(self):
+		paths = ["a", "bad", "c"]
+		runner = JobRunner(failOnBad, checkpoint_path = self.checkpoint_path, jobs = 1)
+		self.assertEqual(len(list(runner.run(paths))), 3)
+		self.assertEqual(runner.summary["failures"], 1)
+		self.assertEqual(Checkpoint.load(self.checkpoint_path).failures, {pathKey("bad"): ("bad", "bad file")})
+		runner.retry_failures = True
+		runner.progress = StringIO.StringIO()
+		self.assertEqual(list(runner.run(paths)), [dict(error = "bad file")])
+		self.assertIn("1/1 files", runner.progress.getvalue())
+
+class ShowTests(unittest.TestCase):
+	def setUp(self):
+		self.jpg_path = fixtures.sandboxedData(fixtures.JPG_PHOTO)
+
+	def test_show_json(self):
+		result = showFile(self.jpg_path, output_format = "json")
+		metadata = json.loads(result["text"])["metadata"]
+		self.assertItemsEqual(metadata.keys(), fixtures.JPG_PHOTO_NS_UIDS)
+		self.assertEqual(metadata[libxmp.consts.XMP_NS_EXIF]["exif:FNumber"], "32/10")
+
+	def test_show_json_fields(self):
+		result = showFile(self.jpg_path, output_format = "json",
+		                  fields = [(libxmp.consts.XMP_NS_EXIF, "exif:FNumber"),
+		                            (libxmp.consts.XMP_NS_EXIF, "exif:Inexistent")],
+		                  field_names = ["exif:FNumber", "exif:Inexistent"])
+		self.assertEqual(json.loads(result["text"]),
+		                 {"path": self.jpg_path,
+		                  "metadata": {"exif:FNumber": "32/10", "exif:Inexistent": None}})
+
+	def test_show_stream(self):
+		text = showFile(self.jpg_path)["text"]
+		stdout = sys.stdout
+		try:
+			sys.stdout = StringIO.StringIO()
+			result = showFile(self.jpg_path, stream = True)
+			self.assertEqual(sys.stdout.getvalue(), text + "\n")
+		finally:
+			sys.stdout = stdout
+		self.assertEqual(result, dict(path = self.jpg_path, text = None))
+
+	def test_show_error(self):
+		self.assertIn("error", showFile("/inexistent/file.jpg"))
+
+class PredicateTests(unittest.TestCase):
+	def test_parse(self):
+		predicate = Predicate.parse("exif:ISOSpeedRatings >= 800")
+		self.assertEqual((predicate.property, predicate.operator, predicate.operand),
+		                 ("exif:ISOSpeedRatings", ">=", "800"))
+		self.assertIsNone(Predicate.parse("exif:Flash/exif:Mode").operator)
+		with self.assertRaises(ValueError):
+			Predicate.parse(">=800")
+
+	def test_matches(self):
+		self.assertTrue(Predicate.parse("a>=800").matches("1600"))
+		self.assertFalse(Predicate.parse("a>=800").matches("400"))
+		self.assertTrue(Predicate.parse("a<3.5").matches("32/10"))
+		self.assertTrue(Predicate.parse("a=Pepper").matches("Pepper"))
+		self.assertTrue(Predicate.parse("a~epp").matches("Pepper"))
+		self.assertTrue(Predicate.parse("a>=800").matches(["400", "800"]))
+		self.assertTrue(Predicate.parse("a").matches(""))
+		self.assertFalse(Predicate.parse("a").matches(None))
+		self.assertFalse(Predicate.parse("a!=b").matches(None))
+
+	def test_find_file(self):
+		jpg_path = fixtures.sandboxedData(fixtures.JPG_PHOTO)
+		fields = [(libxmp.consts.XMP_NS_EXIF, "exif:FNumber"),
+		          (libxmp.consts.XMP_NS_EXIF, "exif:ISOSpeedRatings")]
+		matching = [Predicate.parse("exif:FNumber<3.5"), Predicate.parse("exif:ISOSpeedRatings=400")]
+		self.assertEqual(findFile(jpg_path, fields, matching)["text"], jpg_path + "\n")
+		not_matching = [Predicate.parse("exif:FNumber<3.5"), Predicate.parse("exif:ISOSpeedRatings>400")]
+		self.assertIsNone(findFile(jpg_path, fields, not_matching)["text"])
+
+class StartupTests(unittest.TestCase):
+	def test_parser_does_not_load_libxmp(self):
+		script = ("import sys, xmp.commands.main\n"
+		          "xmp.commands.main.make_command_parser().format_help()\n"
+		          "print 'libxmp' in sys.modules")
+		output = subprocess.check_output([sys.executable, "-c", script])
+		self.assertEqual(output.strip(), "False")
+
+	def test_version(self):
+		script = ("import sys, xmp, xmp.version\n"
+		          "print xmp.VERSION == xmp.version.version(), 'libxmp' in sys.modules")
+		output = subprocess.check_output([sys.executable, "-c", script])
+		self.assertEqual(output.strip(), "True False")
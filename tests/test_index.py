@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# Standard Library
+import os
+import shutil
+import tempfile
+import time
+import unittest
+# libXMP
+import libxmp.consts
+# Xmp
+from xmp.commands.predicates import Predicate
+from xmp.index import Index
+from xmp.scan import Scanner
+from xmp.xmp import XMPFile
+import fixtures
+
+class IndexTests(unittest.TestCase):
+	def setUp(self):
+		self.temporary_directory = tempfile.mkdtemp()
+		self.jpg_path = os.path.join(self.temporary_directory, fixtures.JPG_PHOTO)
+		shutil.copyfile(os.path.join(fixtures.DATA_FOLDER, fixtures.JPG_PHOTO), self.jpg_path)
+		self.index = Index(self.temporary_directory + ".index")
+
+	def tearDown(self):
+		self.index.close()
+		os.remove(self.index.path)
+		shutil.rmtree(self.temporary_directory)
+
+	def query(self, *expressions):
+		predicates = [Predicate.parse(e) for e in expressions]
+		return self.index.query([(libxmp.consts.XMP_NS_EXIF, p.property) for p in predicates], predicates)
+
+	def test_update(self):
+		missing_path = os.path.join(self.temporary_directory, "missing.jpg")
+		self.assertEqual(self.index.update([self.jpg_path, missing_path], jobs = 1),
+		                 dict(indexed = 1, unchanged = 0, failed = 1))
+		self.assertEqual(self.index.files(), sorted([self.jpg_path, missing_path]))
+		self.assertIn((libxmp.consts.XMP_NS_EXIF, "exif:ISOSpeedRatings", None, "array"),
+		              self.index.elements(self.jpg_path))
+		self.assertEqual(self.index.update([self.jpg_path], jobs = 1),
+		                 dict(indexed = 0, unchanged = 1, failed = 0))
+
+		# Reindex modified files only
+		time.sleep(0.01)
+		with XMPFile(self.jpg_path, rw = True) as xmp_file:
+			xmp_file.metadata[libxmp.consts.XMP_NS_EXIF].FocalLength = "50/1"
+		self.assertEqual(self.index.update([self.jpg_path], jobs = 1),
+		                 dict(indexed = 1, unchanged = 0, failed = 0))
+		self.assertEqual(list(self.index.values(libxmp.consts.XMP_NS_EXIF, "FocalLength")),
+		                 [(self.jpg_path, "50/1")])
+
+		self.assertEqual(self.index.prune(), 1)
+		self.assertEqual(self.index.files(), [self.jpg_path])
+
+	def test_query(self):
+		self.index.update([self.jpg_path], jobs = 1)
+		self.assertEqual(self.query("exif:FocalLength = 98/10"), [self.jpg_path])
+		self.assertEqual(self.query("exif:FocalLength = 9.8", "exif:ISOSpeedRatings >= 400"), [self.jpg_path])
+		self.assertEqual(self.query("exif:ISOSpeedRatings > 400"), [])
+		self.assertEqual(self.query("exif:Inexistent"), [])
+
+	def test_values(self):
+		self.index.update([self.jpg_path], jobs = 1)
+		self.assertEqual(list(self.index.values(libxmp.consts.XMP_NS_EXIF, "Flash")),
+		                 [(self.jpg_path, {})])
+		self.assertEqual(list(self.index.values(libxmp.consts.XMP_NS_EXIF, "ISOSpeedRatings")),
+		                 [(self.jpg_path, ["400"])])
+
+	def test_follow(self):
+		scanner = Scanner([self.temporary_directory])
+		updates = self.index.follow(scanner.watch(interval = 0), jobs = 1)
+		self.assertEqual(next(updates)["indexed"], 1)
+		self.assertEqual(self.index.files(), [self.jpg_path])
+		os.remove(self.jpg_path)
+		self.assertEqual(next(updates)["removed"], 1)
+		self.assertEqual(self.index.files(), [])
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# Standard Library
+import unittest
+# libXMP
+import libxmp
+import libxmp.consts
+# Xmp
+from xmp import instrumentation
+from xmp.xmp import XMPFile, XMPValue
+import fixtures
+
+class InstrumentationTests(unittest.TestCase):
+	def setUp(self):
+		self.jpg_path = fixtures.sandboxedData(fixtures.JPG_PHOTO)
+		instrumentation.reset()
+
+	def tearDown(self):
+		instrumentation.disable()
+		instrumentation.reset()
+
+	def test_report(self):
+		with instrumentation.enabled():
+			with XMPFile(self.jpg_path, rw = True) as xmp_file:
+				exif = xmp_file.metadata[libxmp.consts.XMP_NS_EXIF]
+				self.assertEqual(exif.FNumber.value, "32/10")
+				exif.FNumber = "28/10"
+		report = instrumentation.report()
+		self.assertEqual(report["open"]["count"], 1)
+		self.assertEqual(report["build"]["count"], 1)
+		self.assertIn("XMPIterator.next", report["build"]["calls"])
+		self.assertEqual(report["get"]["calls"]["XMPMeta.get_property"].count, 1)
+		self.assertEqual(report["set"]["calls"]["XMPMeta.set_property"].count, 1)
+		self.assertIn("XMPFiles.put_xmp", report["close"]["calls"])
+		self.assertIn("XMPMeta.set_property", instrumentation.formatReport())
+
+	def test_disabled(self):
+		original_get_property = vars(libxmp.XMPMeta)["get_property"]
+		original_value = vars(XMPValue)["value"]
+		instrumentation.enable()
+		self.assertTrue(instrumentation.isEnabled())
+		instrumentation.disable()
+		self.assertIs(vars(libxmp.XMPMeta)["get_property"], original_get_property)
+		self.assertIs(vars(XMPValue)["value"], original_value)
+
+		with XMPFile(self.jpg_path) as xmp_file:
+			xmp_file.metadata[libxmp.consts.XMP_NS_EXIF].FNumber.value
+		self.assertEqual(instrumentation.report(), {})
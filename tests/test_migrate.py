@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# Standard Library
+import json
+import os
+import unittest
+# libXMP
+import libxmp.consts
+# Xmp
+from xmp.commands.xmp import setFile, showFile
+from xmp.migrate import EMBEDDED, SIDECAR, migrateFile
+from xmp.xmp import XMPFile
+import fixtures
+
+class MigrateTests(unittest.TestCase):
+	def setUp(self):
+		self.jpg_path = fixtures.sandboxedData(fixtures.JPG_PHOTO)
+		self.sidecar_path = self.jpg_path + ".xmp"
+
+	def tearDown(self):
+		if os.path.exists(self.sidecar_path):
+			os.remove(self.sidecar_path)
+
+	def fNumber(self, sidecar = None):
+		with XMPFile(self.jpg_path, sidecar = sidecar) as xmp_file:
+			return xmp_file.metadata.get_many([(libxmp.consts.XMP_NS_EXIF, "exif:FNumber")])[0]
+
+	def test_round_trip(self):
+		self.assertIn("text", migrateFile(self.jpg_path, to = SIDECAR))
+		self.assertTrue(os.path.exists(self.sidecar_path))
+		self.assertEqual(self.fNumber(sidecar = True), "32/10")
+		self.assertIsNone(self.fNumber(sidecar = False))
+
+		self.assertIn("text", migrateFile(self.jpg_path, to = EMBEDDED))
+		self.assertFalse(os.path.exists(self.sidecar_path))
+		self.assertEqual(self.fNumber(), "32/10")
+
+	def test_commands_use_sidecar(self):
+		migrateFile(self.jpg_path, to = SIDECAR)
+		with open(self.jpg_path, "rb") as jpg_file:
+			contents = jpg_file.read()
+		fields = [(libxmp.consts.XMP_NS_EXIF, "exif:FNumber")]
+		result = showFile(self.jpg_path, output_format = "json", fields = fields, field_names = ["exif:FNumber"])
+		self.assertEqual(json.loads(result["text"])["metadata"], {"exif:FNumber": "32/10"})
+
+		self.assertIn("text", setFile(self.jpg_path, [(fields[0], "4/1")]))
+		self.assertEqual(self.fNumber(), "4/1")
+		self.assertEqual(self.fNumber(sidecar = True), "4/1")
+		# The file itself is not rewritten
+		with open(self.jpg_path, "rb") as jpg_file:
+			self.assertEqual(jpg_file.read(), contents)
+
+	def test_nothing_to_move(self):
+		self.assertIsNone(migrateFile(self.jpg_path, to = EMBEDDED)["text"])
+		migrateFile(self.jpg_path, to = SIDECAR)
+		self.assertIsNone(migrateFile(self.jpg_path, to = SIDECAR)["text"])
+
+	def test_interrupted(self):
+		# The sidecar file was written but the embedded metadata not cleared yet
+		with XMPFile(self.jpg_path, sidecar = False) as xmp_file:
+			packet = xmp_file.libxmp_metadata.serialize_to_str()
+		with open(self.sidecar_path, "w") as sidecar_file:
+			sidecar_file.write(packet.encode("utf-8"))
+		self.assertIn("text", migrateFile(self.jpg_path, to = SIDECAR))
+		self.assertIsNone(self.fNumber(sidecar = False))
+
+	def test_conflicting_sidecar(self):
+		with XMPFile(self.jpg_path, rw = True, sidecar = True) as xmp_file:
+			xmp_file.libxmp_metadata = None
+		self.assertIn("error", migrateFile(self.jpg_path, to = SIDECAR))
+		self.assertEqual(self.fNumber(sidecar = False), "32/10")
+
+	def test_errors(self):
+		self.assertIn("error", migrateFile("/inexistent/file.jpg", to = SIDECAR))
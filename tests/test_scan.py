@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# Standard Library
+import os
+import shutil
+import tempfile
+import unittest
+# Xmp
+from xmp.batch import fileSignature
+from xmp.scan import ADDED, MODIFIED, REMOVED, Scanner, Snapshot, scanTree
+
+class ScannerTests(unittest.TestCase):
+	def setUp(self):
+		self.temporary_directory = tempfile.mkdtemp()
+		self.directory = os.path.join(self.temporary_directory, "data")
+		os.makedirs(os.path.join(self.directory, "sub"))
+		for name in ["a.jpg", "a.jpg.xmp", "b.xmp", "sub/c.png"]:
+			self.write(name, name)
+		self.snapshot_path = os.path.join(self.temporary_directory, "snapshot")
+
+	def tearDown(self):
+		shutil.rmtree(self.temporary_directory)
+
+	def path(self, name):
+		return os.path.join(self.directory, name)
+
+	def write(self, name, contents):
+		with open(self.path(name), "w") as file_handle:
+			file_handle.write(contents)
+
+	def changes(self, scanner):
+		return [(e.kind, os.path.relpath(e.path, self.directory)) for e in scanner.scan()]
+
+	def test_scan_tree(self):
+		self.assertEqual(list(scanTree(self.directory)),
+		                 [(self.path(n), fileSignature(self.path(n))) for n in ["a.jpg", "b.xmp", "sub/c.png"]])
+
+	def test_scan(self):
+		scanner = Scanner([self.directory], snapshot_path = self.snapshot_path)
+		self.assertEqual(self.changes(scanner), [(ADDED, "a.jpg"), (ADDED, "b.xmp"), (ADDED, "sub/c.png")])
+		self.assertEqual(self.changes(scanner), [])
+
+		# Changes are detected from the persisted snapshot
+		self.write("a.jpg.xmp", "modified sidecar")
+		self.write("sub/d.png", "")
+		os.remove(self.path("b.xmp"))
+		scanner = Scanner([self.directory], snapshot_path = self.snapshot_path)
+		self.assertEqual(self.changes(scanner), [(MODIFIED, "a.jpg"), (ADDED, "sub/d.png"), (REMOVED, "b.xmp")])
+		self.assertEqual(len(Snapshot.load(self.snapshot_path).signatures), 3)
+
+	def test_watch(self):
+		scanner = Scanner([self.directory])
+		scans = scanner.watch(interval = 0)
+		self.assertEqual(len(next(scans)), 3)
+		self.write("sub/c.png", "modified")
+		self.assertEqual([e.kind for e in next(scans)], [MODIFIED])
+
+	def test_watch_interrupted(self):
+		scans = Scanner([self.directory], snapshot_path = self.snapshot_path).watch(interval = 0)
+		self.assertEqual(len(next(scans)), 3)
+		scans.close()
+		# The consumer didn't finish with the events, which are reported again
+		scans = Scanner([self.directory], snapshot_path = self.snapshot_path).watch(interval = 0)
+		self.assertEqual(len(next(scans)), 3)
+		self.write("sub/c.png", "modified")
+		self.assertEqual([e.kind for e in next(scans)], [MODIFIED])
+		self.assertEqual(len(Snapshot.load(self.snapshot_path).signatures), 3)
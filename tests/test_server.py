@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# Standard Library
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+# libXMP
+import libxmp.consts
+# Xmp
+from xmp.commands.main import make_command_parser
+from xmp.server import Client, MetadataCache, Server, isOwnSocket, runtimeDirectory
+from xmp.xmp import XMPFile
+import fixtures
+
+class MetadataCacheTests(unittest.TestCase):
+	def setUp(self):
+		self.jpg_path = fixtures.sandboxedData(fixtures.JPG_PHOTO)
+
+	def test_read(self):
+		cache = MetadataCache()
+		metadata = cache.read(self.jpg_path)
+		self.assertIs(cache.read(self.jpg_path), metadata)
+		self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+		projection = cache.read(self.jpg_path, only = [(libxmp.consts.XMP_NS_TIFF, "*")])
+		self.assertEqual(projection.namespaces, [projection[libxmp.consts.XMP_NS_TIFF]])
+
+	def test_file_change(self):
+		cache = MetadataCache()
+		metadata = cache.read(self.jpg_path)
+		os.utime(self.jpg_path, (0, 0))
+		self.assertIsNot(cache.read(self.jpg_path), metadata)
+
+	def test_size(self):
+		other_jpg_path = self.jpg_path + ".copy.jpg"
+		shutil.copyfile(self.jpg_path, other_jpg_path)
+		cache = MetadataCache(size = 1)
+		cache.read(self.jpg_path)
+		cache.read(other_jpg_path)
+		self.assertEqual(len(cache), 1)
+		os.remove(other_jpg_path)
+
+class ServerTests(unittest.TestCase):
+	def setUp(self):
+		self.jpg_path = fixtures.sandboxedData(fixtures.JPG_PHOTO)
+		self.directory = tempfile.mkdtemp()
+		self.server = Server(os.path.join(self.directory, "xmp.sock"))
+		self.thread = threading.Thread(target = self.server.serve_forever)
+		self.thread.start()
+		self.client = Client(self.server.socket_path)
+
+	def tearDown(self):
+		self.client.close()
+		self.server.shutdown()
+		self.thread.join()
+		self.server.server_close()
+		shutil.rmtree(self.directory)
+
+	def test_ping(self):
+		self.assertEqual(self.client.request(dict(command = "ping"))["status"], 0)
+
+	def test_get(self):
+		values = self.client.get(self.jpg_path, [(libxmp.consts.XMP_NS_EXIF, "exif:FNumber"),
+		                                         (libxmp.consts.XMP_NS_EXIF, "exif:Inexistent")])
+		self.assertEqual(values, ["32/10", None])
+
+	def test_get_set(self):
+		with XMPFile(self.jpg_path, rw = True) as xmp_file:
+			xmp_file.metadata[libxmp.consts.XMP_NS_EXIF].Keywords = {"b", "a"}
+		values = self.client.get(self.jpg_path, [(libxmp.consts.XMP_NS_EXIF, "exif:Keywords")])
+		self.assertEqual(values, [["a", "b"]])
+		self.assertEqual(self.client.request(dict(command = "ping"))["status"], 0)
+
+	def test_run(self):
+		args = make_command_parser().parse_args(["show", os.path.basename(self.jpg_path), "inexistent",
+		                                         "--ordered", "-f", "json", "--fields", "exif:FNumber"])
+		response = self.client.run("show", dict((k, v) for k, v in vars(args).iteritems() if k != "func"),
+		                           cwd = os.path.dirname(self.jpg_path))
+		self.assertEqual(response["status"], 1)
+		self.assertIn("32/10", response["stdout"])
+		self.assertIn("inexistent", response["stderr"])
+
+	def test_unknown_command(self):
+		self.assertNotEqual(self.client.request(dict(command = "inexistent"))["status"], 0)
+
+class SocketSafetyTests(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.environment = os.environ.get("XDG_RUNTIME_DIR")
+
+	def tearDown(self):
+		if self.environment is None:
+			os.environ.pop("XDG_RUNTIME_DIR", None)
+		else:
+			os.environ["XDG_RUNTIME_DIR"] = self.environment
+		shutil.rmtree(self.directory)
+
+	def test_runtime_directory(self):
+		private_directory = os.path.join(self.directory, "private")
+		os.environ["XDG_RUNTIME_DIR"] = private_directory
+		# Only servers create the directory
+		with self.assertRaises(OSError):
+			runtimeDirectory()
+		self.assertFalse(os.path.exists(private_directory))
+		self.assertEqual(runtimeDirectory(create = True), private_directory)
+		self.assertEqual(runtimeDirectory(), private_directory)
+		self.assertEqual(os.stat(private_directory).st_mode & 0o777, 0o700)
+
+		os.chmod(private_directory, 0o755)
+		with self.assertRaises(IOError):
+			runtimeDirectory()
+
+	def test_own_socket(self):
+		server = Server(os.path.join(self.directory, "xmp.sock"))
+		try:
+			self.assertTrue(isOwnSocket(server.socket_path))
+		finally:
+			server.server_close()
+
+		planted_path = os.path.join(self.directory, "planted.sock")
+		open(planted_path, "w").close()
+		self.assertFalse(isOwnSocket(planted_path))
+		self.assertFalse(isOwnSocket(os.path.join(self.directory, "inexistent.sock")))
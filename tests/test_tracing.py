@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# Standard Library
+import json
+import StringIO
+import unittest
+# libXMP
+import libxmp.consts
+# Xmp
+from xmp import tracing
+from xmp.xmp import XMPFile
+import fixtures
+
+class TracingTests(unittest.TestCase):
+	def setUp(self):
+		self.jpg_path = fixtures.sandboxedData(fixtures.JPG_PHOTO)
+		self.spans = tracing.RingBufferSink(10)
+		tracing.addSink(self.spans)
+
+	def tearDown(self):
+		tracing.removeSinks()
+
+	def test_file_spans(self):
+		with XMPFile(self.jpg_path, rw = True) as xmp_file:
+			xmp_file.metadata.set_many([((libxmp.consts.XMP_NS_EXIF, "exif:Artist"), "Bob")])
+		open_span, set_span, close_span = self.spans.spans
+		self.assertEqual([s["operation"] for s in self.spans.spans], ["open", "set", "close"])
+		self.assertEqual(open_span["path"], self.jpg_path)
+		self.assertLessEqual({"file_size", "packet_size", "element_count"}, set(open_span))
+		self.assertEqual(open_span["phases"].keys(), ["check", "handle", "read", "build"])
+		self.assertEqual(set_span["element_count"], 1)
+		self.assertIn("put_xmp", close_span["phases"])
+		self.assertGreater(close_span["packet_size"], 0)
+
+	def test_error(self):
+		with self.assertRaises(IOError):
+			XMPFile("/inexistent/file.jpg").open()
+		self.assertIn("IOError", self.spans.spans[-1]["error"])
+
+	def test_sinks(self):
+		stream = StringIO.StringIO()
+		slow_spans = tracing.RingBufferSink()
+		tracing.addSink(tracing.JSONLinesSink(stream))
+		tracing.addSink(slow_spans, threshold = 3600)
+		with XMPFile(self.jpg_path):
+			pass
+		self.assertEqual([json.loads(l)["operation"] for l in stream.getvalue().splitlines()], ["open", "close"])
+		self.assertEqual(len(slow_spans.spans), 0)
+		self.assertIn("open " + self.jpg_path, tracing.formatSpan(self.spans.spans[0]))
+
+	def test_no_sinks(self):
+		tracing.removeSinks()
+		self.assertIs(tracing.span("open"), tracing.NULL_SPAN)
@@ -31,7 +31,9 @@
 # Standard Library
 import collections
 import errno
+import io
 import os
+import sys
 import unittest
 import shutil
 # libXMP
@@ -40,7 +42,7 @@ import libxmp.consts
 from xmp.xmp import (XMPFile, XMPMetadata,
                      XMPElement,   XMPVirtualElement,
                      XMPNamespace, XMPStructure, XMPArray, XMPSet, XMPValue,
-                     registerNamespace)
+                     registerNamespace, writeAtomically)
 import fixtures
 
 TEST_NS = u"http://test.com/xmp/test/1"
@@ -112,6 +114,14 @@ class XMPFileTests(unittest.TestCase):
 		with XMPFile(self.xmp_extension_path) as xmp_file:
 			self.assertEqual(xmp_file.metadata[TEST_NS].structure.value, "value")
 
+	def test_flush(self):
+		with XMPFile(self.xmp_extension_path, rw=True) as xmp_file:
+			xmp_file.metadata[TEST_NS].structure = "value"
+			xmp_file.flush()
+			self.assertFalse(xmp_file.has_changed)
+			with XMPFile(self.xmp_extension_path) as flushed_file:
+				self.assertEqual(flushed_file.metadata[TEST_NS].structure.value, "value")
+
 class XMPTestCase(unittest.TestCase):
 	def setUp(self):
 		self.EXPECTED_NS_UIDS = fixtures.JPG_PHOTO_NS_UIDS
@@ -144,6 +154,36 @@ class XMP(XMPTestCase):
 		empty_xmp = XMPMetadata()
 		self.assertEqual(len(empty_xmp.namespaces), 0)
 
+class ProjectionTests(unittest.TestCase):
+	def setUp(self):
+		self.jpg_path = fixtures.sandboxedData(fixtures.JPG_PHOTO)
+
+	def test_namespace_projection(self):
+		with XMPFile(self.jpg_path, only=[(libxmp.consts.XMP_NS_TIFF, "*")]) as xmp_file:
+			self.assertEqual(len(xmp_file.metadata), 1)
+			tiff_ns = xmp_file.metadata[libxmp.consts.XMP_NS_TIFF]
+			self.assertEqual(len(tiff_ns), fixtures.JPG_PHOTO_NS_LEN[libxmp.consts.XMP_NS_TIFF])
+			self.assertFalse(libxmp.consts.XMP_NS_EXIF in xmp_file.metadata)
+
+	def test_path_projection(self):
+		projection = [(libxmp.consts.XMP_NS_EXIF, "DateTimeOriginal"),
+		              (libxmp.consts.XMP_NS_EXIF, "Flash/Function"),
+		              (libxmp.consts.XMP_NS_EXIF, "inexistent_element")]
+		with XMPFile(self.jpg_path, only=projection) as xmp_file:
+			exif_ns = xmp_file.metadata[libxmp.consts.XMP_NS_EXIF]
+			self.assertListEqual([c.name for c in exif_ns], ["exif:DateTimeOriginal", "exif:Flash"])
+			self.assertEqual(exif_ns.DateTimeOriginal.value, "2016-03-25T21:40:20")
+			self.assertIsInstance(exif_ns.Flash, XMPStructure)
+			self.assertListEqual([c.name for c in exif_ns.Flash], ["exif:Function"])
+			self.assertEqual(exif_ns.Flash.Function.value, "False")
+
+	def test_array_projection(self):
+		projection = [(libxmp.consts.XMP_NS_EXIF, "ComponentsConfiguration")]
+		with XMPFile(self.jpg_path, only=projection) as xmp_file:
+			exif_ns = xmp_file.metadata[libxmp.consts.XMP_NS_EXIF]
+			self.assertIsInstance(exif_ns.ComponentsConfiguration, XMPArray)
+			self.assertListEqual(exif_ns.ComponentsConfiguration.value, ["1", "2", "3", "0"])
+
 class XMPNamespaceTests(XMPTestCase):
 	def setUp(self):
 		super(XMPNamespaceTests, self).setUp()
@@ -493,6 +533,301 @@ class XMPNamespaceTests(XMPTestCase):
 			assert(False)
 			pass
 
+	def test_set_path(self):
+		metadata = XMPMetadata()
+		test_metadata = metadata[TEST_NS]
+		test_metadata.set_path("a/b[3]/c", 12)
+
+		self.assertIsInstance(test_metadata.a, XMPStructure)
+		self.assertIsInstance(test_metadata.a.b, XMPArray)
+		self.assertEqual(len(test_metadata.a.b), 3)
+		self.assertEqual(test_metadata.a.b[2].value, {"test:c": "12"})
+
+	def test_set_path_existing_containers(self):
+		metadata = XMPMetadata()
+		test_metadata = metadata[TEST_NS]
+		test_metadata.a = {"b": [{"c": 1}], "d": 2}
+		array = test_metadata.a.b
+
+		test_metadata.set_path("test:a/test:b[1]/test:e", 3)
+		test_metadata.set_path("a/b[2]", 4)
+
+		self.assertIs(test_metadata.a.b, array)
+		self.assertEqual(test_metadata.a.value, {"test:b": [{"test:c": "1", "test:e": "3"}, "4"],
+		                                         "test:d": "2"})
+
+class BulkTests(XMPTestCase):
+	def test_get_many(self):
+		values = self.example_xmp.get_many([(libxmp.consts.XMP_NS_EXIF, "FNumber"),
+		                                    (libxmp.consts.XMP_NS_EXIF, "exif:Flash/exif:Mode"),
+		                                    (libxmp.consts.XMP_NS_EXIF, "ComponentsConfiguration[2]"),
+		                                    (libxmp.consts.XMP_NS_EXIF, "ISOSpeedRatings"),
+		                                    (libxmp.consts.XMP_NS_EXIF, "Flash/inexistent_element"),
+		                                    (libxmp.consts.XMP_NS_TIFF, "ResolutionUnit")])
+		self.assertEqual(values[:4], ["32/10", "2", "2", ["400"]])
+		self.assertIsNone(values[4])
+		self.assertIsNotNone(values[5])
+
+	def test_get_many_default(self):
+		self.assertEqual(self.example_xmp.get_many([(libxmp.consts.XMP_NS_EXIF, "inexistent")],
+		                                           default = "default"),
+		                 ["default"])
+
+	def test_set_many(self):
+		metadata = XMPMetadata()
+		metadata.set_many(collections.OrderedDict([
+			((TEST_NS, "a/b[2]/c"), 1),
+			((TEST_NS, "a/b[2]/d"), 2),
+			((TEST_NS, "a/e"), [3, 4]),
+			((TEST_NS, "f"), "g"),
+		]))
+
+		test_ns = metadata[TEST_NS]
+		self.assertIsInstance(test_ns.a, XMPStructure)
+		self.assertIsInstance(test_ns.a.b, XMPArray)
+		self.assertEqual(len(test_ns.a.b), 2)
+		self.assertIsNone(test_ns.a.b[0].value)
+		self.assertEqual(test_ns.a.b[1].value, {"test:c": "1", "test:d": "2"})
+		self.assertEqual(test_ns.a.e.value, ["3", "4"])
+		self.assertEqual(test_ns.f.value, "g")
+		self.assertEqual(metadata.get_many([(TEST_NS, "a/b[2]/d"), (TEST_NS, "a/e[1]")]), ["2", "3"])
+
+	def test_set_many_replaces_containers(self):
+		metadata = XMPMetadata()
+		metadata.set_many([((TEST_NS, "a/b"), 1),
+		                   ((TEST_NS, "a"), None),
+		                   ((TEST_NS, "a/c"), 2)])
+		self.assertEqual(metadata[TEST_NS].a.value, {"test:c": "2"})
+
+	def test_delete_many(self):
+		metadata = XMPMetadata()
+		metadata[TEST_NS].update({"a": {"b": 1, "c": 2}, "d": [1, 2, 3]})
+		deleted_count = metadata.delete_many([(TEST_NS, "a/b"),
+		                                      (TEST_NS, "d[1]"),
+		                                      (TEST_NS, "d[1]"),
+		                                      (TEST_NS, "inexistent")])
+		self.assertEqual(deleted_count, 3)
+		self.assertEqual(metadata[TEST_NS].a.value, {"test:c": "2"})
+		self.assertEqual(metadata[TEST_NS].d.value, ["3"])
+
+	def test_delete_many_set_items(self):
+		metadata = XMPMetadata()
+		metadata[TEST_NS].d = {"1", "2", "3", "4"}
+		packet = metadata.libxmp_metadata
+		remaining = set(metadata[TEST_NS].d.value) - {packet.get_property(TEST_NS, "test:d[1]"),
+		                                              packet.get_property(TEST_NS, "test:d[3]")}
+		deleted_count = metadata.delete_many([(TEST_NS, "d[1]"),
+		                                      (TEST_NS, "d[2]")])
+		self.assertEqual(deleted_count, 2)
+		self.assertEqual(metadata.verify(), [])
+		self.assertEqual(metadata[TEST_NS].d.value, remaining)
+		for item in metadata[TEST_NS].d.children:
+			self.assertEqual(packet.get_property(TEST_NS, item.address), item.value)
+
+	def test_set_many_in_value(self):
+		metadata = XMPMetadata()
+		metadata[TEST_NS].a = 1
+		with self.assertRaises(TypeError):
+			metadata.set_many({(TEST_NS, "a/b"): 2})
+
+class SynchronizationTests(unittest.TestCase):
+	def setUp(self):
+		self.metadata = XMPMetadata()
+		self.metadata[TEST_NS].update({"a": {"b": 1, "c": 2}, "d": [1, 2], "e": 3})
+		self.libxmp_metadata = self.metadata.libxmp_metadata
+
+	def test_verify_synchronized(self):
+		self.assertEqual(self.metadata.verify(), [])
+		self.assertFalse(self.metadata[TEST_NS].desynchronized)
+
+	def test_verify(self):
+		self.libxmp_metadata.delete_property(TEST_NS, "test:a/test:b")
+		self.libxmp_metadata.append_array_item(TEST_NS, "test:d", "3")
+		self.libxmp_metadata.set_property(TEST_NS, "test:f", "4")
+		self.libxmp_metadata.delete_property(TEST_NS, "test:e")
+		self.libxmp_metadata.set_property(TEST_NS, "test:e", "", prop_value_is_struct = True)
+		self.libxmp_metadata.set_property(TEST_NS, "test:e/test:g", "5")
+
+		self.assertItemsEqual(self.metadata.verify(), [(TEST_NS, "test:a/test:b"),
+		                                               (TEST_NS, "test:d[3]"),
+		                                               (TEST_NS, "test:e"),
+		                                               (TEST_NS, "test:f")])
+		self.assertTrue(self.metadata[TEST_NS].a.desynchronized)
+		self.assertTrue(self.metadata[TEST_NS].d.desynchronized)
+
+	def test_resync(self):
+		a = self.metadata[TEST_NS].a
+		d = self.metadata[TEST_NS].d
+		self.libxmp_metadata.delete_property(TEST_NS, "test:a/test:b")
+		self.libxmp_metadata.append_array_item(TEST_NS, "test:d", "3")
+		self.libxmp_metadata.set_property(TEST_NS, "test:f", "4")
+
+		self.assertEqual(len(self.metadata.resync()), 3)
+		self.assertEqual(self.metadata.verify(), [])
+		self.assertIs(self.metadata[TEST_NS].a, a)
+		self.assertIs(self.metadata[TEST_NS].d, d)
+		self.assertEqual(a.value, {"test:c": "2"})
+		self.assertEqual(d.value, ["1", "2", "3"])
+		self.assertEqual(self.metadata[TEST_NS].f.value, "4")
+
+	def test_resync_subtrees(self):
+		self.libxmp_metadata.delete_property(TEST_NS, "test:e")
+		self.libxmp_metadata.set_property(TEST_NS, "test:e", "", prop_value_is_struct = True)
+		self.libxmp_metadata.set_property(TEST_NS, "test:e/test:g", "5")
+		self.libxmp_metadata.set_property(TEST_NS, "test:a/test:h", "", prop_value_is_struct = True)
+		self.libxmp_metadata.set_property(TEST_NS, "test:a/test:h/test:i", "6")
+
+		self.assertItemsEqual(self.metadata.resync(), [(TEST_NS, "test:a/test:h"), (TEST_NS, "test:e")])
+		self.assertEqual(self.metadata.verify(), [])
+		self.assertEqual(self.metadata[TEST_NS].e.value, {"test:g": "5"})
+		self.assertEqual(self.metadata[TEST_NS].a.h.value, {"test:i": "6"})
+
+	def test_resync_new_namespace(self):
+		self.libxmp_metadata.set_property(libxmp.consts.XMP_NS_EXIF, "exif:FNumber", "32/10")
+		self.metadata.resync()
+		self.assertEqual(self.metadata[libxmp.consts.XMP_NS_EXIF].FNumber.value, "32/10")
+
+class TextualizationTests(unittest.TestCase):
+	def setUp(self):
+		self.metadata = XMPMetadata()
+		self.metadata[TEST_NS].update(collections.OrderedDict([
+		  ("a", collections.OrderedDict([("b", "1"), ("c", ["2", "3"])])),
+		  ("d", "4\n5"),
+		]))
+
+	def test_unicode(self):
+		self.assertEqual(unicode(self.metadata), u"\n".join([
+		  TEST_NS,
+		  u"\ttest:a",
+		  u"\t├─── test:b = 1",
+		  u"\t└─── test:c [",
+		  u"\t         ⁃ test:c[1] = 2",
+		  u"\t         ⁃ test:c[2] = 3",
+		  u"\t     ]",
+		  u"\ttest:d = 4",
+		  u"\t5",
+		]))
+
+	def test_textualize(self):
+		stream = io.StringIO()
+		self.metadata.textualize(stream)
+		self.assertEqual(stream.getvalue(), unicode(self.metadata) + u"\n")
+
+	def test_textualize_element(self):
+		stream = io.StringIO()
+		self.metadata[TEST_NS].a.textualize(stream, u"> ", u"| ")
+		self.assertEqual(stream.getvalue().splitlines()[:2], [u"> test:a", u"| ├─── test:b = 1"])
+
+	def test_str(self):
+		a = self.metadata[TEST_NS].a
+		self.assertEqual(str(a), unicode(a).encode("utf-8"))
+		self.assertEqual(unicode(a.c).splitlines(), [u"test:c [", u"    ⁃ test:c[1] = 2",
+		                                         u"    ⁃ test:c[2] = 3", u"]"])
+
+class StructuredExportTests(XMPTestCase):
+	def setUp(self):
+		super(StructuredExportTests, self).setUp()
+		self.example_xmp[TEST_NS].update(collections.OrderedDict([
+		  ("a", collections.OrderedDict([("b", "1"), ("c", ["2", "3"])])),
+		  ("d", set(["4", "5"])),
+		  ("e", [{"f": "6"}]),
+		]))
+
+	def tearDown(self):
+		del self.example_xmp[TEST_NS]
+		super(StructuredExportTests, self).tearDown()
+
+	def test_to_dict(self):
+		values = self.example_xmp.to_dict()
+		self.assertEqual(values, dict((n.uid, n.value) for n in self.example_xmp))
+		self.assertEqual(values[TEST_NS], {"test:a": {"test:b": "1", "test:c": ["2", "3"]},
+		                                   "test:d": set(["4", "5"]),
+		                                   "test:e": [{"test:f": "6"}]})
+		self.assertEqual(values[TEST_NS]["test:a"].keys(), ["test:b", "test:c"])
+
+	def test_from_dict(self):
+		metadata = XMPMetadata.from_dict(self.example_xmp.to_dict())
+		self.assertEqual(metadata.to_dict(), self.example_xmp.to_dict())
+		self.assertIsInstance(metadata[TEST_NS].d, XMPSet)
+		self.assertEqual(metadata[libxmp.consts.XMP_NS_EXIF].FNumber.value, "32/10")
+
+	def test_json(self):
+		stream = io.BytesIO()
+		self.example_xmp.to_json(stream)
+		self.assertIn('"test:d": {"@set": ["4", "5"]}', stream.getvalue())
+		stream.seek(0)
+		self.assertEqual(XMPMetadata.from_json(stream).to_dict(), self.example_xmp.to_dict())
+
+	def test_json_empty_values(self):
+		metadata = XMPMetadata()
+		metadata[TEST_NS].update(collections.OrderedDict([("g", ""), ("h", [""]), ("i", {"j": ""})]))
+		self.assertEqual(metadata.to_dict()[TEST_NS], {"test:g": "", "test:h": [""], "test:i": {"test:j": ""}})
+		stream = io.BytesIO()
+		metadata.to_json(stream)
+		stream.seek(0)
+		self.assertEqual(XMPMetadata.from_json(stream).to_dict(), metadata.to_dict())
+
+class SerializationTests(unittest.TestCase):
+	def setUp(self):
+		self.metadata = XMPMetadata()
+		self.metadata[TEST_NS].update({"a": {"b": 1}, "c": [2], "d": set(["3"])})
+
+	def test_serialize_cached(self):
+		packet = self.metadata.serialize()
+		self.assertEqual(packet, self.metadata._libxmp_metadata.serialize_to_str())
+		self.assertIs(self.metadata.serialize(), packet)
+		self.assertIsNot(self.metadata.serialize(padding = 10), packet)
+		self.assertIs(self.metadata.serialize(formatted = True), self.metadata.serialize(formatted = True))
+
+	def test_mutations_invalidate(self):
+		mutations = [lambda ns: setattr(ns, "e", 4),
+		             lambda ns: ns.a.__setattr__("b", 5),
+		             lambda ns: ns.c.append(6),
+		             lambda ns: ns.d.add("7"),
+		             lambda ns: ns.__delitem__("test:a")]
+		for mutate in mutations:
+			packet = self.metadata.serialize()
+			mutate(self.metadata[TEST_NS])
+			self.assertNotEqual(self.metadata.serialize(), packet)
+			self.assertEqual(self.metadata.serialize(), self.metadata._libxmp_metadata.serialize_to_str())
+
+	def test_direct_mutation(self):
+		for i, libxmp_metadata in enumerate([lambda: self.metadata.libxmp_metadata,
+		                                     lambda: self.metadata[TEST_NS].libxmp_metadata,
+		                                     lambda: self.metadata[TEST_NS].a.libxmp_metadata]):
+			packet = self.metadata.serialize()
+			libxmp_metadata().set_property(TEST_NS, "test:e", str(i))
+			self.assertEqual(self.metadata.serialize(), self.metadata._libxmp_metadata.serialize_to_str())
+			self.assertNotEqual(self.metadata.serialize(), packet)
+
+	def test_touch(self):
+		libxmp_metadata = self.metadata.libxmp_metadata
+		packet = self.metadata.serialize()
+		libxmp_metadata.set_property(TEST_NS, "test:e", "4")
+		self.assertIs(self.metadata.serialize(), packet)
+		self.metadata.touch()
+		self.assertNotEqual(self.metadata.serialize(), packet)
+
+class MemoryReportTests(XMPTestCase):
+	def test_memory_report(self):
+		self.example_xmp[TEST_NS]
+		report = self.example_xmp.memory_report()
+		self.assertEqual(report["elements"]["XMPNamespace"], len(self.EXPECTED_NS_UIDS))
+		self.assertEqual(report["elements"]["XMPVirtualElement"], 1)
+		self.assertEqual(sum(report["elements"].values()),
+		                 len(self.example_xmp._treeElements()) + len(self.EXPECTED_NS_UIDS) + 1)
+		self.assertEqual(sum(report["bytes"].values()) + sys.getsizeof(self.example_xmp._namespaces)
+		                 + sys.getsizeof(self.example_xmp.serialize()), report["estimated_bytes"])
+		self.assertGreater(report["packet_size"], 0)
+		self.assertEqual(report["caches"], {"namespaces": len(self.EXPECTED_NS_UIDS) + 1,
+		                                    "serializations": 1})
+
+	def test_file_memory_report(self):
+		self.example_xmp.touch()
+		report = self.xmp_file.memory_report()
+		self.assertGreater(report["change_check_bytes"], 0)
+		self.assertGreater(report["estimated_bytes"], sum(report["bytes"].values()))
+
 class XMPVirtualElementTests(XMPTestCase):
 	def setUp(self):
 		super(XMPVirtualElementTests, self).setUp()
@@ -502,8 +837,37 @@ class XMPVirtualElementTests(XMPTestCase):
 		self.assertIsInstance(self.exif_ns.inexistent_element.nested_inexistent_element,
 		                      XMPVirtualElement)
 		self.assertIsInstance(self.exif_ns.inexistent_element[2], XMPVirtualElement)
+		# Items are indexed from 0, like those of XMPArray, and addressed from 1
 		self.assertEqual(self.exif_ns.inexistent_element[2].address,
-		                 "%s[2]" % self.exif_ns.inexistent_element.address)
+		                 "%s[3]" % self.exif_ns.inexistent_element.address)
+
+	def test_set_at_address(self):
+		metadata = XMPMetadata()
+		item = metadata[TEST_NS].a[1].b
+		self.assertEqual(item.address, "test:a[2]/test:b")
+		item.__set__(None, 1)
+		self.assertEqual(metadata.libxmp_metadata.get_property(TEST_NS, item.address), "1")
+
+	def test_selector_address(self):
+		metadata = XMPMetadata()
+		address = 'test:a[?xml:lang="x-default"]'
+		element = XMPVirtualElement(metadata[TEST_NS], address)
+		self.assertEqual(element.address, address)
+		self.assertEqual(element.b.address, address + "/test:b")
+		with self.assertRaises(ValueError):
+			element.__set__(None, 1)
+
+	def test_set_in_array_item(self):
+		metadata = XMPMetadata()
+		test_metadata = metadata[TEST_NS]
+		test_metadata.a = [{"b": 1}]
+		test_metadata.a[0].c = 2
+		test_metadata.a[0].d[1].e = 3
+
+		self.assertEqual(len(test_metadata.a), 1)
+		self.assertEqual(test_metadata.a[0].b.value, "1")
+		self.assertEqual(test_metadata.a[0].c.value, "2")
+		self.assertEqual(test_metadata.a[0].d[1].value, {"test:e": "3"})
 
 	def test_parent(self):
 		self.assertIsInstance(self.exif_ns.virtual_element.parent, XMPNamespace)
@@ -570,3 +934,72 @@ class SidecarTests(unittest.TestCase):
 		self.assertTrue(os.path.exists(self.sidecar_only_path))
 		with XMPFile(self.sidecar_only_path, rw=True) as sidecar:
 			self.assertEqual(sidecar.metadata[TEST_NS].structure.value, "value")
+
+	def test_sidecar_read_only(self):
+		with XMPFile(self.sidecar_only_path) as sidecar:
+			self.assertEqual(len(sidecar.metadata), 0)
+		self.assertFalse(os.path.exists(self.sidecar_path))
+
+	def test_compact_sidecar(self):
+		with XMPFile(self.sidecar_only_path, rw=True, compact=True) as sidecar:
+			sidecar.metadata[TEST_NS].structure = "value"
+		with open(self.sidecar_path) as file_handle:
+			self.assertNotIn("<?xpacket", file_handle.read())
+		with XMPFile(self.sidecar_only_path) as sidecar:
+			self.assertEqual(sidecar.metadata[TEST_NS].structure.value, "value")
+
+	def test_compact_has_no_padding(self):
+		with self.assertRaises(ValueError):
+			XMPFile(self.sidecar_only_path, compact=True, padding=1024)
+		with self.assertRaises(ValueError):
+			XMPFile(self.sidecar_only_path, compact=True, in_place=True)
+
+	def test_direct_mutation_written(self):
+		with XMPFile(self.sidecar_only_path, rw=True) as sidecar:
+			sidecar.metadata[TEST_NS].structure = "value"
+			sidecar.metadata.serialize()
+			sidecar.metadata.libxmp_metadata.set_property(TEST_NS, "test:structure", "other value")
+		with XMPFile(self.sidecar_only_path) as sidecar:
+			self.assertEqual(sidecar.metadata.get_many([(TEST_NS, "test:structure")]), ["other value"])
+
+	def test_in_place_update(self):
+		with XMPFile(self.sidecar_only_path, rw=True, padding=4096) as sidecar:
+			sidecar.metadata[TEST_NS].structure = "value"
+		size, inode = os.path.getsize(self.sidecar_path), os.stat(self.sidecar_path).st_ino
+		self.assertGreaterEqual(size, 4096)
+
+		with XMPFile(self.sidecar_only_path, rw=True, in_place=True) as sidecar:
+			sidecar.metadata[TEST_NS].structure = "other value"
+		self.assertEqual(os.path.getsize(self.sidecar_path), size)
+		self.assertEqual(os.stat(self.sidecar_path).st_ino, inode)
+		with XMPFile(self.sidecar_only_path) as sidecar:
+			self.assertEqual(sidecar.metadata[TEST_NS].structure.value, "other value")
+
+	def test_in_place_overflow(self):
+		with XMPFile(self.sidecar_only_path, rw=True, padding=0, in_place=True) as sidecar:
+			sidecar.metadata[TEST_NS].structure = "value"
+		size = os.path.getsize(self.sidecar_path)
+
+		with XMPFile(self.sidecar_only_path, rw=True, in_place=True) as sidecar:
+			sidecar.metadata[TEST_NS].structure = "value" * size
+		self.assertGreater(os.path.getsize(self.sidecar_path), size)
+		with XMPFile(self.sidecar_only_path) as sidecar:
+			self.assertEqual(sidecar.metadata[TEST_NS].structure.value, "value" * size)
+
+	def test_write_atomically(self):
+		with open(self.sidecar_path, "w") as file_handle:
+			file_handle.write("old")
+		os.chmod(self.sidecar_path, 0o640)
+		link_path = self.sidecar_only_path + ".link.xmp"
+		if os.path.lexists(link_path):
+			os.remove(link_path)
+		os.symlink(self.sidecar_path, link_path)
+
+		writeAtomically(link_path, "new")
+		self.assertTrue(os.path.islink(link_path))
+		with open(self.sidecar_path) as file_handle:
+			self.assertEqual(file_handle.read(), "new")
+		self.assertEqual(os.stat(self.sidecar_path).st_mode & 0o777, 0o640)
+		self.assertEqual([name for name in os.listdir(os.path.dirname(self.sidecar_path))
+		                  if name.endswith(".tmp")], [])
+		os.remove(link_path)
@@ -157,6 +157,22 @@
     False
 
 
+    Reading only some properties
+    ----------------------------
+
+    When only a few properties are needed, a projection avoids building the object tree
+    of the whole packet. It lists (namespace, path) pairs; "*" selects a whole namespace.
+
+    :Example:
+
+    >>> myFile = XMPFile("path/to/file", only=[("http://ns.adobe.com/exif/1.0/", "DateTimeOriginal"),
+    ...                                        ("http://ns.adobe.com/tiff/1.0/", "*")])
+    >>> with myFile as _:
+    ...     print [e.address for e in myFile.metadata["http://ns.adobe.com/exif/1.0/"]]
+    ...
+    [u'exif:DateTimeOriginal']
+
+
     Updating metadata
     -----------------
 
@@ -196,6 +212,45 @@
     that namespace.
 
 
+    Many properties can be read or written at once with `get_many` and `set_many`. Paths
+    are element addresses, with libxmp's 1-based array indices; missing containers along
+    the written paths are created.
+
+    :Example:
+
+    >>> myFile.metadata.get_many([("http://ns.adobe.com/exif/1.0/", "ColorSpace"),
+    ...                           ("http://ns.adobe.com/exif/1.0/", "Flash/Mode"),
+    ...                           ("http://ns.adobe.com/exif/1.0/", "ISOSpeedRatings[1]")])
+    [u'2', u'2', u'400']
+    >>> myFile.metadata.set_many({("http://ns.adobe.com/exif/1.0/", "myStruct/myArray[2]/myField"): 2})
+
+    A single path can be written in a namespace with `set_path`:
+
+    >>> myFile.metadata["http://ns.adobe.com/exif/1.0/"].set_path("myStruct/myArray[3]/myField", 3)
+
+    If the underlying libxmp packet (`myFile.libxmp_metadata`) is modified directly, the object
+    tree may no longer match it. `verify` lists the addresses of the divergent subtrees, and
+    `resync` rebuilds only those.
+
+    :Example:
+
+    >>> myFile.libxmp_metadata.set_property("http://ns.adobe.com/exif/1.0/", "exif:Foo", "bar")
+    >>> myFile.metadata.verify()
+    [(u'http://ns.adobe.com/exif/1.0/', u'exif:Foo')]
+    >>> myFile.metadata.resync()
+    [(u'http://ns.adobe.com/exif/1.0/', u'exif:Foo')]
+    >>> myFile.metadata.verify()
+    []
+
+    Sidecar and textual files can be written compactly, without packet wrapper nor padding, or
+    with a chosen padding and updated in place whenever the new packet fits in the file.
+
+    :Example:
+
+    >>> XMPFile("path/to/file.bin", rw=True, compact=True)
+    >>> XMPFile("path/to/file.bin", rw=True, padding=8192, in_place=True)
+
+
     Creating a new namespace
     ------------------------
 
@@ -298,24 +353,23 @@
     u'foo'
 
 """
-import os, glob
+import os
 
 # ––––––––––––––––––
 # Export all modules
 
-__all__ = [os.path.basename(f)[:-3] for f in glob.glob(os.path.dirname(__file__)+"/*.py")]
-
-try: del f # Cleanup the iteration variable so that it's not exported
-except: pass
-
-# ––––––––––––––––––––––––––––
-# Convenience version variable
-
-VERSION = open(os.path.join(os.path.dirname(os.path.realpath(__file__)), "VERSION")).read().split()[0]
+# Listed rather than globbed, to keep importing the package cheap
+__all__ = ["apply", "asynchronous", "batch", "index", "instrumentation", "migrate", "scan", "server", "tracing", "version", "xmp"]
 
 # ––––––––––––––––––––
 # Hook for qiq plugins
 
 QIQ_PLUGIN_PACKAGES = ["qiq"]
 
+# ––––––––––––––––––––––––––––
+# Convenience version variable
+
+with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), "VERSION")) as _version_file:
+	VERSION = _version_file.read().split()[0]
+
 #––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––#
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+    ``xmp.apply`` module
+    ====================
+
+    Applies a stream of edits to the metadata of many files.
+
+    Edits are JSON objects, one per line::
+
+        {"file": "a.jpg", "path": "exif:Artist", "value": "Bob"}
+        {"file": "a.jpg", "namespace": "http://ns.adobe.com/exif/1.0/", "path": "Flash/Mode", "value": 2}
+        {"file": "b.jpg", "path": "exif:Artist", "delete": true}
+
+    The namespace of an edit defaults to the one registered for the prefix of its
+    path. Values may be strings, numbers, lists (arrays) or objects (structs).
+
+    Edits are grouped by file while reading them: up to a number of files are
+    buffered, after which the edits of the file first seen are applied in one
+    read-write opening of that file. Edits of a file appearing again later are
+    applied in a later opening, in order. The edits of a group are applied all or
+    none: if one fails, the file is left unchanged. Files are processed by a pool
+    of worker processes, never two for the same file at once, even through
+    different paths.
+
+    Each processed group of edits is recorded in a log, as a JSON object per line,
+    and the numbers of the processed lines of the edits stream in a checkpoint,
+    appended to after each group. When applying the same edits again with the same
+    checkpoint, the processed lines are skipped. Edits are not idempotent, e.g.
+    deleting an array item by index or appending to an array, so only the group of
+    edits being written when the process was killed may be applied again.
+
+    :Example:
+
+    >>> from xmp.apply import applyEdits
+    >>> with open("edits.jsonl") as edits, open("edits.log", "a") as log:
+    ...     applyEdits(edits, log, checkpoint_path = "edits.checkpoint")
+    {'files': 2, 'edits': 3, 'errors': 0}
+"""
+
+# Standard Library
+import collections
+import json
+import os
+import time
+# Xmp
+from .batch import DEFAULT_CHECKPOINT_INTERVAL, Checkpoint, imapExclusive
+from .xmp import XMPFile, isQualified, namespaceForPrefix, rootAddress
+
+DEFAULT_BUFFER_SIZE = 1024
+
+Edit = collections.namedtuple("Edit", ["line", "file_path", "namespace", "path", "value", "delete"])
+
+class EditError(collections.namedtuple("EditError", ["line", "message"])):
+	""" Edit that could not be read """
+
+# ───────
+# Reading
+
+def readEdits(lines, skip = None):
+	"""
+	Yields the edits of a stream of JSON lines, or EditErrors for invalid ones.
+
+	Arguments:
+		lines: Iterable of lines, numbered from 1.
+		skip:  Optional function of a line number, telling if it must be skipped.
+	"""
+	prefixes = {}
+	for line_number, line in enumerate(lines, 1):
+		if skip is not None and skip(line_number):
+			continue
+		if not line.strip():
+			continue
+		try:
+			edit = json.loads(line)
+			path = edit["path"]
+			namespace = edit.get("namespace")
+			if namespace is None:
+				root = rootAddress(path)
+				prefix = root.split(":")[0] if isQualified(root) else None
+				if prefix not in prefixes:
+					prefixes[prefix] = namespaceForPrefix(prefix) if prefix else None
+				namespace = prefixes[prefix]
+				if namespace is None:
+					raise ValueError("Can't find the namespace of property {}".format(path))
+			delete = bool(edit.get("delete"))
+			if not delete and "value" not in edit:
+				raise ValueError("Edit has neither a value nor delete")
+			yield Edit(line_number, edit["file"], namespace, path, edit.get("value"), delete)
+		except (ValueError, KeyError, TypeError, AttributeError) as e:
+			yield EditError(line_number, "{}: {}".format(type(e).__name__, e))
+
+def groupEdits(edits, buffer_size = DEFAULT_BUFFER_SIZE):
+	"""
+	Groups consecutive-enough edits of the same file.
+
+	Arguments:
+		edits:       Iterable of Edits and EditErrors; EditErrors are yielded as is.
+		buffer_size: Maximum number of files the edits of which are buffered.
+
+	Yields:
+		(file path, list of edits) pairs, and EditErrors.
+	"""
+	groups = collections.OrderedDict()
+	for edit in edits:
+		if isinstance(edit, EditError):
+			yield edit
+			continue
+		groups.setdefault(edit.file_path, []).append(edit)
+		if len(groups) > buffer_size:
+			yield groups.popitem(last = False)
+	while groups:
+		yield groups.popitem(last = False)
+
+# ────────
+# Applying
+
+def applyFileEdits(group):
+	"""
+	Applies the edits of a file in one read-write opening.
+
+	Runs in worker processes; errors are reported in the result. The edits of a
+	file are applied all or none: if one fails, the file is left unchanged.
+
+	Returns:
+		A dict with the file path, the edits' line numbers, the numbers of set and
+		deleted properties, and the error if any.
+	"""
+	file_path, edits = group
+	result = dict(file = file_path, lines = [e.line for e in edits], set = 0, deleted = 0)
+	try:
+		if not os.path.isfile(file_path):
+			raise IOError("No such file: '{}'".format(file_path))
+		xmp_file = XMPFile(file_path, rw = True)
+		xmp_file.open()
+		try:
+			metadata = xmp_file.metadata
+			set_count = deleted_count = 0
+			# Apply runs of sets or deletes in bulk, keeping the order of edits
+			for i, edit in enumerate(edits):
+				if i and edit.delete == edits[i-1].delete:
+					continue
+				run = [edit]
+				for next_edit in edits[i+1:]:
+					if next_edit.delete != edit.delete: break
+					run.append(next_edit)
+				if edit.delete:
+					deleted_count += metadata.delete_many((e.namespace, e.path) for e in run)
+				else:
+					metadata.set_many(((e.namespace, e.path), e.value) for e in run)
+					set_count += len(run)
+		except:
+			xmp_file.close(save = False)
+			raise
+		xmp_file.close()
+		result.update(set = set_count, deleted = deleted_count)
+	except Exception as e:
+		result["error"] = "{}: {}".format(type(e).__name__, e)
+	return result
+
+def applyEdits(lines, log, checkpoint_path = None, jobs = None,
+               buffer_size = DEFAULT_BUFFER_SIZE):
+	"""
+	Applies a stream of edits.
+
+	Arguments:
+		lines:               Iterable of JSON lines, e.g. an open file.
+		log:                 File object to write a JSON result per line to.
+		checkpoint_path:     Optional path of the checkpoint, read if it exists,
+		                     appended to after each processed file and synced to disk
+		                     at least every DEFAULT_CHECKPOINT_INTERVAL seconds.
+		jobs:                Number of worker processes; see :func:`xmp.batch.imapFiles`.
+		buffer_size:         Maximum number of files the edits of which are buffered.
+
+	Returns:
+		A dict with the numbers of processed files, processed edits, and errors.
+	"""
+	checkpoint = Checkpoint.load(checkpoint_path)
+	summary = dict(files = 0, edits = 0, errors = 0)
+
+	def record(result):
+		log.write(json.dumps(result) + "\n")
+		failed = "error" in result
+		checkpoint.add(result["lines"],
+		               failure = (result.get("file"), result["error"]) if failed else None)
+		if failed:
+			summary["errors"] += 1
+
+	edit_errors = []
+	def tasks():
+		for task in groupEdits(readEdits(lines, checkpoint.isDone), buffer_size):
+			if isinstance(task, EditError):
+				edit_errors.append(task)
+			else:
+				yield task
+
+	# Paths of the same file, e.g. through symbolic links, must not be written concurrently
+	results = imapExclusive(applyFileEdits, tasks(), key = lambda g: os.path.realpath(g[0]), jobs = jobs)
+	last_sync_time = time.time()
+	try:
+		for result in results:
+			while edit_errors:
+				edit_error = edit_errors.pop(0)
+				record(dict(lines = [edit_error.line], error = edit_error.message))
+			record(result)
+			summary["files"] += 1
+			summary["edits"] += len(result["lines"])
+			# Edits are not idempotent: don't apply those of this file again on resume,
+			# even if the run crashes, while syncing the checkpoint to disk in batches
+			if checkpoint_path is not None:
+				log.flush()
+				now = time.time()
+				sync = now - last_sync_time >= DEFAULT_CHECKPOINT_INTERVAL
+				checkpoint.save(sync = sync)
+				if sync:
+					last_sync_time = now
+		for edit_error in edit_errors:
+			record(dict(lines = [edit_error.line], error = edit_error.message))
+	finally:
+		log.flush()
+		if checkpoint_path is not None:
+			checkpoint.save()
+	return summary
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+    ``xmp.asynchronous`` module
+    ===========================
+
+    Runs the blocking parts of XMP file manipulation (disk access, exempi parsing
+    and serialization) on an executor, so that they don't block the caller.
+
+    :class:`AsyncXMPFile` wraps a :class:`xmp.xmp.XMPFile`, which stays the only
+    implementation of opening, writing and closing; its `open`, `flush` and
+    `close` methods return futures resolving to the file itself.
+
+    :Example:
+
+    >>> from xmp.asynchronous import AsyncXMPFile, iterOpen
+    >>> xmp_file = AsyncXMPFile("path/to/file").open().result()
+    >>> xmp_file.metadata["http://ns.adobe.com/exif/1.0/"]["ColorSpace"].value
+    u'1'
+    >>> xmp_file.close().result().is_open
+    False
+
+    Many files can be processed with a bounded number of concurrent opens. Files
+    are yielded in completion order, and each one is closed as soon as the
+    iteration moves on to the next one.
+
+    >>> for xmp_file in iterOpen(["a.jpg", "b.jpg", "c.jpg"], max_pending=2):
+    ...     print xmp_file.metadata["http://ns.adobe.com/tiff/1.0/"]["Model"].value
+
+    ..note:: Python 2 has no asyncio; futures come from the standard
+    `concurrent.futures` module, available through the `futures` backport. Any
+    `concurrent.futures.Executor` can be given, otherwise a shared thread pool
+    is used.
+"""
+
+# Futures
+try:
+	import concurrent.futures
+	has_futures = True
+except ImportError:
+	has_futures = False
+# XMP
+from .xmp import XMPFile
+
+# ──────────
+# Parameters
+
+DEFAULT_MAX_WORKERS = 4
+
+# ─────────
+# Executors
+
+_default_executor = None
+
+def defaultExecutor():
+	"""
+	Returns the thread pool shared by asynchronous files created without an executor.
+	"""
+	global _default_executor
+	if not has_futures:
+		raise ImportError("concurrent.futures is required; install the 'futures' package or give an executor")
+	if _default_executor is None:
+		_default_executor = concurrent.futures.ThreadPoolExecutor(max_workers = DEFAULT_MAX_WORKERS)
+	return _default_executor
+
+class AsyncXMPFile(object):
+	"""
+	An XMP file whose blocking operations run on an executor.
+
+	Attributes:
+		xmp_file: The synchronous file doing the actual work.
+		executor: The executor on which blocking operations are submitted.
+	"""
+
+	# ───────────
+	# Constructor
+
+	def __init__(self, file_path, rw = False, executor = None, only = None):
+		self.xmp_file = XMPFile(file_path, rw = rw, only = only)
+		self.executor = executor if executor is not None else defaultExecutor()
+
+	# ──────────
+	# Properties
+
+	@property
+	def file_path(self):
+		return self.xmp_file.file_path
+
+	@property
+	def rw(self):
+		return self.xmp_file.rw
+
+	@property
+	def is_open(self):
+		return self.xmp_file.is_open
+
+	@property
+	def metadata(self):
+		return self.xmp_file.metadata
+
+	@property
+	def libxmp_metadata(self):
+		return self.xmp_file.libxmp_metadata
+
+	# ───────────
+	# General API
+
+	def open(self):
+		""" Opens the file on the executor; returns a future resolving to this file. """
+		return self._submit(self.xmp_file.open)
+
+	def flush(self):
+		""" Writes the metadata on the executor; returns a future resolving to this file. """
+		return self._submit(self.xmp_file.flush)
+
+	def close(self):
+		""" Closes the file on the executor; returns a future resolving to this file. """
+		return self._submit(self.xmp_file.close)
+
+	# ───────────────
+	# Context Manager
+
+	def __enter__(self):
+		return self.open().result()
+
+	def __exit__(self, type, value, traceback):
+		self.close().result()
+
+	# ───────
+	# Helpers
+
+	def _submit(self, operation):
+		def run():
+			operation()
+			return self
+		return self.executor.submit(run)
+
+	# ──────────────
+	# Textualization
+
+	def __str__(self):
+		return str(self.xmp_file)
+
+# ───────────────
+# Batch iteration
+
+def iterOpen(file_paths, rw = False, executor = None, max_pending = DEFAULT_MAX_WORKERS, on_error = None,
+             only = None):
+	"""
+	Opens files concurrently and yields them in completion order.
+
+	At most `max_pending` files are being opened at any time. A yielded file is
+	closed (and written if `rw`) when the iteration resumes; files that were
+	opened but not yielded because the iteration stopped early are closed too.
+
+	Arguments:
+		file_paths:  Iterable of paths, consumed lazily.
+		rw:          Whether to open the files for writing.
+		executor:    A concurrent.futures.Executor; the shared pool by default.
+		max_pending: Maximum number of files being opened concurrently.
+		on_error:    Called with (file_path, exception) when a file can't be
+		             opened; if None, the exception is raised.
+		only:        Projection of the metadata to load; see :class:`xmp.xmp.XMPMetadata`.
+	"""
+	if executor is None:
+		executor = defaultExecutor()
+	if max_pending < 1:
+		raise ValueError("max_pending must be at least 1; given " + str(max_pending))
+
+	file_paths = iter(file_paths)
+	opening = dict()
+	closing = []
+
+	def openNext():
+		for file_path in file_paths:
+			xmp_file = AsyncXMPFile(file_path, rw = rw, executor = executor, only = only)
+			opening[xmp_file.open()] = xmp_file
+			return
+
+	try:
+		for _ in range(max_pending):
+			openNext()
+
+		while opening:
+			done, _ = concurrent.futures.wait(opening, return_when = concurrent.futures.FIRST_COMPLETED)
+			for future in done:
+				xmp_file = opening.pop(future)
+				openNext()
+				if future.exception() is not None:
+					if on_error is None:
+						raise future.exception()
+					on_error(xmp_file.file_path, future.exception())
+					continue
+				try:
+					yield xmp_file
+				finally:
+					closing.append(xmp_file.close())
+
+	finally:
+		for future, xmp_file in opening.iteritems():
+			if future.exception() is None:
+				closing.append(xmp_file.close())
+		for future in closing:
+			future.result()
@@ -0,0 +1,458 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+    ``xmp.batch`` module
+    ====================
+
+    Processes many files with a pool of worker processes.
+
+    exempi parsing and serialization hold the interpreter lock, so processes rather
+    than threads are used to spread work over several cores. Functions applied to
+    files must be picklable, i.e. defined at module level (or partial applications
+    of such functions), and so must their results.
+
+    :Example:
+
+    >>> from xmp.batch import imapFiles
+    >>> for result in imapFiles(readModel, ["a.jpg", "b.jpg", "c.jpg"], jobs=2):
+    ...     print result
+
+    Long runs are better made resumable with a :class:`JobRunner`, which records
+    the processed files in a checkpoint and reports its progress.
+
+    >>> from xmp.batch import JobRunner
+    >>> runner = JobRunner(readModel, checkpoint_path="models.checkpoint", progress=sys.stderr)
+    >>> for result in runner.run(open("manifest.txt").read().splitlines()):
+    ...     print result
+    >>> runner.summary
+    {'files': 3, 'bytes': 1517, 'failures': 0, 'seconds': 0.04}
+"""
+
+# Standard Library
+import collections
+import datetime
+import functools
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import time
+
+DEFAULT_CHECKPOINT_INTERVAL = 10
+# Fewest tasks for which a pool is started when the number of jobs is not given
+POOL_MIN_TASKS = 8
+DEFAULT_PROGRESS_INTERVAL = 1
+
+def defaultJobCount():
+	""" Returns the default number of worker processes: the number of CPUs. """
+	try:
+		return multiprocessing.cpu_count()
+	except NotImplementedError:
+		return 1
+
+def defaultJobs(tasks):
+	"""
+	Returns the number of worker processes to run tasks with when it is not given,
+	and the tasks.
+
+	Starting a pool and passing results back between processes costs more than
+	processing a few files, so fewer than POOL_MIN_TASKS tasks run in the calling
+	process; more run with one worker per CPU. The first tasks are read ahead to
+	count them, and returned with the others.
+	"""
+	tasks = iter(tasks)
+	first_tasks = list(itertools.islice(tasks, POOL_MIN_TASKS))
+	jobs = 1 if len(first_tasks) < POOL_MIN_TASKS else defaultJobCount()
+	return jobs, itertools.chain(first_tasks, tasks)
+
+def imapFiles(function, file_paths, jobs = None, ordered = False, chunk_size = 1):
+	"""
+	Applies a function to file paths with a pool of worker processes.
+
+	Arguments:
+		function:   Picklable function of a file path, returning a picklable result.
+		            Exceptions it raises abort the batch; catch them in the function
+		            to report errors per file.
+		file_paths: Iterable of file paths; it is consumed as workers need tasks.
+		jobs:       Number of worker processes; by default, see :func:`defaultJobs`.
+		            With 1 job, files are processed in the calling process.
+		ordered:    Whether results are yielded in the order of file_paths rather
+		            than as soon as they are ready.
+		chunk_size: Number of files sent to a worker at once.
+
+	Yields:
+		The results of function for each file path.
+	"""
+	if jobs is None:
+		jobs, file_paths = defaultJobs(file_paths)
+	if jobs <= 1:
+		for file_path in file_paths:
+			yield function(file_path)
+		return
+
+	pool = multiprocessing.Pool(jobs)
+	try:
+		imap = pool.imap if ordered else pool.imap_unordered
+		for result in imap(function, file_paths, chunk_size):
+			yield result
+		pool.close()
+	finally:
+		pool.terminate()
+		pool.join()
+
+def imapExclusive(function, tasks, key, jobs = None, max_pending = None):
+	"""
+	Applies a function to tasks with a pool of worker processes, never running two
+	tasks with the same key at the same time.
+
+	Tasks with the same key, e.g. several tasks writing the same file, run in the
+	order they are given.
+
+	Arguments:
+		function:    Picklable function of a task, returning a picklable result.
+		tasks:       Iterable of picklable tasks; it is consumed as workers need tasks.
+		key:         Function of a task returning its key.
+		jobs:        Number of worker processes, as for :func:`imapFiles`.
+		max_pending: Maximum number of tasks submitted and not yet yielded; twice
+		             the number of jobs by default.
+
+	Yields:
+		The results of function for each task, in submission order of the tasks
+		when they were waited for.
+	"""
+	if jobs is None:
+		jobs, tasks = defaultJobs(tasks)
+	if jobs <= 1:
+		for task in tasks:
+			yield function(task)
+		return
+	if max_pending is None:
+		max_pending = 2*jobs
+
+	pool = multiprocessing.Pool(jobs)
+	pending = collections.deque()
+	try:
+		for task in tasks:
+			task_key = key(task)
+			while pending and (len(pending) >= max_pending
+			                   or any(k == task_key for k, _ in pending)):
+				yield pending.popleft()[1].get()
+			pending.append((task_key, pool.apply_async(function, (task,))))
+		while pending:
+			yield pending.popleft()[1].get()
+		pool.close()
+	finally:
+		pool.terminate()
+		pool.join()
+
+def fileSignature(file_path):
+	"""
+	Returns the (inode, size, mtime) of a file and of its sidecar, if any, which
+	change whenever the metadata of the file may have changed
+	"""
+	signature = []
+	for path in (file_path, file_path + ".xmp"):
+		try:
+			status = os.stat(path)
+			signature.append((status.st_ino, status.st_size, status.st_mtime))
+		except OSError:
+			signature.append(None)
+	return tuple(signature)
+
+# ──────────
+# Job runner
+
+class JobRunner(object):
+	"""
+	Resumable processing of a manifest of files with a pool of worker processes.
+
+	The function applied to files reports a failure by returning a dict with an
+	"error" key, like the worker functions of the xmp commands. Processed files are
+	identified by a hash of their path, see :func:`pathKey`, so a resumed run may
+	be given a manifest in another order, or with files added or removed, e.g. by
+	walking directories again.
+
+	Attributes:
+		summary: Numbers of processed files, their bytes, failures, and the elapsed
+		         seconds of the last run.
+	"""
+
+	def __init__(self, function, checkpoint_path = None, jobs = None, ordered = False,
+	             retry_failures = False, progress = None,
+	             checkpoint_interval = DEFAULT_CHECKPOINT_INTERVAL,
+	             progress_interval = DEFAULT_PROGRESS_INTERVAL):
+		"""
+		Arguments:
+			function:            Picklable function of a file path; see :func:`imapFiles`.
+			checkpoint_path:     Optional path of the checkpoint, read if it exists, and
+			                     written at least every checkpoint_interval seconds and
+			                     when the run ends, even on error.
+			jobs:                Number of worker processes; see :func:`imapFiles`.
+			ordered:             Whether results are yielded in manifest order.
+			retry_failures:      Whether files which failed in a previous run are processed
+			                     again, rather than skipped like successful ones.
+			progress:            Optional stream to report progress to, at most every
+			                     progress_interval seconds.
+		"""
+		self.function = function
+		self.checkpoint_path = checkpoint_path
+		self.jobs = jobs
+		self.ordered = ordered
+		self.retry_failures = retry_failures
+		self.progress = progress
+		self.checkpoint_interval = checkpoint_interval
+		self.progress_interval = progress_interval
+		self.summary = dict(files = 0, bytes = 0, failures = 0, seconds = 0)
+
+	def run(self, file_paths, total = None):
+		"""
+		Processes the files of a manifest which were not processed in a previous run.
+
+		Arguments:
+			file_paths: Iterable of file paths.
+			total:      Number of file paths, to estimate the remaining time if
+			            file_paths has no length.
+
+		Yields:
+			The results of the function for each processed file.
+		"""
+		checkpoint = Checkpoint.load(self.checkpoint_path)
+		def pendingTasks():
+			for file_path in file_paths:
+				key = pathKey(file_path)
+				if not checkpoint.isDone(key, self.retry_failures):
+					yield key, file_path
+
+		tasks = pendingTasks()
+		if hasattr(file_paths, "__len__"):
+			# Count the files actually left, whichever of them the checkpoint covers
+			tasks = list(tasks)
+			remaining = len(tasks)
+		elif total is not None:
+			skipped = checkpoint.count()
+			if self.retry_failures:
+				skipped -= len(checkpoint.failures)
+			remaining = max(total - skipped, 0)
+		else:
+			remaining = None
+
+		meter = ProgressMeter(remaining)
+		self.summary = dict(files = 0, bytes = 0, failures = 0, seconds = 0)
+		last_save_time = last_report_time = time.time()
+		try:
+			for key, file_path, size, result in imapFiles(functools.partial(runTask, self.function),
+			                                              tasks, jobs = self.jobs,
+			                                              ordered = self.ordered):
+				failed = isinstance(result, dict) and "error" in result
+				checkpoint.add([key], failure = (file_path, result["error"]) if failed else None)
+				meter.add(size)
+				self.summary["files"] += 1
+				self.summary["bytes"] += size
+				self.summary["failures"] += failed
+				yield result
+
+				now = time.time()
+				if self.checkpoint_path is not None and now - last_save_time >= self.checkpoint_interval:
+					checkpoint.save()
+					last_save_time = now
+				if self.progress is not None and now - last_report_time >= self.progress_interval:
+					self.progress.write(meter.report(self.summary["failures"]) + "\n")
+					last_report_time = now
+		finally:
+			if self.checkpoint_path is not None:
+				checkpoint.save()
+			self.summary["seconds"] = meter.elapsed
+			if self.progress is not None:
+				self.progress.write(meter.report(self.summary["failures"]) + "\n")
+
+def runTask(function, task):
+	""" Runs a job runner task in a worker: returns its key, path, size and result """
+	key, file_path = task
+	try:
+		size = os.path.getsize(file_path)
+	except OSError:
+		size = 0
+	return key, file_path, size, function(file_path)
+
+def pathKey(file_path):
+	""" Returns the checkpoint key of a file: the SHA-1 of its absolute path """
+	if isinstance(file_path, unicode):
+		file_path = file_path.encode("utf-8")
+	return hashlib.sha1(os.path.abspath(file_path)).hexdigest()
+
+class ProgressMeter(object):
+	""" Throughput and remaining time of a run """
+
+	def __init__(self, total = None):
+		self.total = total
+		self.count = 0
+		self.bytes = 0
+		self.start_time = time.time()
+
+	@property
+	def elapsed(self):
+		return time.time() - self.start_time
+
+	def add(self, size):
+		self.count += 1
+		self.bytes += size
+
+	def report(self, failure_count = 0):
+		elapsed = max(self.elapsed, 1e-6)
+		files_per_second = self.count / elapsed
+		report = "{count}{total} files, {fps:.1f} files/s, {mbps:.2f} MB/s".format(
+			count = self.count,
+			total = "" if self.total is None else "/{}".format(self.total),
+			fps = files_per_second,
+			mbps = self.bytes / elapsed / 1e6
+		)
+		if self.total is not None and files_per_second:
+			remaining = max(self.total - self.count, 0) / files_per_second
+			report += ", ETA {}".format(datetime.timedelta(seconds = int(round(remaining))))
+		if failure_count:
+			report += ", {} failed".format(failure_count)
+		return report
+
+# ──────────
+# Checkpoint
+
+class Checkpoint(object):
+	"""
+	Set of processed keys: positions, e.g. of lines in a stream, or strings, e.g.
+	the :func:`pathKey` of files.
+
+	Positions are stored compactly as the first position not processed, all
+	positions before which are, and the processed positions after it; other keys
+	are stored as is. Failures are also recorded, with their key, path and error.
+
+	The checkpoint file is a journal of JSON lines: a snapshot of the checkpoint,
+	followed by the keys added since, appended by :meth:`save`. Saving thus costs
+	the keys added since the last save rather than all keys; the journal is
+	compacted into a single snapshot when it is loaded.
+	"""
+
+	def __init__(self, path = None, next_position = 1, done = (), failures = None):
+		self.path = path
+		self.next_position = next_position
+		self.done = set(done)
+		self.failures = failures or {}
+		self._journal = []
+
+	@staticmethod
+	def load(path):
+		""" Loads and compacts a checkpoint, or returns an empty one if path doesn't exist """
+		checkpoint = Checkpoint(path)
+		if path is None or not os.path.exists(path):
+			return checkpoint
+		with open(path) as checkpoint_file:
+			for line in checkpoint_file:
+				try:
+					entry = json.loads(line)
+				except ValueError:
+					# Last entry of a journal cut short by a crash
+					break
+				if "next_position" in entry:
+					checkpoint.next_position = entry["next_position"]
+					checkpoint.done = set(entry["done"])
+					checkpoint.failures = dict((key, (file_path, error))
+					                           for key, file_path, error in entry.get("failures", []))
+				else:
+					checkpoint.add(entry["keys"], failure = entry["failure"] and tuple(entry["failure"]))
+		checkpoint._journal = []
+		checkpoint.compact()
+		return checkpoint
+
+	def isDone(self, key, retry_failures = False):
+		if retry_failures and key in self.failures:
+			return False
+		return isPosition(key) and key < self.next_position or key in self.done
+
+	def count(self):
+		""" Returns the number of processed keys """
+		return self.next_position - 1 + len(self.done)
+
+	def add(self, keys, failure = None):
+		"""
+		Records processed keys, until the next save in the checkpoint file.
+
+		Arguments:
+			failure: Optional (path, error) of a failure at these keys; otherwise,
+			         previous failures at these keys are forgotten.
+		"""
+		for key in keys:
+			if failure is not None:
+				self.failures[key] = failure
+			else:
+				self.failures.pop(key, None)
+			if not isPosition(key) or key >= self.next_position:
+				self.done.add(key)
+		while self.next_position in self.done:
+			self.done.remove(self.next_position)
+			self.next_position += 1
+		self._journal.append(dict(keys = list(keys), failure = failure))
+
+	def save(self, sync = True):
+		"""
+		Appends the keys added since the last save to the checkpoint file.
+
+		Arguments:
+			sync: Whether to wait for the file to be written to disk. Unsynced entries
+			      survive the process crashing, but not the system.
+		"""
+		if not self._journal and not sync:
+			return
+		with open(self.path, "a") as checkpoint_file:
+			for entry in self._journal:
+				checkpoint_file.write(json.dumps(entry) + "\n")
+			checkpoint_file.flush()
+			if sync:
+				os.fsync(checkpoint_file.fileno())
+		self._journal = []
+
+	def compact(self):
+		""" Rewrites the checkpoint file atomically as a single snapshot """
+		temporary_path = self.path + ".tmp"
+		with open(temporary_path, "w") as checkpoint_file:
+			json.dump(dict(next_position = self.next_position,
+			               done = sorted(self.done),
+			               failures = [[key, file_path, error]
+			                           for key, (file_path, error) in sorted(self.failures.iteritems())]),
+			          checkpoint_file)
+			checkpoint_file.write("\n")
+			checkpoint_file.flush()
+			os.fsync(checkpoint_file.fileno())
+		os.rename(temporary_path, self.path)
+		self._journal = []
+
+def isPosition(key):
+	return isinstance(key, (int, long))
@@ -28,63 +28,272 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-# Argparse
+# Standard Library
 import argparse
-try:
-	import argcomplete
-	has_argcomplete = True
-except ImportError:
+import os
+# Argcomplete; only needed when launched by it to complete a command line
+if "_ARGCOMPLETE" in os.environ:
+	try:
+		import argcomplete
+		has_argcomplete = True
+	except ImportError:
+		has_argcomplete = False
+else:
 	has_argcomplete = False
 
 # xmp
-from .xmp import XMPCommand
 from .. import version
 
+# Subcommands are imported when they run, so that building the parser, printing
+# help or completing a command line doesn't load libxmp.
+
 DESCRIPTION = "Manipulate XMP metadata"
 
-def make_command_parser(parent_parser=argparse.ArgumentParser(description=DESCRIPTION)):
+def make_command_parser(parent_parser=None):
+	if parent_parser is None:
+		parent_parser = argparse.ArgumentParser(description=DESCRIPTION)
 	subparsers = parent_parser.add_subparsers()
 
 	parent_parser.add_argument("-v", "--version", action=version.VersionAction, nargs=0,
 	                           help="print xmp release version number")
+	parent_parser.add_argument("--profile", action="store_true",
+	                           help="report the libxmp calls and their time per XMP operation on "
+	                                "stderr; the command runs in a single process")
+	parent_parser.add_argument("--trace", metavar="FILE",
+	                           help="append the timings of XMP file operations and their phases to "
+	                                "FILE, as JSON objects, one per line")
+	parent_parser.add_argument("--slow", type=float, metavar="SECONDS",
+	                           help="log the XMP file operations lasting longer than SECONDS on stderr")
 
 	# ────────────────
 	# show sub-command
 
 	show_parser = subparsers.add_parser("show", description="show XMP")
-	file_argument = show_parser.add_argument("file", help="what to examine")
+	file_argument = addFilesArguments(show_parser, "what to examine")
+	addPoolArguments(show_parser)
+	show_parser.add_argument("-f", "--format", choices=["text", "json"], default="text",
+	                         help="output a textual tree per file, or a JSON object per line")
+	show_parser.add_argument("--fields", nargs="+", metavar="PROPERTY",
+	                         help="only show these properties")
+	addNamespaceArgument(show_parser)
 	if has_argcomplete: file_argument.completer = argcomplete.completers.FilesCompleter()
-	show_parser.set_defaults(func=XMPCommand.show)
+	show_parser.set_defaults(func=xmpCommand("show"))
 
 	# ───────────────
 	# xml sub-command
 
 	xml_parser = subparsers.add_parser("xml", description="show XMP as XML")
-	file_argument = xml_parser.add_argument("file", help="what to examine")
+	file_argument = addFilesArguments(xml_parser, "what to examine")
+	addPoolArguments(xml_parser)
+	if has_argcomplete: file_argument.completer = argcomplete.completers.FilesCompleter()
+	xml_parser.set_defaults(func=xmpCommand("xml"))
+
+	# ────────────────
+	# find sub-command
+
+	find_parser = subparsers.add_parser("find", description="find files the XMP of which matches predicates")
+	file_argument = find_parser.add_argument("files", nargs="*", metavar="file",
+	                                         help="files or directories to search; - reads paths from stdin")
+	addManifestArgument(find_parser)
+	find_parser.add_argument("-w", "--where", action="append", required=True, metavar="PREDICATE",
+	                         help="condition on a property, e.g. exif:ISOSpeedRatings>=800 or "
+	                              "tiff:Model~Pepper; operators are =, !=, <, <=, >, >= and ~ "
+	                              "(regular expression search), and a property alone checks it "
+	                              "exists; may be repeated, all conditions must hold")
+	find_parser.add_argument("-0", "--print0", action="store_true",
+	                         help="separate paths with null characters, as for xargs -0")
+	addPoolArguments(find_parser)
+	addNamespaceArgument(find_parser)
 	if has_argcomplete: file_argument.completer = argcomplete.completers.FilesCompleter()
-	xml_parser.set_defaults(func=XMPCommand.xml)
+	find_parser.set_defaults(func=xmpCommand("find"))
 
 	# ───────────────
 	# set sub-command
 
-	set_parser = subparsers.add_parser("set", description="modify an XMP property")
-	file_argument      = set_parser.add_argument("file", help="file to modify")
-	namespace_argument = set_parser.add_argument("namespace", help="namespace to operate on")
-	property_argument  = set_parser.add_argument("property", help="XMP property to set")
-	value_argument     = set_parser.add_argument("value", help="XMP property to set")
+	set_parser = subparsers.add_parser("set", description="modify XMP properties of files")
+	file_argument = addFilesArguments(set_parser, "files to modify")
+	set_parser.add_argument("-p", "--property", nargs=2, action="append", required=True,
+	                        dest="properties", metavar=("PROPERTY", "VALUE"),
+	                        help="XMP property to set, e.g. exif:Flash/exif:Mode 2; may be repeated")
+	addPoolArguments(set_parser)
+	addNamespaceArgument(set_parser)
 	if has_argcomplete: file_argument.completer = argcomplete.completers.FilesCompleter()
-	set_parser.set_defaults(func=XMPCommand.set)
+	set_parser.set_defaults(func=xmpCommand("set"))
 
 	# ──────────────────
 	# delete sub-command
 
-	delete_parser = subparsers.add_parser("delete", description="delete an XMP property")
-	file_argument      = delete_parser.add_argument("file", help="file to modify")
-	namespace_argument = delete_parser.add_argument("namespace", help="namespace to operate on")
-	property_argument  = delete_parser.add_argument("property", help="XMP property to set")
+	delete_parser = subparsers.add_parser("delete", description="delete XMP properties of files")
+	file_argument = addFilesArguments(delete_parser, "files to modify")
+	delete_parser.add_argument("-p", "--property", action="append", required=True,
+	                           dest="properties", metavar="PROPERTY",
+	                           help="XMP property to delete; may be repeated")
+	addPoolArguments(delete_parser)
+	addNamespaceArgument(delete_parser)
 	if has_argcomplete: file_argument.completer = argcomplete.completers.FilesCompleter()
-	delete_parser.set_defaults(func=XMPCommand.delete)
+	delete_parser.set_defaults(func=xmpCommand("delete"))
+
+	# ─────────────────
+	# apply sub-command
+
+	apply_parser = subparsers.add_parser("apply", description="apply a stream of edits to the XMP of "
+	                                     "files; edits are JSON objects, one per line, such as "
+	                                     '{"file": "a.jpg", "path": "exif:Artist", "value": "Bob"} or '
+	                                     '{"file": "a.jpg", "namespace": "http://ns.adobe.com/exif/1.0/", '
+	                                     '"path": "Artist", "delete": true}')
+	edits_argument = apply_parser.add_argument("edits", help="file of edits, or - for stdin")
+	apply_parser.add_argument("--log", help="file to append results to, one JSON object per line; "
+	                                        "EDITS.log by default, stdout for stdin")
+	apply_parser.add_argument("--checkpoint", help="file recording the processed edits, so that an "
+	                                               "interrupted run can be resumed; EDITS.checkpoint "
+	                                               "by default, none for stdin")
+	apply_parser.add_argument("--buffer-size", type=int, default=1024,
+	                          help="number of files the edits of which are grouped before applying them")
+	apply_parser.add_argument("-j", "--jobs", type=int,
+	                          help="number of worker processes; the number of CPUs by default, or none for "
+	                               "fewer than 8 files, which are processed in this process")
+	if has_argcomplete: edits_argument.completer = argcomplete.completers.FilesCompleter()
+	apply_parser.set_defaults(func=xmpCommand("apply"))
+
+	# ───────────────────
+	# migrate sub-command
+
+	migrate_parser = subparsers.add_parser("migrate", description="move the XMP of files between their "
+	                                       "sidecar .xmp file and the file itself; the new location is "
+	                                       "written and verified before the old one is cleared")
+	migrate_parser.add_argument("--to", choices=["sidecar", "embedded"], required=True,
+	                            help="where to store the XMP")
+	file_argument = migrate_parser.add_argument("files", nargs="*", metavar="file",
+	                                            help="files or directories to migrate; - reads paths from stdin")
+	addManifestArgument(migrate_parser)
+	addPoolArguments(migrate_parser)
+	if has_argcomplete: file_argument.completer = argcomplete.completers.FilesCompleter()
+	migrate_parser.set_defaults(func=xmpCommand("migrate"))
+
+	# ─────────────────
+	# index sub-command
+
+	index_parser = subparsers.add_parser("index", description="index the XMP of files in a SQLite "
+	                                     "database queried by xmp query; only the files which changed "
+	                                     "since they were indexed are read")
+	file_argument = index_parser.add_argument("files", nargs="*", metavar="file",
+	                                          help="files or directories to index; - reads paths from stdin")
+	addManifestArgument(index_parser)
+	addIndexArgument(index_parser)
+	index_parser.add_argument("--prune", action="store_true",
+	                          help="remove the indexed files which no longer exist")
+	index_parser.add_argument("-j", "--jobs", type=int,
+	                          help="number of worker processes; the number of CPUs by default, or none for "
+	                               "fewer than 8 files, which are processed in this process")
+	index_parser.add_argument("--progress", action="store_true",
+	                          help="report files/s and MB/s on stderr")
+	index_parser.add_argument("--watch", action="store_true",
+	                          help="keep indexing the changes under the given directories, found by "
+	                               "scanning them every --interval seconds, until interrupted")
+	addIntervalArgument(index_parser)
+	if has_argcomplete: file_argument.completer = argcomplete.completers.FilesCompleter()
+	index_parser.set_defaults(func=xmpCommand("index"))
+
+	# ─────────────────
+	# query sub-command
+
+	query_parser = subparsers.add_parser("query", description="find indexed files the XMP of which "
+	                                     "matches predicates; see xmp index and xmp find")
+	query_parser.add_argument("-w", "--where", action="append", required=True, metavar="PREDICATE",
+	                          help="condition on a property, as for xmp find; may be repeated, all "
+	                               "conditions must hold")
+	query_parser.add_argument("-0", "--print0", action="store_true",
+	                          help="separate paths with null characters, as for xargs -0")
+	addIndexArgument(query_parser)
+	addNamespaceArgument(query_parser)
+	query_parser.set_defaults(func=xmpCommand("query"))
+
+	# ────────────────
+	# scan sub-command
+
+	scan_parser = subparsers.add_parser("scan", description="print the files added, modified or "
+	                                    "removed under directories since the previous scan, one "
+	                                    "per line after their change; a change of the sidecar file "
+	                                    "of a file is a modification of the file")
+	directory_argument = scan_parser.add_argument("directories", nargs="+", metavar="directory",
+	                                              help="directories to scan")
+	scan_parser.add_argument("-s", "--snapshot", required=True,
+	                         help="file recording the files found by the previous scan; all files "
+	                              "are added if it doesn't exist")
+	scan_parser.add_argument("--watch", action="store_true",
+	                         help="keep scanning every --interval seconds until interrupted")
+	addIntervalArgument(scan_parser)
+	if has_argcomplete: directory_argument.completer = argcomplete.completers.DirectoriesCompleter()
+	scan_parser.set_defaults(func=xmpCommand("scan"))
+
+	# ─────────────────
+	# serve sub-command
+
+	serve_parser = subparsers.add_parser("serve", description="answer xmp commands from a long-lived "
+	                                     "process; xmp forwards its commands to it while it runs, "
+	                                     "unless $XMP_NO_SERVER is set")
+	serve_parser.add_argument("--socket", help="Unix socket to listen on; $XMP_SOCKET or "
+	                                           "xmp.sock in $XDG_RUNTIME_DIR or /tmp/xmp-UID "
+	                                           "by default")
+	serve_parser.add_argument("--cache-size", type=int,
+	                          help="number of files the metadata of which is kept in memory")
+	serve_parser.set_defaults(func=serve)
 
 	return parent_parser
 
-main_parser = make_command_parser()
+# ───────────
+# Subcommands
+
+def xmpCommand(name):
+	""" Returns a function running XMPCommand's subcommand name, importing it when called """
+	def command(args):
+		from .xmp import XMPCommand
+		return getattr(XMPCommand, name)(args)
+	command.__name__ = name
+	return command
+
+def serve(args):
+	from ..server import serve
+	return serve(args)
+
+# ───────
+# Helpers
+
+def addFilesArguments(parser, help):
+	file_argument = parser.add_argument("files", nargs="*", metavar="file",
+	                                    help=help+"; globs are expanded, and - reads paths from stdin")
+	parser.add_argument("-r", "--recursive", action="store_true",
+	                    help="process the files under directories")
+	addManifestArgument(parser)
+	return file_argument
+
+def addManifestArgument(parser):
+	parser.add_argument("-m", "--manifest",
+	                    help="file listing paths to process, one per line, before the file arguments")
+
+def addPoolArguments(parser):
+	parser.add_argument("-j", "--jobs", type=int,
+	                    help="number of worker processes; the number of CPUs by default, or none for "
+	                         "fewer than 8 files, which are processed in this process")
+	parser.add_argument("--ordered", action="store_true",
+	                    help="output files in the order they are given rather than as they are processed")
+	parser.add_argument("--checkpoint",
+	                    help="file recording the processed files, so that an interrupted run can be "
+	                         "resumed by running the same command again; files are identified by "
+	                         "their path")
+	parser.add_argument("--retry-failures", action="store_true",
+	                    help="process again the files which failed in the run recorded by --checkpoint")
+	parser.add_argument("--progress", action="store_true",
+	                    help="report files/s, MB/s and the estimated remaining time on stderr")
+
+def addIndexArgument(parser):
+	parser.add_argument("-i", "--index",
+	                    help="index database; $XMP_INDEX or ~/.xmp.index by default")
+
+def addIntervalArgument(parser):
+	parser.add_argument("--interval", type=float, default=2,
+	                    help="seconds between scans with --watch")
+
+def addNamespaceArgument(parser):
+	parser.add_argument("-n", "--namespace",
+	                    help="namespace URI or prefix of the properties; by default, that of their prefix")
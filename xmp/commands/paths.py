@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# Standard Library
+import glob
+import os
+import sys
+
+SIDECAR_EXTENSION = ".xmp"
+
+def iterPaths(arguments, recursive = False, stdin = None):
+	"""
+	Yields the file paths designated by command-line arguments.
+
+	Arguments:
+		arguments: File paths, glob patterns, directories, or "-" to read paths from
+		           stdin, one per line. Glob patterns are expanded here in case the
+		           shell didn't; a pattern matching nothing is yielded as is so that
+		           its absence is reported.
+		recursive: Whether to walk directories; otherwise they are yielded as is.
+		           Sidecar files of data files found in the same directory are skipped,
+		           as they are handled through their data file.
+		stdin:     File object to read "-" from; sys.stdin by default.
+	"""
+	for argument in arguments:
+		if argument == "-":
+			for line in (stdin if stdin is not None else sys.stdin):
+				path = line.rstrip("\r\n")
+				if path:
+					for p in expandPath(path, recursive): yield p
+		else:
+			for p in expandPath(argument, recursive): yield p
+
+def expandPath(argument, recursive = False):
+	""" Yields the file paths designated by a single path or glob pattern. """
+	matches = sorted(glob.glob(argument)) if glob.has_magic(argument) else []
+	for path in (matches or [argument]):
+		if recursive and os.path.isdir(path):
+			for p in walkDirectory(path): yield p
+		else:
+			yield path
+
+def walkDirectory(directory_path):
+	""" Yields the files under a directory, in a deterministic order, except sidecars. """
+	for root, directories, file_names in os.walk(directory_path):
+		directories.sort()
+		file_name_set = set(file_names)
+		for file_name in sorted(file_names):
+			if isSidecarName(file_name, file_name_set): continue
+			yield os.path.join(root, file_name)
+
+def isSidecarName(file_name, sibling_names):
+	""" Checks if a file is the sidecar of one of its siblings """
+	return file_name.endswith(SIDECAR_EXTENSION) \
+	   and file_name[:-len(SIDECAR_EXTENSION)] in sibling_names
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# Standard Library
+import collections
+import operator
+import re
+
+PREDICATE_REGEX = re.compile(r"^(?P<property>[^<>=!~]+?)\s*"
+                             r"(?:(?P<operator>>=|<=|!=|=|<|>|~)\s*(?P<operand>.*))?$")
+
+COMPARISONS = {
+	"=":  operator.eq,
+	"!=": operator.ne,
+	"<":  operator.lt,
+	"<=": operator.le,
+	">":  operator.gt,
+	">=": operator.ge,
+}
+
+class Predicate(object):
+	"""
+	Condition on the value of an XMP property, e.g. "exif:ISOSpeedRatings>=800".
+
+	Operators are =, !=, <, <=, >, >= and ~, which searches a regular expression
+	in the value. Values and operands are compared as numbers when both are
+	numbers or rationals such as "32/10", as strings otherwise. Without an operator,
+	the predicate only checks that the property exists. A property that doesn't
+	exist never matches, and an array or set matches if any of its items does.
+	"""
+
+	def __init__(self, property, operator = None, operand = None):
+		self.property = property
+		self.operator = operator
+		self.operand  = operand
+		if operator == "~":
+			self.regex = re.compile(operand)
+		elif operator is not None:
+			self.comparison = COMPARISONS[operator]
+			self.number     = toNumber(operand)
+
+	@staticmethod
+	def parse(expression):
+		predicate_match = PREDICATE_REGEX.match(expression.strip())
+		if not predicate_match:
+			raise ValueError("Invalid predicate: " + expression)
+		return Predicate(*predicate_match.group("property", "operator", "operand"))
+
+	def matches(self, value):
+		""" Checks if a property value, None if the property doesn't exist, matches """
+		if value is None:
+			return False
+		elif self.operator is None:
+			return True
+		elif isinstance(value, (list, tuple, collections.Set)):
+			return any(self.matches(v) for v in value)
+		elif isinstance(value, collections.Mapping):
+			return False
+		elif self.operator == "~":
+			return self.regex.search(value) is not None
+
+		number = toNumber(value)
+		if number is not None and self.number is not None:
+			return self.comparison(number, self.number)
+		return self.comparison(value, self.operand)
+
+	def __str__(self):
+		return self.property + (self.operator + self.operand if self.operator else "")
+
+def toNumber(string):
+	""" Converts a number or a rational such as "32/10" to a float, or returns None """
+	try:
+		numerator, _, denominator = string.partition("/")
+		if denominator:
+			return float(numerator) / float(denominator)
+		return float(numerator)
+	except (ValueError, ZeroDivisionError):
+		return None
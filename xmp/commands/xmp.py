@@ -29,58 +29,374 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 # Standard Library
+import codecs
+import errno
+import functools
+import io
+import json
+import multiprocessing
 import os.path
+import re
+import signal
+import sys
 
 # Xmp
-from ..xmp import XMPFile
+from ..xmp import XMPFile, isQualified, namespaceForPrefix, rootAddress
+from ..batch import JobRunner
+from .paths import iterPaths
+from .predicates import Predicate
 
 class XMPCommand:
 	@staticmethod
 	def show(args):
-		throwIfAbsent(args.file)
-		input_file_path = args.file
-		with XMPFile(input_file_path) as xmp_file:
-			print xmp_file
+		fields = None if args.fields is None else resolveProperties(args.fields, args.namespace)
+		# Trees are written as they are rendered unless they must be passed back to keep
+		# the files in order
+		readFile = functools.partial(showFile, output_format = args.format, fields = fields,
+		                             field_names = args.fields, cache = getattr(args, "cache", None),
+		                             stream = args.jobs == 1 or not args.ordered)
+		writeResults(runFiles(readFile, args))
 
 	@staticmethod
 	def xml(args):
-		throwIfAbsent(args.file)
-		input_file_path = args.file
-		with XMPFile(input_file_path) as xmp_file:
-			print xmp_file.metadata.xml()
+		readFile = functools.partial(xmlFile, cache = getattr(args, "cache", None))
+		writeResults(runFiles(readFile, args))
+
+	@staticmethod
+	def find(args):
+		predicates = parsePredicates(args.where)
+		fields = resolveProperties([p.property for p in predicates], args.namespace)
+		matchFile = functools.partial(findFile, fields = fields, predicates = predicates,
+		                              separator = "\0" if args.print0 else "\n",
+		                              cache = getattr(args, "cache", None))
+		writeResults(runFiles(matchFile, args, recursive = True), terminator = "")
 
 	@staticmethod
 	def set(args):
-		throwIfAbsent(args.file)
-		print "Setting property {ns}:{p} of file {f} to {v}".format(
-			ns = args.namespace,
-			 p = args.property,
-			 v = args.value,
-			 f = args.file
-		)
-		input_file_path = args.file
-		with XMPFile(input_file_path) as xmp_file:
-			pass
-			# TODO
+		properties = resolveProperties([p for p, v in args.properties], args.namespace)
+		values = zip(properties, [v for p, v in args.properties])
+		setProperties = functools.partial(setFile, values = values, cache = getattr(args, "cache", None))
+		writeResults(runFiles(setProperties, args))
 
 	@staticmethod
 	def delete(args):
-		throwIfAbsent(args.file)
-		print "Deleting property {ns}:{p} of file {f}".format(
-			ns = args.namespace,
-			 p = args.property,
-			 v = args.value,
-			 f = args.file
-		)
-		input_file_path = args.file
-		with XMPFile(input_file_path) as xmp_file:
+		properties = resolveProperties(args.properties, args.namespace)
+		deleteProperties = functools.partial(deleteFile, properties = properties,
+		                                     cache = getattr(args, "cache", None))
+		writeResults(runFiles(deleteProperties, args))
+
+	@staticmethod
+	def migrate(args):
+		from ..migrate import migrateFile
+		writeResults(runFiles(functools.partial(migrateFile, to = args.to), args, recursive = True))
+
+	@staticmethod
+	def index(args):
+		from ..index import Index
+		from ..scan import Scanner
+
+		if args.watch and (args.manifest is not None or not args.files
+		                   or not all(os.path.isdir(f) for f in args.files)):
+			sys.exit("--watch needs directories")
+		message_format = "{indexed} indexed, {unchanged} unchanged, {failed} unreadable file(s)"
+		with Index(args.index) as index:
+			if args.watch:
+				scanner = Scanner(args.files, snapshot_path = index.path + ".snapshot")
+				try:
+					for summary in index.follow(scanner.watch(args.interval), jobs = args.jobs):
+						sys.stderr.write((message_format + ", {removed} removed\n").format(**summary))
+				except KeyboardInterrupt:
+					pass
+				return
+
+			summary = index.update(filePaths(args, recursive = True), jobs = args.jobs,
+			                       progress = sys.stderr if args.progress else None)
+			message = message_format.format(**summary)
+			if args.prune:
+				message += ", {} removed".format(index.prune())
+		sys.stderr.write(message + "\n")
+
+	@staticmethod
+	def query(args):
+		from ..index import Index, defaultIndexPath
+
+		predicates = parsePredicates(args.where)
+		fields = resolveProperties([p.property for p in predicates], args.namespace)
+		index_path = args.index or defaultIndexPath()
+		if not os.path.exists(index_path):
+			sys.exit("No index at {}; build it with xmp index".format(index_path))
+		with Index(index_path) as index:
+			for file_path in index.query(fields, predicates):
+				sys.stdout.write(file_path.encode("utf-8") + ("\0" if args.print0 else "\n"))
+
+	@staticmethod
+	def scan(args):
+		from ..scan import Scanner
+
+		scanner = Scanner(args.directories, snapshot_path = args.snapshot)
+		try:
+			for events in (scanner.watch(args.interval) if args.watch else [scanner.scan()]):
+				for event in events:
+					sys.stdout.write("{e.kind}\t{e.path}\n".format(e = event))
+				sys.stdout.flush()
+		except KeyboardInterrupt:
 			pass
-			# TODO
+
+	@staticmethod
+	def apply(args):
+		from ..apply import applyEdits
+
+		from_stdin = args.edits == "-"
+		checkpoint_path = args.checkpoint if args.checkpoint or from_stdin else args.edits + ".checkpoint"
+		edits = sys.stdin if from_stdin else open(args.edits)
+		if args.log:
+			log = open(args.log, "a")
+		elif from_stdin:
+			log = sys.stdout
+		else:
+			log = open(args.edits + ".log", "a")
+
+		try:
+			summary = applyEdits(edits, log, checkpoint_path = checkpoint_path, jobs = args.jobs,
+			                     buffer_size = args.buffer_size)
+		finally:
+			if not from_stdin: edits.close()
+			if log is not sys.stdout: log.close()
+		sys.stderr.write("{files} file(s), {edits} edit(s), {errors} error(s)\n".format(**summary))
+		if summary["errors"]:
+			sys.exit(1)
 
 # ───────
 # Helpers
 
-def throwIfAbsent(file_path):
+def checkFile(file_path):
 	if not os.path.isfile(file_path):
-		import sys
-		sys.exit("File "+file_path+" doesn't exist")
+		raise IOError("No such file: '{}'".format(file_path))
+
+def readMetadata(file_path, only = None, cache = None):
+	"""
+	Returns the metadata of a file, through a cache of metadata if given
+
+	See :class:`xmp.server.MetadataCache`.
+	"""
+	if cache is not None:
+		return cache.read(file_path, only)
+	with XMPFile(file_path, only = only) as xmp_file:
+		return xmp_file.metadata
+
+def filePaths(args, recursive = None):
+	"""
+	Iterates over the files of a command: those of its manifest, then its arguments.
+
+	Arguments:
+		recursive: Whether directories are walked; args.recursive by default.
+	"""
+	if not args.files and args.manifest is None:
+		sys.exit("No files given; pass files or --manifest")
+	if recursive is None:
+		recursive = args.recursive
+	if args.manifest is not None:
+		with open(args.manifest) as manifest:
+			for line in manifest:
+				if line.strip():
+					yield line.rstrip("\r\n")
+	for file_path in iterPaths(args.files, recursive):
+		yield file_path
+
+def runFiles(function, args, recursive = None):
+	"""
+	Applies a worker function to the files of a command with a job runner.
+
+	Files are listed before processing them when reporting progress, to estimate
+	the remaining time, and as they are processed otherwise.
+
+	Returns:
+		An iterator over the results; see :meth:`xmp.batch.JobRunner.run`.
+	"""
+	runner = JobRunner(function, checkpoint_path = args.checkpoint, jobs = args.jobs,
+	                   ordered = args.ordered, retry_failures = args.retry_failures,
+	                   progress = sys.stderr if args.progress else None)
+	file_paths = filePaths(args, recursive)
+	return runner.run(list(file_paths) if args.progress else file_paths)
+
+def parsePredicates(expressions):
+	""" Returns the predicates of command-line expressions, or exits if one is invalid """
+	try:
+		return [Predicate.parse(e) for e in expressions]
+	except (ValueError, re.error) as e:
+		sys.exit(str(e))
+
+def resolveProperties(properties, namespace = None):
+	"""
+	Returns the (namespace uid, path) pairs of command-line properties.
+
+	Arguments:
+		properties: Property paths, e.g. "exif:Flash/exif:Mode".
+		namespace:  URI or registered prefix of the namespace of all properties. By
+		            default, the namespace of each property is that of the prefix of
+		            its first component.
+	"""
+	if namespace is not None and "/" not in namespace:
+		prefix, namespace = namespace, namespaceForPrefix(namespace)
+		if namespace is None:
+			sys.exit("Unknown namespace prefix "+prefix)
+
+	resolved = []
+	for path in properties:
+		if namespace is not None:
+			resolved.append((namespace, path))
+			continue
+
+		root = rootAddress(path)
+		ns_uid = namespaceForPrefix(root.split(":")[0]) if isQualified(root) else None
+		if ns_uid is None:
+			sys.exit("Can't find the namespace of property {}; qualify it with a registered prefix or use --namespace".format(path))
+		resolved.append((ns_uid, path))
+	return resolved
+
+# ───────────────
+# Worker functions
+
+# These run in worker processes: they are defined at module level to be picklable,
+# and report errors in their result rather than raising.
+
+# Held by workers writing to stdout themselves, so that the output of files is not
+# interleaved; created on import to be inherited by the worker processes
+OUTPUT_LOCK = multiprocessing.Lock()
+
+def showFile(file_path, output_format = "text", fields = None, field_names = None, cache = None,
+             stream = False):
+	"""
+	Reads the metadata of a file for `xmp show`.
+
+	Arguments:
+		output_format: "text" for the textual tree, or "json" for a JSON object.
+		fields:        Optional (namespace uid, path) pairs, to which the metadata is
+		               restricted; their values are keyed by field_names in JSON.
+		cache:         Optional metadata cache to read the file through.
+		stream:        Whether the textual tree is written to stdout as it is rendered,
+		               rather than returned as the text of the result.
+	"""
+	try:
+		checkFile(file_path)
+		metadata = readMetadata(file_path, only = fields, cache = cache)
+		if output_format == "json":
+			if fields is None:
+				values = metadata.to_dict()
+			else:
+				values = dict(zip(field_names, metadata.get_many(fields)))
+			text = json.dumps(dict(path = file_path, metadata = values),
+			                  default = jsonDefault, ensure_ascii = False)
+		elif stream:
+			def writeTree(stdout):
+				stdout.write("XMP file {}:\n".format(os.path.abspath(file_path)))
+				metadata.textualize(codecs.getwriter("utf-8")(stdout))
+			writeOutput(writeTree)
+			text = None
+		else:
+			tree = io.StringIO()
+			metadata.textualize(tree)
+			text = "XMP file {}:\n".format(os.path.abspath(file_path)) + tree.getvalue()[:-1].encode("utf-8")
+		return dict(path = file_path, text = text)
+	except IOError as e:
+		if e.errno == errno.EPIPE:
+			# Stdout is closed: end the batch rather than failing every file
+			raise
+		return dict(path = file_path, error = str(e))
+	except Exception as e:
+		return dict(path = file_path, error = str(e))
+
+def findFile(file_path, fields, predicates, separator = "\n", cache = None):
+	"""
+	Checks if the metadata of a file matches all predicates for `xmp find`.
+
+	Only the properties of fields, the (namespace uid, path) pairs of the
+	predicates' properties, are loaded.
+	"""
+	try:
+		checkFile(file_path)
+		values = readMetadata(file_path, only = fields, cache = cache).get_many(fields)
+		matches = all(p.matches(v) for p, v in zip(predicates, values))
+		return dict(path = file_path, text = file_path + separator if matches else None)
+	except Exception as e:
+		return dict(path = file_path, error = str(e))
+
+def xmlFile(file_path, cache = None):
+	""" Reads the metadata of a file as XML for `xmp xml`. """
+	try:
+		checkFile(file_path)
+		return dict(path = file_path, text = readMetadata(file_path, cache = cache).xml())
+	except Exception as e:
+		return dict(path = file_path, error = str(e))
+
+def setFile(file_path, values, cache = None):
+	""" Sets the ((namespace uid, path), value) pairs of values in a file for `xmp set`. """
+	try:
+		checkFile(file_path)
+		with XMPFile(file_path, rw = True) as xmp_file:
+			xmp_file.metadata.set_many(values)
+		if cache is not None:
+			cache.invalidate(file_path)
+		return dict(path = file_path, text = "{f}: set {n} properties".format(f = file_path, n = len(values)))
+	except Exception as e:
+		return dict(path = file_path, error = str(e))
+
+def deleteFile(file_path, properties, cache = None):
+	""" Deletes the (namespace uid, path) pairs of properties from a file for `xmp delete`. """
+	try:
+		checkFile(file_path)
+		with XMPFile(file_path, rw = True) as xmp_file:
+			deleted_count = xmp_file.metadata.delete_many(properties)
+		if cache is not None:
+			cache.invalidate(file_path)
+		return dict(path = file_path, text = "{f}: deleted {n} properties".format(f = file_path, n = deleted_count))
+	except Exception as e:
+		return dict(path = file_path, error = str(e))
+
+def writeOutput(write):
+	"""
+	Calls write with stdout while holding the output lock, then flushes stdout.
+
+	In worker processes, a closed stdout raises IOError rather than killing the
+	worker with SIGPIPE, which would leave the pool waiting for its result.
+	"""
+	in_worker = multiprocessing.current_process().name != "MainProcess"
+	if in_worker:
+		sigpipe_handler = signal.signal(signal.SIGPIPE, signal.SIG_IGN)
+	try:
+		with OUTPUT_LOCK:
+			write(sys.stdout)
+			sys.stdout.flush()
+	finally:
+		if in_worker:
+			signal.signal(signal.SIGPIPE, sigpipe_handler)
+
+def jsonDefault(value):
+	if isinstance(value, (set, frozenset)):
+		return sorted(value)
+	raise TypeError(repr(value) + " is not JSON serializable")
+
+def writeResults(results, terminator = "\n"):
+	"""
+	Writes the text of worker results to stdout as they come, and errors to stderr.
+
+	Results without text are skipped; others are written followed by terminator.
+
+	Exits with status 1 once all results are written if any of them is an error.
+	"""
+	failure_count = 0
+	try:
+		for result in results:
+			if "error" in result:
+				failure_count += 1
+				sys.stderr.write("{f}: {e}\n".format(f = result["path"], e = result["error"]))
+			elif result["text"] is not None:
+				text = result["text"]
+				sys.stdout.write((text.encode("utf-8") if isinstance(text, unicode) else text) + terminator)
+	except IOError as e:
+		if e.errno != errno.EPIPE:
+			raise
+		# A worker writing to stdout found it closed, e.g. by head: stop quietly
+		sys.exit(128 + signal.SIGPIPE)
+	if failure_count:
+		sys.exit("{n} file(s) failed".format(n = failure_count))
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+    ``xmp.index`` module
+    ====================
+
+    Index of the metadata of many files in a SQLite database, to query it without
+    opening the files.
+
+    The index has a row per element of the metadata of each file, with its
+    namespace, address, value (NULL for containers) and kind, as iterated by
+    :meth:`xmp.xmp.XMPMetadata.iterElements`. Updating the index only reads the
+    files the signature of which, the inode, size and mtime of the file and of its
+    sidecar file, changed since they were indexed. Files are read by a pool of
+    worker processes, and their rows written by the calling process.
+
+    :Example:
+
+    >>> from xmp.index import Index
+    >>> from xmp.commands.predicates import Predicate
+    >>> with Index("photos.index") as index:
+    ...     index.update(["a.jpg", "b.jpg"])
+    ...     index.query([("http://ns.adobe.com/exif/1.0/", "exif:FocalLength")],
+    ...                 [Predicate.parse("exif:FocalLength=98/10")])
+    {'indexed': 2, 'unchanged': 0, 'failed': 0}
+    [u'/photos/a.jpg']
+"""
+
+# Standard Library
+import json
+import os
+import re
+import sqlite3
+# libXMP
+import libxmp
+# Xmp
+from .batch import JobRunner, fileSignature
+from .scan import REMOVED
+from .xmp import XMPFile, isQualified, qualifyPath
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+	id        INTEGER PRIMARY KEY,
+	path      TEXT NOT NULL UNIQUE,
+	signature TEXT NOT NULL,
+	error     TEXT
+);
+CREATE TABLE IF NOT EXISTS properties (
+	file      INTEGER NOT NULL REFERENCES files (id),
+	namespace TEXT NOT NULL,
+	address   TEXT NOT NULL,
+	value     TEXT,
+	kind      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS properties_by_address ON properties (namespace, address);
+CREATE INDEX IF NOT EXISTS properties_by_file ON properties (file);
+"""
+
+COMMIT_INTERVAL = 1000
+ITEM_REGEX = re.compile(r"^\[\d+\]$")
+
+def defaultIndexPath():
+	""" Returns the index path from $XMP_INDEX, or a per-user path in the home directory """
+	return os.environ.get("XMP_INDEX") or os.path.expanduser("~/.xmp.index")
+
+class Index(object):
+	"""
+	SQLite index of the metadata of files.
+
+	Files are indexed by absolute path. Files which can't be read are indexed
+	without properties, with their error, until they change.
+	"""
+
+	def __init__(self, path = None):
+		"""
+		Arguments:
+			path: Path of the database, created if it doesn't exist; see
+			      :func:`defaultIndexPath` for the default.
+		"""
+		self.path = path or defaultIndexPath()
+		self.connection = sqlite3.connect(self.path)
+		self.connection.executescript(SCHEMA)
+
+	def close(self):
+		self.connection.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, type, value, traceback):
+		self.close()
+
+	# ────────
+	# Updating
+
+	def update(self, file_paths, jobs = None, progress = None):
+		"""
+		Indexes the files which changed since they were indexed.
+
+		Arguments:
+			file_paths: Iterable of file paths.
+			jobs:       Number of worker processes; see :func:`xmp.batch.imapFiles`.
+			progress:   Optional stream to report progress to; see :class:`xmp.batch.JobRunner`.
+
+		Returns:
+			A dict with the numbers of indexed, unchanged and failed files.
+		"""
+		signatures = dict(self.connection.execute("SELECT path, signature FROM files"))
+		summary = dict(indexed = 0, unchanged = 0, failed = 0)
+
+		def changedPaths():
+			for file_path in file_paths:
+				file_path = os.path.abspath(file_path)
+				if signatures.get(file_path) == encodeSignature(fileSignature(file_path)):
+					summary["unchanged"] += 1
+				else:
+					yield file_path
+
+		runner = JobRunner(indexFile, jobs = jobs, progress = progress)
+		try:
+			for count, result in enumerate(runner.run(changedPaths()), 1):
+				self._store(result)
+				summary["failed" if "error" in result else "indexed"] += 1
+				if count % COMMIT_INTERVAL == 0:
+					self.connection.commit()
+		finally:
+			self.connection.commit()
+		return summary
+
+	def remove(self, file_paths):
+		""" Removes files from the index """
+		file_ids = [(file_id,) for file_path in file_paths
+		                       for file_id, in self.connection.execute("SELECT id FROM files WHERE path = ?",
+		                                                               (os.path.abspath(file_path),))]
+		self.connection.executemany("DELETE FROM properties WHERE file = ?", file_ids)
+		self.connection.executemany("DELETE FROM files WHERE id = ?", file_ids)
+		self.connection.commit()
+
+	def prune(self):
+		"""
+		Removes the files which no longer exist from the index.
+
+		Returns:
+			The number of removed files.
+		"""
+		removed_paths = [p for p in self.files() if not os.path.exists(p)]
+		self.remove(removed_paths)
+		return len(removed_paths)
+
+	def follow(self, event_lists, jobs = None):
+		"""
+		Keeps the index up to date with lists of changes.
+
+		Arguments:
+			event_lists: Iterable of lists of :class:`xmp.scan.Event`, e.g. from
+			             :meth:`xmp.scan.Scanner.watch`.
+
+		Yields:
+			The summary of the update for each list of events; see :meth:`update`,
+			with the number of removed files.
+		"""
+		for events in event_lists:
+			removed_paths = [e.path for e in events if e.kind == REMOVED]
+			self.remove(removed_paths)
+			summary = self.update([e.path for e in events if e.kind != REMOVED], jobs = jobs)
+			summary["removed"] = len(removed_paths)
+			yield summary
+
+	# ────────
+	# Querying
+
+	def files(self):
+		""" Returns the indexed file paths, sorted """
+		return [p for p, in self.connection.execute("SELECT path FROM files ORDER BY path")]
+
+	def elements(self, file_path):
+		"""
+		Returns the indexed elements of a file.
+
+		Returns:
+			A list of (namespace uid, address, value, kind) tuples, as iterated by
+			:meth:`xmp.xmp.XMPMetadata.iterElements`.
+		"""
+		return self.connection.execute("SELECT namespace, address, value, kind FROM properties "
+		                               "WHERE file = (SELECT id FROM files WHERE path = ?) "
+		                               "ORDER BY rowid",
+		                               (os.path.abspath(file_path),)).fetchall()
+
+	def values(self, ns_uid, path):
+		"""
+		Iterates over the values of a property in the indexed files.
+
+		Arguments:
+			ns_uid: Namespace of the property.
+			path:   Path of the property; unqualified components are qualified with
+			        the namespace prefix.
+
+		Yields:
+			(file path, value) pairs, sorted by file path, for the files having the
+			property. The value of arrays and sets is the list of the values of their
+			items, and that of structures an empty dict.
+		"""
+		if not all(isQualified(c) for c in path.split("/")):
+			path = qualifyPath(path, libxmp.exempi.namespace_prefix(ns_uid)[:-1])
+		# Rows of the property, and of the descendants of its items, the addresses of
+		# which follow it in the binary collation of the address index as they start
+		# with "[". Struct fields, which start with "/", are not selected: the value
+		# of a structure is an empty dict.
+		rows = self.connection.execute("SELECT files.path, address, value, kind "
+		                               "FROM properties JOIN files ON files.id = properties.file "
+		                               "WHERE namespace = ? AND (address = ? OR (address >= ? AND address < ?)) "
+		                               "ORDER BY files.path, properties.rowid",
+		                               (ns_uid, path, path + "[", path + "\\"))
+		file_path, value = None, None
+		for row_file_path, address, row_value, kind in rows:
+			if row_file_path != file_path:
+				if file_path is not None:
+					yield file_path, value
+				file_path = row_file_path
+				value = None
+			if address == path:
+				value = row_value if kind == "value" else ({} if kind == "struct" else [])
+			elif isinstance(value, list) and kind == "value" and ITEM_REGEX.match(address[len(path):]):
+				value.append(row_value)
+		if file_path is not None:
+			yield file_path, value
+
+	def query(self, fields, predicates):
+		"""
+		Returns the indexed files the metadata of which matches all predicates.
+
+		Arguments:
+			fields:     The (namespace uid, path) pairs of the predicates' properties.
+			predicates: :class:`xmp.commands.predicates.Predicate` objects.
+
+		Returns:
+			The sorted list of matching file paths.
+		"""
+		matching_paths = None
+		for (ns_uid, path), predicate in zip(fields, predicates):
+			paths = set(p for p, v in self.values(ns_uid, path) if predicate.matches(v))
+			matching_paths = paths if matching_paths is None else matching_paths & paths
+			if not matching_paths:
+				break
+		return sorted(matching_paths or [])
+
+	# ───────
+	# Helpers
+
+	def _store(self, result):
+		file_row = self.connection.execute("SELECT id FROM files WHERE path = ?", (result["path"],)).fetchone()
+		if file_row is None:
+			file_id = self.connection.execute("INSERT INTO files (path, signature, error) VALUES (?, ?, ?)",
+			                                  (result["path"], result["signature"], result.get("error"))).lastrowid
+		else:
+			file_id = file_row[0]
+			self.connection.execute("DELETE FROM properties WHERE file = ?", (file_id,))
+			self.connection.execute("UPDATE files SET signature = ?, error = ? WHERE id = ?",
+			                        (result["signature"], result.get("error"), file_id))
+		self.connection.executemany("INSERT INTO properties VALUES (?, ?, ?, ?, ?)",
+		                            ((file_id,) + tuple(e) for e in result.get("elements", [])))
+
+def encodeSignature(signature):
+	return json.dumps(signature)
+
+def indexFile(file_path):
+	"""
+	Reads the elements of the metadata of a file to index them.
+
+	Runs in worker processes; errors are reported in the result.
+
+	Returns:
+		A dict with the file path, its encoded signature taken before reading it, and
+		its elements or the error.
+	"""
+	result = dict(path = file_path, signature = encodeSignature(fileSignature(file_path)))
+	try:
+		if not os.path.isfile(file_path):
+			raise IOError("No such file: '{}'".format(file_path))
+		with XMPFile(file_path) as xmp_file:
+			result["elements"] = list(xmp_file.metadata.iterElements())
+	except Exception as e:
+		result["error"] = str(e)
+	return result
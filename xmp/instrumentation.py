@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+    ``xmp.instrumentation`` module
+    ==============================
+
+    Counts the calls to libxmp made by :mod:`xmp.xmp`, and their time, per public
+    operation of the XMP API.
+
+    A public operation is, e.g., opening a file or setting a value; a single
+    operation may call libxmp many times. Operations are:
+
+    ========= ==================================================================
+    open      :meth:`XMPFile.open`
+    build     Building the object tree of a packet, also during open
+    get       Reading values, :meth:`XMPMetadata.get_many`
+    set       Setting values, :meth:`XMPMetadata.set_many`, :meth:`set_path`...
+    delete    Deleting elements, :meth:`XMPMetadata.delete_many`
+    close     :meth:`XMPFile.close` and :meth:`XMPFile.flush`, which serialize
+              and write the packet
+    serialize :meth:`XMPMetadata.xml` and textualization
+    ========= ==================================================================
+
+    libxmp calls made within an operation called by another one are attributed to
+    the outer one, except those of tree building. Calls made out of any operation
+    are attributed to "other".
+
+    Instrumentation is disabled by default, and then costs nothing: enabling it
+    replaces the libxmp functions and the public methods of :mod:`xmp.xmp` by
+    instrumented wrappers, and disabling it restores them.
+
+    :Example:
+
+    >>> from xmp import instrumentation
+    >>> with instrumentation.enabled():
+    ...     with XMPFile("photo.jpg", rw = True) as xmp_file:
+    ...         xmp_file.metadata[libxmp.consts.XMP_NS_EXIF].FNumber = "28/10"
+    >>> print instrumentation.formatReport()
+"""
+
+# Standard Library
+import collections
+import contextlib
+import functools
+import threading
+import timeit
+import types
+# libXMP
+import libxmp
+import libxmp.exempi
+# Xmp
+from . import xmp
+
+OTHER = "other"
+
+# Operations which are attributed their libxmp calls even within another one
+PHASES = ["build"]
+
+OPERATIONS = collections.OrderedDict([
+	("XMPFile",          [("open", "open"), ("flush", "close"), ("close", "close")]),
+	("XMPMetadata",      [("__init__", "build"), ("resync", "build"),
+	                      ("__getitem__", "get"), ("get_many", "get"),
+	                      ("__setitem__", "set"), ("set_many", "set"),
+	                      ("__delitem__", "delete"), ("delete_many", "delete"),
+	                      ("xml", "serialize"), ("__unicode__", "serialize")]),
+	("XMPElement",       [("value", "get"), ("__set__", "set")]),
+	("XMPVirtualElement",[("__set__", "set")]),
+	("XMPStructure",     [("value", "get"), ("__getitem__", "get"), ("__set__", "set"),
+	                      ("__setitem__", "set"), ("insert", "set"), ("__delitem__", "delete")]),
+	("XMPNamespace",     [("set_path", "set")]),
+	("XMPArray",         [("value", "get"), ("__getitem__", "get"), ("__set__", "set"),
+	                      ("__setitem__", "set"), ("insert", "set"), ("__delitem__", "delete")]),
+	("XMPSet",           [("value", "get"), ("__set__", "set"), ("add", "set"), ("discard", "delete")]),
+	("XMPValue",         [("value", "get"), ("__set__", "set")]),
+])
+
+LIBXMP_CLASSES = ["XMPMeta", "XMPFiles", "XMPIterator"]
+
+Statistics = collections.namedtuple("Statistics", ["count", "seconds"])
+
+_lock = threading.Lock()
+_state = threading.local()
+_originals = []
+_operations = {}
+_calls = {}
+
+# ───
+# API
+
+def enable():
+	""" Starts instrumenting libxmp calls; does nothing if already enabled """
+	if _originals: return
+	for class_name, operations in OPERATIONS.iteritems():
+		owner = getattr(xmp, class_name)
+		for attribute_name, operation in operations:
+			attribute = vars(owner).get(attribute_name)
+			if attribute is None: continue
+			if isinstance(attribute, property):
+				wrapper = property(attribute.fget and _operationWrapper(attribute.fget, operation),
+				                   attribute.fset and _operationWrapper(attribute.fset, "set"),
+				                   attribute.fdel, attribute.__doc__)
+			else:
+				wrapper = _operationWrapper(attribute, operation)
+			_patch(owner, attribute_name, wrapper)
+
+	for function_name, function in vars(libxmp.exempi).items():
+		if isinstance(function, types.FunctionType) and not function_name.startswith("_"):
+			_patch(libxmp.exempi, function_name, _callWrapper(function, "exempi." + function_name))
+	for class_name in LIBXMP_CLASSES:
+		owner = getattr(libxmp, class_name)
+		for attribute_name, attribute in vars(owner).items():
+			if attribute_name.startswith("_") and attribute_name != "__init__": continue
+			name = class_name + "." + attribute_name
+			if isinstance(attribute, types.FunctionType):
+				_patch(owner, attribute_name, _callWrapper(attribute, name))
+			elif isinstance(attribute, staticmethod):
+				_patch(owner, attribute_name, staticmethod(_callWrapper(attribute.__func__, name)))
+
+def disable():
+	""" Stops instrumenting libxmp calls, keeping the statistics gathered so far """
+	while _originals:
+		owner, attribute_name, attribute = _originals.pop()
+		setattr(owner, attribute_name, attribute)
+
+def isEnabled():
+	return bool(_originals)
+
+def reset():
+	""" Forgets the statistics gathered so far """
+	with _lock:
+		_operations.clear()
+		_calls.clear()
+
+@contextlib.contextmanager
+def enabled():
+	""" Context manager instrumenting libxmp calls within its block """
+	enable()
+	try:
+		yield
+	finally:
+		disable()
+
+def report():
+	"""
+	Returns the statistics gathered so far.
+
+	Returns:
+		A dict by operation of dicts with the number of operations, their cumulated
+		seconds including nested operations, and a dict of the number of calls and
+		cumulated seconds by libxmp function. Statistics are :class:`Statistics`.
+	"""
+	with _lock:
+		operations = set(_operations) | set(o for o, f in _calls)
+		return dict((o, dict(count = _operations.get(o, Statistics(0, 0)).count,
+		                     seconds = _operations.get(o, Statistics(0, 0)).seconds,
+		                     calls = dict((f, s) for (call_operation, f), s in _calls.iteritems()
+		                                         if call_operation == o)))
+		            for o in operations)
+
+def formatReport(statistics = None):
+	""" Returns a report as a text table, the current one by default """
+	if statistics is None:
+		statistics = report()
+	lines = ["{:<40} {:>8} {:>10} {:>8} {:>10}".format("operation / libxmp call", "count", "seconds",
+	                                                  "calls", "call s")]
+	order = [o for c, operations in OPERATIONS.iteritems() for a, o in operations] + [OTHER]
+	for operation in sorted(statistics, key = lambda o: order.index(o) if o in order else len(order)):
+		operation_statistics = statistics[operation]
+		calls = operation_statistics["calls"]
+		lines.append("{:<40} {:>8} {:>10.6f} {:>8} {:>10.6f}".format(
+			operation, operation_statistics["count"], operation_statistics["seconds"],
+			sum(s.count for s in calls.itervalues()), sum(s.seconds for s in calls.itervalues())))
+		for function_name, call_statistics in sorted(calls.iteritems(), key = lambda c: -c[1].seconds):
+			lines.append("  {:<38} {:>8} {:>10} {:>8} {:>10.6f}".format(
+				function_name, "", "", call_statistics.count, call_statistics.seconds))
+	return "\n".join(lines)
+
+# ───────
+# Helpers
+
+def _patch(owner, attribute_name, wrapper):
+	_originals.append((owner, attribute_name, vars(owner)[attribute_name]))
+	setattr(owner, attribute_name, wrapper)
+
+def _stack():
+	stack = getattr(_state, "stack", None)
+	if stack is None:
+		stack = _state.stack = []
+		_state.depth = 0
+	return stack
+
+def _record(statistics, key, seconds):
+	with _lock:
+		count, total = statistics.get(key, (0, 0))
+		statistics[key] = Statistics(count + 1, total + seconds)
+
+def _operationWrapper(function, operation):
+	@functools.wraps(function)
+	def wrapper(*args, **kwargs):
+		stack = _stack()
+		is_new = not stack or operation in PHASES
+		stack.append(operation if is_new else stack[-1])
+		start = timeit.default_timer()
+		try:
+			return function(*args, **kwargs)
+		finally:
+			stack.pop()
+			if is_new:
+				_record(_operations, operation, timeit.default_timer() - start)
+	return wrapper
+
+def _callWrapper(function, name):
+	@functools.wraps(function)
+	def wrapper(*args, **kwargs):
+		stack = _stack()
+		# Calls made by libxmp itself are part of the outer call
+		if _state.depth:
+			return function(*args, **kwargs)
+		_state.depth += 1
+		start = timeit.default_timer()
+		try:
+			return function(*args, **kwargs)
+		finally:
+			_state.depth -= 1
+			_record(_calls, (stack[-1] if stack else OTHER, name), timeit.default_timer() - start)
+	return wrapper
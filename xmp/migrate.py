@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+    ``xmp.migrate`` module
+    ======================
+
+    Moves the metadata of files between their embedded packet and their sidecar
+    file.
+
+    Storing the metadata of large files in sidecar files avoids rewriting these
+    files on every edit. :class:`xmp.xmp.XMPFile` reads and writes the sidecar file
+    of a file the embedded packet of which is empty, so migrated files keep using
+    their sidecar file without options.
+
+    Migrations are crash-safe: the metadata is written to its new location and
+    verified by reading it again before its old location is cleared. A file left
+    with both an embedded packet and a sidecar file by an interruption is migrated
+    again.
+
+    :Example:
+
+    >>> from xmp.migrate import migrateFile
+    >>> migrateFile("photo.jpg", to = "sidecar")
+    {'path': 'photo.jpg', 'text': 'photo.jpg: moved to sidecar'}
+"""
+
+# Standard Library
+import os
+# Xmp
+from .xmp import XMPFile, canEmbed, writeAtomically
+
+SIDECAR = "sidecar"
+EMBEDDED = "embedded"
+MODES = [SIDECAR, EMBEDDED]
+
+def migrateFile(file_path, to):
+	"""
+	Moves the metadata of a file to a storage mode, for `xmp migrate`.
+
+	Runs in worker processes; errors are reported in the result.
+
+	Arguments:
+		to: SIDECAR or EMBEDDED.
+
+	Returns:
+		A dict with the file path, and the text reporting the migration, None if
+		there was nothing to move, or the error.
+	"""
+	try:
+		if not os.path.isfile(file_path):
+			raise IOError("No such file: '{}'".format(file_path))
+		moved = toSidecar(file_path) if to == SIDECAR else toEmbedded(file_path)
+		return dict(path = file_path, text = "{f}: moved to {m}".format(f = file_path, m = to) if moved else None)
+	except Exception as e:
+		return dict(path = file_path, error = str(e))
+
+def toSidecar(file_path):
+	"""
+	Moves the embedded metadata of a file to its sidecar file.
+
+	Returns:
+		Whether there was embedded metadata to move.
+
+	Raises:
+		RuntimeError: If the sidecar file already exists with other metadata.
+	"""
+	if not canEmbed(file_path):
+		return False
+	embedded = readMetadata(file_path, sidecar = False)
+	if isEmpty(embedded):
+		return False
+
+	sidecar_path = file_path + ".xmp"
+	if os.path.exists(sidecar_path):
+		# Left by an interrupted migration, or written independently
+		if not samePackets(readMetadata(file_path, sidecar = True), embedded):
+			raise RuntimeError("Sidecar file {} holds other metadata than the file".format(sidecar_path))
+	else:
+		writeAtomically(sidecar_path, embedded.serialize().encode("utf-8"))
+		if not samePackets(readMetadata(file_path, sidecar = True), embedded):
+			raise RuntimeError("Verification of sidecar file {} failed".format(sidecar_path))
+
+	with XMPFile(file_path, rw = True, sidecar = False) as xmp_file:
+		xmp_file.libxmp_metadata = None
+	if not isEmpty(readMetadata(file_path, sidecar = False)):
+		raise RuntimeError("Embedded metadata of {} could not be cleared".format(file_path))
+	return True
+
+def toEmbedded(file_path):
+	"""
+	Moves the metadata of the sidecar file of a file into the file.
+
+	Returns:
+		Whether there was a sidecar file to move; files in which libxmp can't embed
+		metadata keep their sidecar file.
+	"""
+	sidecar_path = file_path + ".xmp"
+	if not os.path.exists(sidecar_path) or not canEmbed(file_path):
+		return False
+
+	sidecar = readMetadata(file_path, sidecar = True)
+	with XMPFile(file_path, rw = True, sidecar = False) as xmp_file:
+		xmp_file.libxmp_metadata = sidecar.libxmp_metadata
+	if not samePackets(readMetadata(file_path, sidecar = False), sidecar):
+		raise RuntimeError("Verification of the embedded metadata of {} failed".format(file_path))
+	os.remove(sidecar_path)
+	return True
+
+# ───────
+# Helpers
+
+def readMetadata(file_path, sidecar):
+	""" Returns the metadata of a file, read from its sidecar file or the file itself """
+	with XMPFile(file_path, sidecar = sidecar) as xmp_file:
+		return xmp_file.metadata
+
+def isEmpty(metadata):
+	return len(metadata) == 0
+
+def samePackets(metadata, other_metadata):
+	return metadata.serialize() == other_metadata.serialize()
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+    ``xmp.scan`` module
+    ===================
+
+    Detects the files added, modified and removed under directories since a
+    previous scan.
+
+    A scan lists each directory once, pairing data files with their sidecar files
+    from that listing, and takes the signature of each file: the inode, size and
+    mtime of the file and of its sidecar file, as :func:`xmp.batch.fileSignature`.
+    Signatures are compared to those of a snapshot persisted by the previous scan,
+    and only the differences are reported, so that consumers maintaining derived
+    state, such as an :class:`xmp.index.Index`, only process the files which
+    changed. Sidecar files are not reported on their own: a change of the sidecar
+    file of a data file is a modification of the data file.
+
+    :Example:
+
+    >>> from xmp.scan import Scanner
+    >>> scanner = Scanner(["photos"], snapshot_path = "photos.snapshot")
+    >>> scanner.scan()
+    [Event(kind='added', path='/data/photos/a.jpg', signature=((1312, 2050, 1490000000.0), None))]
+    >>> for events in scanner.watch(interval = 5):
+    ...     print [(e.kind, e.path) for e in events]
+"""
+
+# Standard Library
+import collections
+import json
+import os
+import stat
+import time
+
+SIDECAR_EXTENSION = ".xmp"
+DEFAULT_POLL_INTERVAL = 2
+
+ADDED = "added"
+MODIFIED = "modified"
+REMOVED = "removed"
+
+Event = collections.namedtuple("Event", ["kind", "path", "signature"])
+
+class Scanner(object):
+	"""
+	Scanner of the files under directories.
+
+	Attributes:
+		directories: Absolute paths of the scanned directories.
+		snapshot:    :class:`Snapshot` of the files found by the last scan.
+	"""
+
+	def __init__(self, directories, snapshot_path = None):
+		"""
+		Arguments:
+			directories:   Paths of the directories to scan.
+			snapshot_path: Optional path of the snapshot, read if it exists and written
+			               after each scan; otherwise the first scan reports all files
+			               as added.
+		"""
+		self.directories = [os.path.abspath(d) for d in directories]
+		self.snapshot = Snapshot.load(snapshot_path)
+
+	def scan(self):
+		"""
+		Scans the directories, and updates the snapshot.
+
+		Returns:
+			The list of events; see :meth:`changes`.
+		"""
+		events = self.changes()
+		self.commit(events)
+		return events
+
+	def changes(self):
+		"""
+		Scans the directories, without updating the snapshot.
+
+		Files of the snapshot which the scan doesn't find are reported as removed,
+		including those under directories which are not scanned anymore.
+
+		Returns:
+			The list of events: added and modified files in scanning order, followed by
+			removed files in path order.
+		"""
+		events = []
+		seen = set()
+		for directory_path in self.directories:
+			for file_path, signature in scanTree(directory_path):
+				seen.add(file_path)
+				previous_signature = self.snapshot.signatures.get(file_path)
+				if previous_signature is None:
+					events.append(Event(ADDED, file_path, signature))
+				elif previous_signature != signature:
+					events.append(Event(MODIFIED, file_path, signature))
+		removed_paths = sorted(p for p in self.snapshot.signatures if p not in seen)
+		events.extend(Event(REMOVED, p, None) for p in removed_paths)
+		return events
+
+	def commit(self, events):
+		""" Records events in the snapshot, and saves it """
+		for event in events:
+			if event.kind == REMOVED:
+				del self.snapshot.signatures[event.path]
+			else:
+				self.snapshot.signatures[event.path] = event.signature
+		if events and self.snapshot.path is not None:
+			self.snapshot.save()
+
+	def watch(self, interval = DEFAULT_POLL_INTERVAL):
+		"""
+		Scans the directories repeatedly, until the iteration stops.
+
+		Arguments:
+			interval: Seconds between the end of a scan and the start of the next one.
+
+		Yields:
+			The list of events of each scan which found changes, starting with the
+			first one. The events are recorded in the snapshot once the consumer asks
+			for the next list, so that the events of an interrupted consumer are
+			reported again by the next scan.
+		"""
+		while True:
+			events = self.changes()
+			if events:
+				yield events
+				self.commit(events)
+			time.sleep(interval)
+
+class Snapshot(object):
+	"""
+	Signatures of files by absolute path, persisted as a JSON object.
+	"""
+
+	def __init__(self, path = None, signatures = None):
+		self.path = path
+		self.signatures = signatures or {}
+
+	@staticmethod
+	def load(path):
+		""" Loads a snapshot, or returns an empty one if path doesn't exist """
+		if path is None or not os.path.exists(path):
+			return Snapshot(path)
+		with open(path) as snapshot_file:
+			signatures = json.load(snapshot_file)
+		return Snapshot(path, dict((p, decodeSignature(s)) for p, s in signatures.iteritems()))
+
+	def save(self):
+		""" Writes the snapshot atomically """
+		temporary_path = self.path + ".tmp"
+		with open(temporary_path, "w") as snapshot_file:
+			json.dump(self.signatures, snapshot_file, separators = (",", ":"))
+			snapshot_file.flush()
+			os.fsync(snapshot_file.fileno())
+		os.rename(temporary_path, self.path)
+
+# ───────
+# Helpers
+
+def scanTree(directory_path):
+	"""
+	Yields the files under a directory with their signature, except sidecar files.
+
+	Each directory is listed once and each of its entries examined with a single
+	lstat call; symbolic links to files are followed, not those to directories.
+
+	Yields:
+		(file path, signature) pairs, in a deterministic order.
+	"""
+	try:
+		names = sorted(os.listdir(directory_path))
+	except OSError:
+		return
+	statuses = collections.OrderedDict()
+	subdirectory_paths = []
+	for name in names:
+		path = os.path.join(directory_path, name)
+		try:
+			status = os.lstat(path)
+			if stat.S_ISLNK(status.st_mode):
+				status = os.stat(path)
+				if stat.S_ISDIR(status.st_mode): continue
+		except OSError:
+			continue
+		if stat.S_ISDIR(status.st_mode):
+			subdirectory_paths.append(path)
+		elif stat.S_ISREG(status.st_mode):
+			statuses[name] = status
+
+	for name, status in statuses.iteritems():
+		if name.endswith(SIDECAR_EXTENSION) and name[:-len(SIDECAR_EXTENSION)] in statuses:
+			continue
+		sidecar_status = statuses.get(name + SIDECAR_EXTENSION)
+		yield os.path.join(directory_path, name), (statusSignature(status), statusSignature(sidecar_status))
+
+	for subdirectory_path in subdirectory_paths:
+		for file_path, signature in scanTree(subdirectory_path):
+			yield file_path, signature
+
+def statusSignature(status):
+	""" Returns the (inode, size, mtime) of a file status, or None """
+	return None if status is None else (status.st_ino, status.st_size, status.st_mtime)
+
+def decodeSignature(signature):
+	""" Converts a signature decoded from JSON back to tuples """
+	return tuple(None if s is None else tuple(s) for s in signature)
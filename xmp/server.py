@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+    ``xmp.server`` module
+    =====================
+
+    Long-lived process answering XMP requests over a local Unix domain socket.
+
+    Starting the interpreter and loading libxmp costs more than reading the
+    metadata of a file, so shell pipelines calling `xmp` many times are better
+    served by a warm process: `xmp serve` starts one, and `xmp` then forwards its
+    commands to it transparently. The server also keeps a cache of the metadata of
+    recently read files, which is checked against the files' status on every use.
+
+    Messages are JSON objects, each sent as its UTF-8 length on 4 big-endian bytes
+    followed by its UTF-8 encoding. A request has a "command" key; the response has
+    a "status" key, 0 on success. Requests are answered one at a time.
+
+    +-----------------------------+-----------------------------------------------+
+    | Request                     | Response                                      |
+    +=============================+===============================================+
+    | ``{"command": "ping"}``     | ``{"status": 0, "cache": {"size": ...,``      |
+    |                             | ``"hits": ..., "misses": ...}}``              |
+    +-----------------------------+-----------------------------------------------+
+    | ``{"command": "get",``      | ``{"status": 0, "values": [...]}``, one value |
+    | ``"path": ..., "fields":``  | per (namespace uid, path) field, null for     |
+    | ``[[ns, path], ...]}``      | missing ones                                  |
+    +-----------------------------+-----------------------------------------------+
+    | ``{"command": "show"|"xml"``| ``{"status": ..., "stdout": ...,``            |
+    | ``|"set"|"delete"|"find",`` | ``"stderr": ...}``, as if the command had     |
+    | ``"args": {...}, "cwd":``   | been run from cwd with the parsed command     |
+    | ``..., "stdin": ...}``      | line arguments args                           |
+    +-----------------------------+-----------------------------------------------+
+
+    Errors are answered with a non-zero status and an "error" message.
+
+    :Example:
+
+    >>> from xmp.server import Client
+    >>> Client().get("path/to/file.jpg", [("http://ns.adobe.com/exif/1.0/", "exif:FNumber")])
+    [u'32/10']
+"""
+
+# Standard Library
+import argparse
+import collections
+import errno
+import json
+import os
+import SocketServer
+import socket
+import stat
+import struct
+import sys
+import StringIO
+
+FRAME_HEADER = struct.Struct(">I")
+DEFAULT_CACHE_SIZE = 1024
+COMMANDS = ["show", "xml", "set", "delete", "find"]
+
+def defaultSocketPath(create = False):
+	"""
+	Returns the socket path from $XMP_SOCKET, or a path in the user's runtime
+	directory, created if create is True; see :func:`runtimeDirectory`.
+	"""
+	return os.environ.get("XMP_SOCKET") or os.path.join(runtimeDirectory(create), "xmp.sock")
+
+def runtimeDirectory(create = False):
+	"""
+	Returns the directory private to the user holding the default socket:
+	$XDG_RUNTIME_DIR, or /tmp/xmp-UID.
+
+	Arguments:
+		create: Whether to create the directory with mode 0700 if missing, when
+		        starting a server; clients only look for an existing one.
+
+	Raises:
+		OSError: If the directory is missing and create is False.
+		IOError: If the directory is not a directory only the user can access, e.g.
+		         if another user created it first.
+	"""
+	directory = os.environ.get("XDG_RUNTIME_DIR") or "/tmp/xmp-{uid}".format(uid = os.getuid())
+	if create:
+		try:
+			os.mkdir(directory, 0o700)
+		except OSError as e:
+			if e.errno != errno.EEXIST:
+				raise
+	status = os.lstat(directory)
+	if (not stat.S_ISDIR(status.st_mode) or status.st_uid != os.getuid()
+	    or stat.S_IMODE(status.st_mode) & 0o077):
+		raise IOError("{} is not a directory private to the user".format(directory))
+	return directory
+
+def isOwnSocket(socket_path):
+	""" Checks that a path is a socket owned by the user, and not one planted by another user """
+	try:
+		status = os.lstat(socket_path)
+	except OSError:
+		return False
+	return stat.S_ISSOCK(status.st_mode) and status.st_uid == os.getuid()
+
+# ───────
+# Framing
+
+def sendMessage(connection, message):
+	data = json.dumps(message, default = jsonDefault).encode("utf-8")
+	connection.sendall(FRAME_HEADER.pack(len(data)) + data)
+
+def jsonDefault(value):
+	""" JSON encoder default, encoding the values of sets (rdf:Bag) as sorted lists """
+	if isinstance(value, (set, frozenset)):
+		return sorted(value)
+	raise TypeError(repr(value) + " is not JSON serializable")
+
+def receiveMessage(connection):
+	""" Returns the next message, or None if the connection was closed before it """
+	header = receiveBytes(connection, FRAME_HEADER.size)
+	if header is None:
+		return None
+	data = receiveBytes(connection, FRAME_HEADER.unpack(header)[0])
+	if data is None:
+		raise IOError("Connection closed in the middle of a message")
+	return json.loads(data.decode("utf-8"))
+
+def receiveBytes(connection, size):
+	chunks = []
+	while size:
+		chunk = connection.recv(min(size, 65536))
+		if not chunk:
+			if chunks: raise IOError("Connection closed in the middle of a message")
+			return None
+		chunks.append(chunk)
+		size -= len(chunk)
+	return "".join(chunks)
+
+# ─────
+# Cache
+
+class MetadataCache(object):
+	"""
+	Least-recently-used cache of the metadata of files.
+
+	An entry is used only if the file, and its sidecar if any, still have the
+	inode, size and modification time they had when the entry was read.
+	"""
+
+	def __init__(self, size = DEFAULT_CACHE_SIZE):
+		self.size = size
+		self._entries = collections.OrderedDict()
+		self.hits = 0
+		self.misses = 0
+
+	def read(self, file_path, only = None):
+		"""
+		Returns the metadata of a file.
+
+		Arguments:
+			only: Optional projection, see :class:`xmp.xmp.XMPMetadata`. The whole
+			      metadata is cached, and projected without reading the file again.
+		"""
+		from .batch import fileSignature
+		from .xmp import XMPFile, XMPMetadata
+
+		file_path = os.path.abspath(file_path)
+		signature = fileSignature(file_path)
+		entry = self._entries.pop(file_path, None)
+		if entry is not None and entry[0] == signature:
+			self.hits += 1
+		else:
+			self.misses += 1
+			with XMPFile(file_path) as xmp_file:
+				entry = (signature, xmp_file.metadata)
+		self._entries[file_path] = entry
+		while len(self._entries) > self.size:
+			self._entries.popitem(last = False)
+
+		metadata = entry[1]
+		return metadata if only is None else XMPMetadata(metadata.libxmp_metadata, only = only)
+
+	def invalidate(self, file_path):
+		self._entries.pop(os.path.abspath(file_path), None)
+
+	def __len__(self):
+		return len(self._entries)
+
+# ──────
+# Server
+
+class Server(SocketServer.UnixStreamServer):
+	"""
+	Unix domain socket server answering XMP requests, one at a time.
+
+	Only the user running the server can connect to its socket.
+	"""
+
+	def __init__(self, socket_path = None, cache_size = DEFAULT_CACHE_SIZE):
+		self.socket_path = socket_path or defaultSocketPath(create = True)
+		self.cache = MetadataCache(cache_size)
+		if os.path.exists(self.socket_path):
+			if isServing(self.socket_path):
+				raise IOError("A server is already listening on " + self.socket_path)
+			os.unlink(self.socket_path)
+
+		previous_umask = os.umask(0o077)
+		try:
+			SocketServer.UnixStreamServer.__init__(self, self.socket_path, RequestHandler)
+		finally:
+			os.umask(previous_umask)
+
+	def server_close(self):
+		SocketServer.UnixStreamServer.server_close(self)
+		if os.path.exists(self.socket_path):
+			os.unlink(self.socket_path)
+
+	# ────────
+	# Requests
+
+	def answer(self, request):
+		command = request.get("command")
+		try:
+			if command == "ping":
+				return dict(status = 0, cache = dict(size = len(self.cache),
+				                                     hits = self.cache.hits,
+				                                     misses = self.cache.misses))
+			elif command == "get":
+				metadata = self.cache.read(request["path"])
+				return dict(status = 0, values = metadata.get_many(tuple(f) for f in request["fields"]))
+			elif command in COMMANDS:
+				return self.run(command, request)
+			else:
+				return dict(status = 1, error = "Unknown command {}".format(command))
+		except Exception as e:
+			return dict(status = 1, error = "{}: {}".format(type(e).__name__, e))
+
+	def run(self, command, request):
+		"""
+		Runs a command line subcommand as if from the client's directory.
+
+		Files are processed in this process to use the cache, so the number of jobs is
+		ignored.
+		"""
+		from .commands.xmp import XMPCommand
+
+		args = argparse.Namespace(**request["args"])
+		args.jobs = 1
+		args.cache = self.cache
+		stdout, stderr = StringIO.StringIO(), StringIO.StringIO()
+		streams = sys.stdin, sys.stdout, sys.stderr
+		cwd = os.getcwd()
+		status = 0
+		try:
+			sys.stdin = StringIO.StringIO(request.get("stdin") or "")
+			sys.stdout, sys.stderr = stdout, stderr
+			os.chdir(request.get("cwd") or cwd)
+			getattr(XMPCommand, command)(args)
+		except SystemExit as e:
+			if isinstance(e.code, basestring):
+				stderr.write(e.code + "\n")
+				status = 1
+			else:
+				status = e.code or 0
+		finally:
+			sys.stdin, sys.stdout, sys.stderr = streams
+			os.chdir(cwd)
+		return dict(status = status,
+		            stdout = stdout.getvalue().decode("utf-8", "replace"),
+		            stderr = stderr.getvalue().decode("utf-8", "replace"))
+
+class RequestHandler(SocketServer.BaseRequestHandler):
+	def handle(self):
+		while True:
+			request = receiveMessage(self.request)
+			if request is None:
+				return
+			response = self.server.answer(request)
+			try:
+				sendMessage(self.request, response)
+			except (TypeError, ValueError) as e:
+				# The response can't be encoded: send the error rather than dropping
+				# the connection, which would leave the client without a reply
+				sendMessage(self.request, dict(status = 1, error = "{}: {}".format(type(e).__name__, e)))
+
+# ──────
+# Client
+
+class Client(object):
+	""" Connection to an XMP server """
+
+	def __init__(self, socket_path = None):
+		self.socket_path = socket_path or defaultSocketPath()
+		self._connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self._connection.connect(self.socket_path)
+
+	def request(self, message):
+		sendMessage(self._connection, message)
+		response = receiveMessage(self._connection)
+		if response is None:
+			raise IOError("The server closed the connection")
+		return response
+
+	def get(self, file_path, fields):
+		"""
+		Returns the values of (namespace uid, path) fields of a file, or None for
+		missing ones.
+		"""
+		response = self.request(dict(command = "get",
+		                             path = os.path.abspath(file_path),
+		                             fields = list(fields)))
+		if response["status"]:
+			raise RuntimeError(response.get("error"))
+		return response["values"]
+
+	def run(self, command, args, stdin = None, cwd = None):
+		"""
+		Runs a subcommand in the server.
+
+		Arguments:
+			command: Name of the subcommand.
+			args:    Dict of its parsed command line arguments.
+			stdin:   Text to pass as the standard input.
+			cwd:     Directory to run the command from; the current one by default.
+
+		Returns:
+			The response, with status, stdout and stderr.
+		"""
+		return self.request(dict(command = command, args = args,
+		                         cwd = cwd or os.getcwd(), stdin = stdin))
+
+	def close(self):
+		self._connection.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, type, value, traceback):
+		self.close()
+
+def isServing(socket_path = None):
+	""" Checks if a server accepts connections on a socket """
+	try:
+		Client(socket_path).close()
+		return True
+	except socket.error:
+		return False
+
+def forward(args):
+	"""
+	Runs a parsed command line in a server if one is running.
+
+	Returns:
+		The exit status of the command, or None if no server could run it.
+	"""
+	command = args.func.__name__
+	if command not in COMMANDS or os.environ.get("XMP_NO_SERVER"):
+		return None
+	try:
+		socket_path = defaultSocketPath()
+	except (IOError, OSError):
+		return None
+	# Another user could otherwise read the commands and forge their output
+	if not isOwnSocket(socket_path):
+		return None
+	try:
+		client = Client(socket_path)
+	except socket.error:
+		return None
+
+	arguments = dict((k, v) for k, v in vars(args).iteritems() if k != "func")
+	stdin = sys.stdin.read() if "-" in getattr(args, "files", []) else None
+	with client:
+		response = client.run(command, arguments, stdin)
+	sys.stdout.write(response.get("stdout", "").encode("utf-8"))
+	sys.stderr.write(response.get("stderr", "").encode("utf-8"))
+	if "error" in response:
+		sys.stderr.write(response["error"].encode("utf-8") + "\n")
+	return response["status"]
+
+def serve(args):
+	""" Runs a server until interrupted """
+	import signal
+	from . import xmp # Load libxmp before the first request
+
+	server = Server(args.socket, DEFAULT_CACHE_SIZE if args.cache_size is None else args.cache_size)
+	signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+    ``xmp.tracing`` module
+    ======================
+
+    Spans timing the phases of XMP operations, such as opening and closing files,
+    sent to pluggable sinks.
+
+    A span records its operation, the file path if any, its duration, the duration
+    of its phases, the size of the file and of its XMP packet, its number of
+    elements, and its error if it failed. Spans are dicts sent to sinks, callables
+    of a span, such as a :class:`RingBufferSink`, :class:`JSONLinesSink` or
+    :class:`LoggingSink`. A sink may only receive the spans slower than a
+    threshold, to find the pathological files of large runs.
+
+    ========= =================================================================
+    Operation Phases
+    ========= =================================================================
+    open      check (file format), handle (libxmp file), read (packet), build
+              (object tree)
+    close     change_check, serialize or put_xmp, close_file
+    flush     serialize or put_xmp, reopen
+    set       :meth:`XMPMetadata.set_many` and :meth:`XMPNamespace.set_path`
+    delete    :meth:`XMPMetadata.delete_many`
+    ========= =================================================================
+
+    Without sinks, spans are no-ops and nothing is measured.
+
+    :Example:
+
+    >>> from xmp import tracing
+    >>> tracing.addSink(tracing.LoggingSink(), threshold = 0.5)
+    >>> recent_spans = tracing.RingBufferSink(100)
+    >>> tracing.addSink(recent_spans)
+    >>> with XMPFile("photo.jpg") as xmp_file: pass
+    >>> recent_spans.spans[-1]
+    {'operation': 'close', 'path': '/photos/photo.jpg', 'seconds': 0.0011, ...}
+"""
+
+# Standard Library
+import collections
+import json
+import logging
+import os
+import time
+import timeit
+
+_sinks = []
+
+# ───
+# API
+
+def span(operation, path = None):
+	"""
+	Starts a span, to use as a context manager ending it.
+
+	Returns:
+		A :class:`Span`, or a no-op span if there are no sinks.
+	"""
+	return Span(operation, path) if _sinks else NULL_SPAN
+
+def addSink(sink, threshold = None):
+	"""
+	Sends the spans ending from now on to a sink.
+
+	Arguments:
+		sink:      Callable of a span dict.
+		threshold: Optional duration in seconds; only the spans lasting longer are
+		           sent to the sink.
+	"""
+	_sinks.append((sink, threshold))
+
+def removeSink(sink):
+	_sinks[:] = [(s, t) for s, t in _sinks if s is not sink]
+
+def removeSinks():
+	del _sinks[:]
+
+# ─────
+# Spans
+
+class Span(object):
+	"""
+	Timing of an operation and of its phases.
+
+	Phases are timed by laps: each call to :meth:`lap` ends a phase begun by the
+	previous lap, or by the start of the span.
+	"""
+
+	def __init__(self, operation, path = None):
+		self.operation = operation
+		self.path = path
+		self.attributes = {}
+		self.phases = collections.OrderedDict()
+		self.start_time = time.time()
+		self._start = self._lap_start = timeit.default_timer()
+
+	def __nonzero__(self):
+		return True
+
+	def lap(self, phase):
+		""" Ends a phase """
+		now = timeit.default_timer()
+		self.phases[phase] = self.phases.get(phase, 0) + now - self._lap_start
+		self._lap_start = now
+
+	def update(self, **attributes):
+		""" Sets attributes of the span, e.g. packet_size or element_count """
+		self.attributes.update(attributes)
+
+	def end(self, error = None):
+		""" Ends the span and sends it to the sinks """
+		seconds = timeit.default_timer() - self._start
+		record = dict(operation = self.operation, path = self.path, start = self.start_time,
+		              seconds = seconds, phases = self.phases)
+		if self.path is not None:
+			try:
+				record["file_size"] = os.path.getsize(self.path)
+			except OSError:
+				record["file_size"] = None
+		record.update(self.attributes)
+		if error is not None:
+			record["error"] = "{}: {}".format(type(error).__name__, error)
+		for sink, threshold in list(_sinks):
+			if threshold is None or seconds > threshold:
+				sink(record)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, type, value, traceback):
+		self.end(value)
+
+class NullSpan(object):
+	""" Span doing nothing, used when there are no sinks; it is false """
+
+	def __nonzero__(self):
+		return False
+
+	def lap(self, phase):
+		pass
+
+	def update(self, **attributes):
+		pass
+
+	def end(self, error = None):
+		pass
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, type, value, traceback):
+		pass
+
+NULL_SPAN = NullSpan()
+
+# ─────
+# Sinks
+
+class RingBufferSink(object):
+	""" Keeps the last spans in memory """
+
+	def __init__(self, size = 1000):
+		self.spans = collections.deque(maxlen = size)
+
+	def __call__(self, record):
+		self.spans.append(record)
+
+class JSONLinesSink(object):
+	"""
+	Writes spans to a file, as a JSON object per line.
+
+	Each span is written in a single write, flushed at once, so that processes
+	sharing the file, such as the workers of :mod:`xmp.batch`, don't interleave
+	their spans when it is opened in append mode.
+	"""
+
+	def __init__(self, stream):
+		"""
+		Arguments:
+			stream: File object, or path of a file to append to.
+		"""
+		self.stream = open(stream, "a") if isinstance(stream, basestring) else stream
+
+	def __call__(self, record):
+		self.stream.write(json.dumps(record) + "\n")
+		self.stream.flush()
+
+class LoggingSink(object):
+	""" Logs spans, by default as warnings of the xmp.tracing logger """
+
+	def __init__(self, logger = None, level = logging.WARNING):
+		self.logger = logger or logging.getLogger(__name__)
+		self.level = level
+
+	def __call__(self, record):
+		self.logger.log(self.level, formatSpan(record))
+
+def formatSpan(record):
+	""" Returns a one-line description of a span """
+	text = "{operation} {path} took {seconds:.3f}s".format(**record)
+	if record["phases"]:
+		text += " (" + ", ".join("{} {:.3f}s".format(p, s) for p, s in record["phases"].iteritems()) + ")"
+	details = ["{}={}".format(k, record[k]) for k in ("file_size", "packet_size", "element_count", "error")
+	                                        if record.get(k) is not None]
+	if details:
+		text += ": " + ", ".join(details)
+	return text
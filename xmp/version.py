@@ -33,9 +33,13 @@ from argparse import Action
 # qidata
 from . import VERSION
 
+def version():
+	""" Returns the release version number, read from the VERSION file """
+	return VERSION
+
 class VersionAction(Action):
 	def __init__(self, option_strings, dest, nargs, **kwargs):
 		super(VersionAction, self).__init__(option_strings, dest, nargs=0, **kwargs)
 	def __call__(self, parser, namespace, values, option_string):
-		version_string = VERSION + "\n"
+		version_string = version() + "\n"
 		parser.exit(message=version_string)
@@ -30,14 +30,21 @@
 
 # Standard Library
 import collections
-from compiler.misc import mangle
+import errno
+import io
 import itertools
+import json
 import os.path
 import re
+import stat
+import sys
+import tempfile
 import warnings
 import weakref
 # XMP
 import libxmp
+# Xmp
+from . import tracing
 
 
 # ────────────────────────────────
@@ -65,6 +72,10 @@ INDENT = ' ' * INDENT_SIZE
 TREE_INDENT = u'─'*(INDENT_SIZE-2) + " "
 TREE_MID_INDENT  = u"├" + TREE_INDENT
 TREE_LAST_INDENT = u"└" + TREE_INDENT
+ARRAY_INDENT = u"    "
+ARRAY_ITEM_INDENT = ARRAY_INDENT + u"⁃ "
+SET_ITEM_INDENT   = ARRAY_INDENT + u"• "
+ITEM_INDENT = ARRAY_INDENT + u"  "
 
 # ───────────────
 # General XMP API
@@ -81,6 +92,134 @@ def qualify(name, prefix):
 	"""
 	return "{prefix}:{name}".format(name=name, prefix=prefix)
 
+def qualifyPath(path, prefix):
+	"""
+	Qualify all unqualified components of a property path with the given prefix
+
+	e.g. "a/b[2]/c" is qualified with prefix "x" as "x:a/x:b[2]/x:c"
+	"""
+	return "/".join(c if isQualified(c) else qualify(c, prefix) for c in path.split("/"))
+
+def isDescendantAddress(address, ancestor_address):
+	"""
+	Check if a property address is a descendant of another one in the same namespace
+	"""
+	return address.startswith(ancestor_address) \
+	   and address[len(ancestor_address):len(ancestor_address)+1] in ("/", "[")
+
+ROOT_ADDRESS_REGEX = re.compile(r"^[^/\[]+")
+
+def rootAddress(address):
+	"""
+	Returns the address of the top-level property containing the given address
+	"""
+	return ROOT_ADDRESS_REGEX.match(address).group(0)
+
+PATH_COMPONENT_REGEX = re.compile(r"^([^\[\]/]+)((?:\[\d+\])*)$")
+ARRAY_INDEX_REGEX = re.compile(r"\[(\d+)\]")
+
+def splitPath(path):
+	"""
+	Split a property path into steps: field names, and 1-based array indices
+
+	e.g. "a/b[2]/c" is split as ["a", "b", 2, "c"]
+	"""
+	steps = []
+	for component in path.split("/"):
+		component_match = PATH_COMPONENT_REGEX.match(component)
+		if not component_match:
+			raise ValueError("Invalid property path: " + path)
+		steps.append(component_match.group(1))
+		steps.extend(int(i) for i in ARRAY_INDEX_REGEX.findall(component_match.group(2)))
+	return steps
+
+def appendStep(address, step):
+	"""
+	Returns the address of a field name or 1-based array index step below an address
+	"""
+	if isinstance(step, (int, long)):
+		return "{address}[{index}]".format(address=address, index=step)
+	elif address:
+		return "{address}/{name}".format(address=address, name=step)
+	else:
+		return step
+
+def elementKind(element):
+	"""
+	Returns the kind of an object tree or libxmp element: "value", "struct", "array"
+	or "set"
+	"""
+	if isinstance(element, LibXMPElement):
+		if element.is_struct: return "struct"
+		elif element.is_array: return "array"
+		elif element.is_set: return "set"
+		else: return "value"
+	elif isinstance(element, XMPStructure): return "struct"
+	elif isinstance(element, XMPArray): return "array"
+	elif isinstance(element, XMPSet): return "set"
+	else: return "value"
+
+def elementSize(element):
+	"""
+	Returns the estimated bytes of an object tree element, excluding its children
+	"""
+	size = sys.getsizeof(element) + sys.getsizeof(element.__dict__) + sys.getsizeof(element.address)
+	if element.is_container:
+		children = element._children
+		size += sys.getsizeof(children)
+		if isinstance(children, collections.OrderedDict) and hasattr(children, "__dict__"):
+			# Python 2's OrderedDict links its keys in lists, indexed by another dictionary
+			size += sum(sys.getsizeof(v) for v in vars(children).itervalues())
+			size += len(children)*sys.getsizeof([None, None, None])
+	return size
+
+def writeLines(stream, text, first, rest):
+	"""
+	Writes text to a stream line by line, its first line prefixed with first and the
+	others with rest; each line is terminated by a newline.
+	"""
+	lines = text.split(u"\n")
+	stream.write(first + lines[0] + u"\n")
+	for line in lines[1:]:
+		stream.write(rest + line + u"\n")
+
+def textualize(element):
+	""" Returns the textual tree of an object tree element or of metadata """
+	stream = io.StringIO()
+	element.textualize(stream)
+	return stream.getvalue()[:-1]
+
+CONTAINER_TYPES = {"struct": collections.OrderedDict, "array": list, "set": set}
+
+JSON_SET_KEY = u"@set"
+
+def jsonEncodeSet(value):
+	"""
+	JSON encoder default, encoding sets as objects with a single "@set" member, the
+	sorted list of their items
+	"""
+	if isinstance(value, (set, frozenset)):
+		return {JSON_SET_KEY: sorted(value)}
+	raise TypeError(repr(value) + " is not JSON serializable")
+
+def jsonDecodeObject(pairs):
+	"""
+	JSON decoder object_pairs_hook, decoding objects as ordered dicts, and those
+	encoded by :func:`jsonEncodeSet` as sets
+	"""
+	if len(pairs) == 1 and pairs[0][0] == JSON_SET_KEY:
+		return set(pairs[0][1])
+	return collections.OrderedDict(pairs)
+
+def namespaceForPrefix(prefix):
+	"""
+	Returns the namespace registered with a prefix, or None
+	"""
+	try:
+		return libxmp.exempi.prefix_namespace_uri(prefix)
+	except libxmp.XMPError:
+		return None
+
 def registerNamespace(namespace, prefix):
 	"""
 	Register a namespace in libxmp.exempi
@@ -106,6 +245,52 @@ def registerNamespace(namespace, prefix):
 
 	return libxmp.exempi.register_namespace(namespace, prefix)[:-1]
 
+def canEmbed(file_path):
+	"""
+	Returns whether libxmp can embed XMP in a file, rather than in a sidecar file
+	"""
+	return libxmp.exempi.files_check_file_format(file_path) != libxmp.consts.XMP_FT_UNKNOWN
+
+def writeAtomically(file_path, contents):
+	"""
+	Writes a file through a temporary file renamed over it once synced to disk, so
+	that the file is never left partially written.
+
+	A symbolic link is followed and its target replaced, and the permissions and
+	owner of the file are kept.
+	"""
+	file_path = os.path.realpath(file_path)
+	descriptor, temporary_path = tempfile.mkstemp(dir = os.path.dirname(file_path),
+	                                              prefix = os.path.basename(file_path) + ".",
+	                                              suffix = ".tmp")
+	try:
+		with os.fdopen(descriptor, 'w') as file_handle:
+			file_handle.write(contents)
+			file_handle.flush()
+			try:
+				status = os.stat(file_path)
+			except OSError as e:
+				if e.errno != errno.ENOENT:
+					raise
+				## mkstemp creates files only their owner can read
+				umask = os.umask(0)
+				os.umask(umask)
+				os.fchmod(file_handle.fileno(), 0o666 & ~umask)
+			else:
+				os.fchmod(file_handle.fileno(), stat.S_IMODE(status.st_mode))
+				try:
+					os.fchown(file_handle.fileno(), status.st_uid, status.st_gid)
+				except OSError as e:
+					## Only privileged users can give files away
+					if e.errno != errno.EPERM:
+						raise
+			os.fsync(file_handle.fileno())
+		os.rename(temporary_path, file_path)
+	except:
+		if os.path.exists(temporary_path):
+			os.remove(temporary_path)
+		raise
+
 class XMPFile(object):
 	"""
 	A file we want to store metadata about.
@@ -113,19 +298,46 @@ class XMPFile(object):
 	The metadata will be stored inside of the file if possible for the files's
 	format, otherwise it will be stored in a sidecar file. The side car file
 	will have the same name as the original file (extension included) with an
-	extra extension ".xmp".
+	extra extension ".xmp". The sidecar file of a file that can embed metadata is
+	used when the file's embedded packet is empty, e.g. for files migrated to
+	sidecar files, or when asked for.
 
 	Attributes:
 		file_path: Path to the file to manipulate.
 		rw:        Whether the metadata should be writable.
+		only:      Projection restricting the elements loaded in the metadata
+		           object tree; see :class:`XMPMetadata`.
+		sidecar:   Whether the metadata is stored in a sidecar file (True) or in the
+		           file (False); by default, in a sidecar file if the file's format
+		           can't embed metadata, or if its embedded packet is empty and its
+		           sidecar file exists.
 		metadata:  The metadata manipulator for the file.
+		compact:   Whether sidecar and textual files are written compactly, without
+		           packet wrapper nor padding and with minimal whitespace.
+		padding:   Bytes of padding of the packets written in sidecar and textual
+		           files, for later updates to fit in place; libxmp's default if
+		           None.
+		in_place:  Whether to overwrite sidecar and textual files in place when the
+		           new packet fits in their current packet, rather than rewriting
+		           them atomically; an interrupted in-place write corrupts the file.
+
+	Embedded packets are serialized by the file handlers of libxmp, which pick their
+	padding themselves and update the file in place whenever the packet fits.
 	"""
 
 	# ──────────
 	# Constructor
 
-	def __init__(self, file_path, rw = False):
+	def __init__(self, file_path, rw = False, only = None, sidecar = None,
+	             compact = False, padding = None, in_place = False):
+		if compact and (padding is not None or in_place):
+			raise ValueError("Compact packets have no padding to update them in place")
 		self.__rw             = rw
+		self.only             = only
+		self.sidecar          = sidecar
+		self.compact          = compact
+		self.padding          = padding
+		self.in_place         = in_place
 		self.file_path        = os.path.abspath(file_path)
 		self.side_xmp_file_path = ""
 		self._libxmp_file     = None
@@ -138,6 +350,9 @@ class XMPFile(object):
 
 	@property
 	def libxmp_metadata(self):
+		# The raw packet may be modified behind the back of the metadata tree
+		if self.metadata is not None:
+			self.metadata.touch()
 		return self._libxmp_metadata
 
 	@libxmp_metadata.setter
@@ -146,10 +361,10 @@ class XMPFile(object):
 			self._libxmp_metadata = new_metadata
 		else:
 			self._libxmp_metadata = libxmp.XMPMeta()
-		self.metadata = XMPMetadata(self._libxmp_metadata)
+		self.metadata = XMPMetadata(self._libxmp_metadata, only = self.only)
 
 		# Record to warn the user when they modify their metadata in read-only mode
-		self.__original_repr = repr(self._libxmp_metadata)
+		self.__original_packet = self.metadata.serialize()
 
 	@property
 	def rw(self):
@@ -161,7 +376,7 @@ class XMPFile(object):
 
 	@property
 	def has_changed(self):
-		return repr(self._libxmp_metadata) != self.__original_repr
+		return self.metadata.serialize() != self.__original_packet
 
 	@property
 	def read_only(self):
@@ -196,7 +411,9 @@ class XMPFile(object):
 		+--------------+----------------------------+----------+------+---------+-------------------------+
 		|      No      |           other            |    ?     |   ?  | raise IOError                     |
 		+--------------+----------------------------+----------+------+---------+-------------------------+
-		|      Yes     |           libxmp           |    ?     |   ?  |   No    |                         |
+		|      Yes     |           libxmp           |    No    |   ?  |   No    |                         |
+		+--------------+----------------------------+----------+------+---------+-------------------------+
+		|      Yes     |           libxmp           |    Yes   |   ?  |   Yes   | if no embedded metadata |
 		+--------------+----------------------------+----------+------+---------+-------------------------+
 		|      Yes     |            .xmp            |    ?     |   ?  |   No    |                         |
 		+--------------+----------------------------+----------+------+---------+-------------------------+
@@ -206,10 +423,101 @@ class XMPFile(object):
 		+--------------+----------------------------+----------+------+---------+-------------------------+
 		|      Yes     |           other            |    Yes   |   ?  |   Yes   |                         |
 		+--------------+----------------------------+----------+------+---------+-------------------------+
+
+		The sidecar attribute, if True, forces the use of a sidecar file for files
+		supported by libxmp, ignoring their embedded XMP; if False, it raises IOError
+		for other files.
 		"""
 		if self.is_open:
 			warnings.warn("File {} is already open".format(self.file_path), RuntimeWarning)
 
+		with tracing.span("open", self.file_path) as span:
+			self._open(span)
+
+	def flush(self):
+		"""
+		Writes the metadata to the file without closing it.
+
+		Embedded packets are only written by libxmp when its file handle is closed,
+		so the handle is closed and re-opened. Flushing a read-only file does nothing.
+		"""
+		if not self.is_open:
+			raise IOError("File {} is not open".format(self.file_path))
+		if self.read_only:
+			return
+
+		with tracing.span("flush", self.file_path) as span:
+			self._write(span)
+			if not self._is_textual:
+				self._libxmp_file.close_file()
+				self._libxmp_file = libxmp.XMPFiles(file_path = self.file_path,
+				                                open_onlyxmp = True,
+				                              open_forupdate = self.rw)
+				span.lap("reopen")
+			self.__original_packet = self.metadata.serialize()
+
+	def close(self, save = True):
+		"""
+		Writes the metadata of a file opened read-write, and closes it.
+
+		Arguments:
+			save: Whether to write the metadata; if False, changes are discarded.
+		"""
+		if not self.is_open:
+			warnings.warn("File {} is already closed".format(self.file_path), RuntimeWarning)
+			return
+		with tracing.span("close", self.file_path) as span:
+			try:
+				if self.read_only and self.has_changed:
+					message =  "Modified a read-only XMP file; won't be saved"
+					warnings.warn(message, RuntimeWarning)
+				span.lap("change_check")
+
+				if self.rw and save:
+					self._write(span)
+
+			finally:
+				if not self._is_textual:
+					self._libxmp_file.close_file()
+					span.lap("close_file")
+				self._reset()
+
+	def memory_report(self):
+		"""
+		Reports the memory used by the metadata of the open file.
+
+		Returns:
+			The report of :meth:`XMPMetadata.memory_report`, where "estimated_bytes"
+			also counts the copy of the packet kept to detect modifications, whose
+			bytes are given under "change_check_bytes", unless it is the cached
+			serialization of the packet.
+		"""
+		if not self.is_open:
+			raise IOError("File {} is not open".format(self.file_path))
+		report = self.metadata.memory_report()
+		report["change_check_bytes"] = sys.getsizeof(self.__original_packet)
+		# While the packet is unchanged, the copy is also its cached serialization
+		if all(p is not self.__original_packet for p in self.metadata._serializations.itervalues()):
+			report["estimated_bytes"] += report["change_check_bytes"]
+		return report
+
+	# ───────────────
+	# Context Manager
+
+	def __enter__(self):
+		self.open()
+		return self
+
+	def __exit__(self, type, value, traceback):
+		self.close()
+
+	# ───────
+	# Helpers
+
+	def _open(self, span):
+		"""
+		Opens the file, timing the phases of the opening in a tracing span.
+		"""
 		if not os.path.exists(self.file_path):
 			if self.rw and os.path.splitext(self.file_path)[1] == ".xmp":
 				## Create file and empty metadata
@@ -224,7 +532,10 @@ class XMPFile(object):
 				## In the future, we might want to change this to allow the creation of
 				## other files.
 
-		elif libxmp.exempi.files_check_file_format(self.file_path) == libxmp.consts.XMP_FT_UNKNOWN:
+		elif not canEmbed(self.file_path):
+			if self.sidecar is False:
+				raise IOError("Can't embed XMP in file '{}'".format(self.file_path))
+			span.lap("check")
 			self._is_textual = True
 			if os.path.splitext(self.file_path)[1] == ".xmp":
 				## Read file and load metadata
@@ -233,81 +544,111 @@ class XMPFile(object):
 					file_contents = file_handle.read()
 					xmp_metadata.parse_from_str(file_contents)
 			else:
-				## Simply add the .xmp extension to the file name.
-				## This will avoid collision if someone tries to anotate several
-				## files with same name but different extensions
-				self.side_xmp_file_path = self.file_path+".xmp"
-				xmp_metadata = libxmp.XMPMeta()
-				if os.path.exists(self.side_xmp_file_path):
-					with open(self.side_xmp_file_path, 'r') as file_handle:
-						file_contents = file_handle.read()
-						xmp_metadata.parse_from_str(file_contents)
-				else:
-					xmp_metadata = libxmp.XMPMeta()
-					with open(self.side_xmp_file_path, 'w') as file_handle:
-						file_handle.write(
-						    xmp_metadata.serialize_to_str().encode("utf-8")
-						)
+				xmp_metadata = self._openSidecar()
+
+		elif self.sidecar:
+			span.lap("check")
+			self._is_textual = True
+			xmp_metadata = self._openSidecar()
 
 		else:
+			span.lap("check")
 			self._libxmp_file = libxmp.XMPFiles(file_path = self.file_path,
 			                                open_onlyxmp = True,
 			                              open_forupdate = self.rw)
+			span.lap("handle")
 			xmp_metadata = self._libxmp_file.get_xmp()
+			if self.sidecar is None and os.path.exists(self.file_path + ".xmp") \
+			   and (xmp_metadata is None or len(XMPMetadata(xmp_metadata)) == 0):
+				## Metadata migrated to the sidecar file, see xmp.migrate
+				self._libxmp_file.close_file()
+				self._libxmp_file = None
+				self._is_textual = True
+				xmp_metadata = self._openSidecar()
+		span.lap("read")
 
 		self.libxmp_metadata = xmp_metadata
-
-	def close(self):
-		if not self.is_open:
-			warnings.warn("File {} is already closed".format(self.file_path), RuntimeWarning)
-			return
+		span.lap("build")
+		if span:
+			span.update(packet_size = len(self.__original_packet),
+			            element_count = len(self.metadata._treeElements()))
+
+	def _openSidecar(self):
+		## Simply add the .xmp extension to the file name.
+		## This will avoid collision if someone tries to anotate several
+		## files with same name but different extensions
+		self.side_xmp_file_path = self.file_path+".xmp"
+		xmp_metadata = libxmp.XMPMeta()
+		if os.path.exists(self.side_xmp_file_path):
+			with open(self.side_xmp_file_path, 'r') as file_handle:
+				file_contents = file_handle.read()
+				xmp_metadata.parse_from_str(file_contents)
+		elif self.rw:
+			with open(self.side_xmp_file_path, 'w') as file_handle:
+				file_handle.write(
+				    xmp_metadata.serialize_to_str(**self._serializationOptions()).encode("utf-8")
+				)
+		return xmp_metadata
+
+	def _serializationOptions(self):
+		""" Returns the libxmp serialization options of sidecar and textual files """
+		if self.compact:
+			return dict(omit_packet_wrapper = True, use_compact_format = True)
+		if self.padding is not None:
+			return dict(padding = self.padding)
+		return dict()
+
+	def _write(self, span = tracing.NULL_SPAN):
 		try:
-			if self.read_only and self.has_changed:
-				message =  "Modified a read-only XMP file; won't be saved"
-				warnings.warn(message, RuntimeWarning)
-
-			if self.rw:
-				try:
-					if self.is_side_car:
-						with open(self.side_xmp_file_path, 'w') as file_handle:
-							file_handle.write(
-							    self.libxmp_metadata.serialize_to_str().encode("utf-8")
-							)
-					elif self._is_textual:
-						with open(self.file_path, 'w') as file_handle:
-							file_handle.write(
-							    self.libxmp_metadata.serialize_to_str().encode("utf-8")
-							)
-					elif self._libxmp_file.can_put_xmp(self.libxmp_metadata):
-						self._libxmp_file.put_xmp(self.libxmp_metadata)
-					else:
-						raise
-				except:
-					raise RuntimeError("Can't serialize XMP to file " + self.file_path)
-
-		finally:
-			if not self._is_textual:
-				self._libxmp_file.close_file()
-			self._reset()
-
-	# ───────────────
-	# Context Manager
-
-	def __enter__(self):
-		self.open()
-		return self
+			if self._is_textual:
+				textual_path = self.side_xmp_file_path if self.is_side_car else self.file_path
+				packet = self._writeInPlace(textual_path) if self.in_place else None
+				if packet is None:
+					packet = self.metadata.serialize(**self._serializationOptions()).encode("utf-8")
+					span.lap("serialize")
+					writeAtomically(textual_path, packet)
+				span.lap("write")
+				span.update(packet_size = len(packet))
+			elif self._libxmp_file.can_put_xmp(self._libxmp_metadata):
+				self._libxmp_file.put_xmp(self._libxmp_metadata)
+				span.lap("put_xmp")
+				if span:
+					span.update(packet_size = len(self.metadata.serialize()))
+			else:
+				raise
+		except:
+			raise RuntimeError("Can't serialize XMP to file " + self.file_path)
+		if span:
+			span.update(element_count = len(self.metadata._treeElements()))
 
-	def __exit__(self, type, value, traceback):
-		self.close()
+	def _writeInPlace(self, file_path):
+		"""
+		Overwrites a textual file with the packet padded to the current size of the
+		file.
 
-	# ───────
-	# Helpers
+		Returns:
+			The packet written, or None if the file is missing or the packet doesn't
+			fit in it.
+		"""
+		try:
+			file_size = os.path.getsize(file_path)
+			packet = self.metadata.serialize(padding = file_size, exact_packet_length = True)
+		except (OSError, libxmp.XMPError):
+			return None
+		packet = packet.encode("utf-8")
+		if len(packet) != file_size:
+			return None
+		with open(file_path, 'r+b') as file_handle:
+			file_handle.write(packet)
+			file_handle.flush()
+			os.fsync(file_handle.fileno())
+		return packet
 
 	def _reset(self):
 		self._libxmp_file     = None
 		self._libxmp_metadata = None
 		self.metadata         = None
-		self.__original_repr  = None
+		self.__original_packet = None
 
 	# ──────────────
 	# Textualization
@@ -323,32 +664,41 @@ class XMPMetadata(collections.Mapping):
 	XMPFile object managing it and which may automatically write it when closed.
 	"""
 
-	def __init__(self, libxmp_metadata = libxmp.XMPMeta()):
-		self.libxmp_metadata = libxmp_metadata
+	def __init__(self, libxmp_metadata = None, only = None):
+		"""
+		Builds the object tree of an XMP packet.
+
+		Arguments:
+			libxmp_metadata: The libxmp packet to manipulate; a new empty packet by default.
+			only:            Optional projection, as an iterable of (namespace uid, path)
+			                 pairs. Only the addressed elements, their descendants and the
+			                 containers leading to them are loaded in the object tree; a
+			                 path of "*" loads the whole namespace. Unqualified path
+			                 components are qualified with the namespace prefix. The packet
+			                 itself is untouched, so elements outside the projection are
+			                 still written back.
+		"""
+		if libxmp_metadata is None:
+			libxmp_metadata = libxmp.XMPMeta()
+		self._libxmp_metadata = libxmp_metadata
 		self._namespaces = collections.OrderedDict()
+		self.projection = None if only is None else list(only)
+		self._serializations = {}
 
-		# Group all elements by namespace and parse them in LibXMPElements
-		elements_by_namespace = {}
-		for libxmp_tuple in self.libxmp_metadata:
-			libxmp_element = LibXMPElement(libxmp_tuple)
-			if libxmp_element.is_namespace: continue
-			try:
-				elements_by_namespace[libxmp_element.namespace].append(libxmp_element)
-			except KeyError:
-				elements_by_namespace[libxmp_element.namespace] = [libxmp_element]
-
-		# Construct namespaces; each one is the root object of an XMP object tree
-		for ns_uid, ns_libxmp_descendents in elements_by_namespace.iteritems():
-			namespace = XMPNamespace(self, ns_uid)
-			libxmp_members = namespace.childrenIn(ns_libxmp_descendents)
-			members = [XMPElement.fromLibXMP(m, ns_libxmp_descendents, namespace)
-			           for m in libxmp_members]
-			namespace.children = members
-			self._namespaces[ns_uid] = namespace
+		self._build(self._iterPacket())
 
 	# ──────────
 	# Properties
 
+	@property
+	def libxmp_metadata(self):
+		"""
+		The libxmp packet. Its cached serializations are dropped, since the caller may
+		modify it.
+		"""
+		self.touch()
+		return self._libxmp_metadata
+
 	@property
 	def namespaces(self):
 		return [n for n in self]
@@ -376,11 +726,284 @@ class XMPMetadata(collections.Mapping):
 		self._namespaces[key] = value
 
 	def __delitem__(self, key):
-		self._namespaces[key].delete()
+		self._namespaces[key].__delete__()
 
 	def __contains__(self, uid):
 		return uid in self._namespaces and self._namespaces[uid]
 
+	# ────────
+	# Bulk API
+
+	def get_many(self, paths, default = None):
+		"""
+		Returns the values of many elements at once.
+
+		Paths are resolved together: each namespace prefix is looked up once, each
+		path is parsed once, and containers shared by several paths are walked once.
+
+		Arguments:
+			paths:   Iterable of (namespace uid, path) pairs. Paths are element addresses
+			         such as "a/b[2]/c", with libxmp's 1-based array indices; their
+			         components may be unqualified.
+			default: Value returned for missing elements.
+
+		Returns:
+			The list of the elements' values, in the order of paths.
+		"""
+		resolver = PathResolver(self)
+		values = []
+		for ns_uid, path in paths:
+			element = resolver.get(ns_uid, path)
+			values.append(default if element is None else element.value)
+		return values
+
+	def set_many(self, values):
+		"""
+		Sets many elements at once, creating the missing containers along their paths.
+
+		Containers shared by several paths are created or walked once. Each value is
+		set as by item assignment in its parent element.
+
+		Arguments:
+			values: Mapping, or iterable of pairs, from (namespace uid, path) pairs to
+			        values; paths are as in :meth:`get_many`. Use an ordered container
+			        when the assignment order matters.
+		"""
+		resolver = PathResolver(self)
+		if isinstance(values, collections.Mapping):
+			values = values.iteritems()
+		with tracing.span("set") as span:
+			count = 0
+			for (ns_uid, path), value in values:
+				resolver.set(ns_uid, path, value)
+				count += 1
+			span.update(element_count = count)
+
+	def delete_many(self, paths):
+		"""
+		Deletes many elements at once.
+
+		Arguments:
+			paths: Iterable of (namespace uid, path) pairs, as in :meth:`get_many`.
+
+		Returns:
+			The number of elements deleted; missing elements are ignored.
+		"""
+		resolver = PathResolver(self)
+		with tracing.span("delete") as span:
+			count = sum(1 for ns_uid, path in paths if resolver.delete(ns_uid, path))
+			span.update(element_count = count)
+		return count
+
+	def iterElements(self):
+		"""
+		Iterates over the elements of the packet, or of its projection, in one pass
+		over the packet and without building objects for them.
+
+		Yields:
+			(namespace uid, address, value, kind) tuples in libxmp iteration order,
+			where the value of containers is None; see :func:`elementKind`.
+		"""
+		for (ns_uid, address), libxmp_element in self._packetElements().iteritems():
+			value = libxmp_element.value if libxmp_element.is_value else None
+			yield ns_uid, address, value, elementKind(libxmp_element)
+
+	# ────────────────────────────
+	# Structured export and import
+
+	def to_dict(self):
+		"""
+		Exports the packet, or its projection, as Python values in one iteration of
+		the packet, without building objects for its elements.
+
+		Returns:
+			An ordered dict from namespace uids to their values, as the ``value`` of
+			namespaces: structures are ordered dicts of their fields by qualified name,
+			arrays are lists, sets are sets, and values are unicode strings. Unlike
+			:attr:`XMPValue.value`, empty values are kept as empty strings, so that
+			:meth:`from_dict` sets them back.
+		"""
+		namespaces = collections.OrderedDict()
+		containers = {}
+		for libxmp_tuple in self._iterPacket():
+			libxmp_element = LibXMPElement(libxmp_tuple)
+			if libxmp_element.is_namespace: continue
+
+			ns_uid = libxmp_element.namespace
+			parent_address = libxmp_element.parent_address
+			if parent_address is None:
+				parent = namespaces.get(ns_uid)
+				if parent is None:
+					parent = namespaces[ns_uid] = collections.OrderedDict()
+			else:
+				# Descendants of values, such as qualifiers, have no parent container
+				parent = containers.get((ns_uid, parent_address))
+				if parent is None: continue
+
+			kind = elementKind(libxmp_element)
+			if kind == "value":
+				value = libxmp_element.value
+			else:
+				value = CONTAINER_TYPES[kind]()
+				containers[(ns_uid, libxmp_element.address)] = value
+
+			if isinstance(parent, dict):
+				parent[libxmp_element.name] = value
+			elif isinstance(parent, list):
+				parent.append(value)
+			else:
+				parent.add(value)
+		return namespaces
+
+	def to_json(self, stream):
+		"""
+		Writes the packet, or its projection, as JSON to a stream.
+
+		The JSON object is the dict of :meth:`to_dict`, where sets are written as
+		objects with a single "@set" member, the sorted list of their items.
+		"""
+		json.dump(self.to_dict(), stream, default = jsonEncodeSet)
+
+	@classmethod
+	def from_dict(cls, namespaces):
+		"""
+		Builds a packet from Python values, as exported by :meth:`to_dict`.
+
+		Properties are set in bulk with :meth:`set_many`. Namespaces not yet
+		registered are registered with the prefix of their properties' names.
+
+		Arguments:
+			namespaces: Mapping from namespace uids to mappings of their top-level
+			            properties by qualified name
+		"""
+		for ns_uid, properties in namespaces.iteritems():
+			names = [name for name in properties if isQualified(name)]
+			if names and namespaceForPrefix(names[0].split(":")[0]) is None:
+				registerNamespace(ns_uid, names[0].split(":")[0])
+
+		metadata = cls()
+		metadata.set_many(((ns_uid, name), value)
+		                  for ns_uid, properties in namespaces.iteritems()
+		                  for name, value in properties.iteritems())
+		return metadata
+
+	@classmethod
+	def from_json(cls, stream):
+		""" Builds a packet from JSON written by :meth:`to_json`. """
+		return cls.from_dict(json.load(stream, object_pairs_hook = jsonDecodeObject))
+
+	# ───────────────────
+	# Synchronization API
+
+	# The object tree mirrors the structure of the packet; it goes out of sync when
+	# the libxmp packet is mutated directly rather than through the object tree.
+
+	def verify(self):
+		"""
+		Checks that the object tree matches the structure of the libxmp packet.
+
+		The packet is iterated once, restricted to the projection if there is one,
+		and diffed against the object tree: an element diverges if it is missing on
+		either side, or if its kind (value, struct, array or set) differs.
+
+		Returns:
+			The list of (namespace uid, address) pairs of the roots of the divergent
+			subtrees; empty if the object tree is synchronized.
+		"""
+		return self._divergences(self._packetElements(), self._treeElements())
+
+	def resync(self):
+		"""
+		Patches the object tree to match the structure of the libxmp packet.
+
+		Only the divergent subtrees found as in :meth:`verify` are rebuilt, from the
+		same single iteration of the packet; the rest of the object tree is kept as is.
+
+		Returns:
+			The list of (namespace uid, address) pairs of the patched subtrees.
+		"""
+		self.touch()
+		packet_elements = self._packetElements()
+		tree_elements = self._treeElements()
+		divergences = self._divergences(packet_elements, tree_elements)
+
+		# Group the packet elements by the divergent subtree they belong to, if any,
+		# walking up their ancestors once; subtrees don't overlap
+		divergent_keys = set(divergences)
+		subtrees = collections.defaultdict(list)
+		for (ns_uid, address), libxmp_element in packet_elements.iteritems():
+			ancestor = libxmp_element
+			while ancestor is not None and (ns_uid, ancestor.address) not in divergent_keys:
+				parent_address = ancestor.parent_address
+				ancestor = None if parent_address is None else packet_elements.get((ns_uid, parent_address))
+			if ancestor is not None:
+				subtrees[(ns_uid, ancestor.address)].append(libxmp_element)
+
+		for ns_uid, address in divergences:
+			namespace = self[ns_uid]
+			old_element = tree_elements.get((ns_uid, address))
+			if (ns_uid, address) in packet_elements:
+				new_element = XMPElement.fromLibXMPNodes(subtrees[(ns_uid, address)], namespace)
+			else:
+				new_element = None
+
+			element = old_element if old_element is not None else new_element
+			parent_address = element.parent_address
+			parent = namespace if parent_address is None else tree_elements[(ns_uid, parent_address)]
+			parent._replace(old_element, new_element)
+
+		return divergences
+
+	# ─────────────────
+	# Memory accounting
+
+	def memory_report(self):
+		"""
+		Reports the memory used by the object tree.
+
+		Python object sizes are estimated with ``sys.getsizeof``, as the sum for each
+		element of the element object, its attribute dictionary, its address and its
+		container of children. Interned strings are counted once per element, and the
+		memory of libxmp itself is not counted. Virtual elements are not held by the
+		tree once accessed, except for the namespaces looked up but absent from the
+		packet, which are counted as virtual elements.
+
+		Returns:
+			A dictionary of:
+			- "elements":        the number of elements by class name, and of virtual
+			                     elements under "XMPVirtualElement"
+			- "bytes":           the estimated bytes of the elements, by the same keys
+			- "estimated_bytes": the estimated bytes of the whole object tree and of
+			                     the cached serializations
+			- "packet_size":     the size in bytes of the serialized packet
+			- "caches":          the number of entries of each cache, by name
+		"""
+		counts = collections.Counter()
+		sizes = collections.Counter()
+		containers = []
+		for namespace in self._namespaces.itervalues():
+			kind = "XMPNamespace" if namespace else "XMPVirtualElement"
+			counts[kind] += 1
+			sizes[kind] += elementSize(namespace)
+			containers.append(namespace)
+		while containers:
+			for child in containers.pop().iterchildren():
+				kind = type(child).__name__
+				counts[kind] += 1
+				sizes[kind] += elementSize(child)
+				if child.is_container:
+					containers.append(child)
+
+		return {
+			"elements":        dict(counts),
+			"bytes":           dict(sizes),
+			"estimated_bytes": sum(sizes.itervalues()) + sys.getsizeof(self._namespaces)
+			                   + sum(sys.getsizeof(p) for p in self._serializations.itervalues()),
+			"packet_size":     len(self.serialize().encode("utf-8")),
+			"caches":          {"namespaces": len(self._namespaces),
+			                    "serializations": len(self._serializations)},
+		}
+
 	# ──────────────
 	# Textualization
 
@@ -388,20 +1011,218 @@ class XMPMetadata(collections.Mapping):
 		return unicode(self).encode("utf-8")
 
 	def __unicode__(self):
-		return "\n".join([unicode(n) for n in self.namespaces])
+		return textualize(self)
+
+	def textualize(self, stream):
+		"""
+		Writes the textual tree of the metadata, as given by unicode(), to a stream.
+
+		The tree is written line by line in a single traversal, each line terminated
+		by a newline. The values of a namespace are read in one iteration of its part
+		of the packet rather than one by one, unless the metadata is projected.
+
+		Arguments:
+			stream: File-like object accepting unicode strings, e.g. an io.StringIO or
+			        a file opened with io.open
+		"""
+		for namespace in self.namespaces:
+			namespace.textualize(stream, values = self._namespaceValues(namespace.uid))
 
 	def pretty_str(self):
 		import libxmp.utils
-		raw_pretty_string = XMPMetadata.textualizeXMPDict(libxmp.utils.object_to_dict(self.libxmp_metadata))
+		raw_pretty_string = XMPMetadata.textualizeXMPDict(libxmp.utils.object_to_dict(self._libxmp_metadata))
 		return raw_pretty_string.encode("utf-8")
 
 	def xml(self):
-		raw_xml = self.libxmp_metadata.serialize_and_format().encode("utf-8")
+		raw_xml = self.serialize(formatted = True).encode("utf-8")
 		return raw_xml
 
+	# ─────────────
+	# Serialization
+
+	# Serializations are cached until the packet changes. Mutations through the object
+	# tree drop them, and so does getting the libxmp packet from libxmp_metadata; call
+	# touch() after mutating a libxmp packet reference kept from before serializing.
+
+	def serialize(self, formatted = False, **options):
+		"""
+		Serializes the packet, reusing its last serialization with the same options
+		if the packet has not changed since.
+
+		Arguments:
+			formatted: Whether to serialize with libxmp's serialize_and_format rather
+			           than serialize_to_str.
+			options:   Serialization options of libxmp, e.g. padding or
+			           omit_packet_wrapper.
+
+		Returns:
+			The serialized packet, as a unicode string.
+		"""
+		key = (formatted, tuple(sorted(options.iteritems())))
+		try:
+			return self._serializations[key]
+		except KeyError:
+			if formatted:
+				packet = self._libxmp_metadata.serialize_and_format(**options)
+			else:
+				packet = self._libxmp_metadata.serialize_to_str(**options)
+			self._serializations[key] = packet
+			return packet
+
+	def touch(self):
+		""" Marks the packet as changed, dropping its cached serializations. """
+		self._serializations.clear()
+
 	# ───────
 	# Helpers
 
+	def _iterPacket(self):
+		""" Yields the libxmp iteration tuples of the packet, or of its projection. """
+		if self.projection is None:
+			return libxmp.XMPIterator(self._libxmp_metadata)
+		else:
+			return self._iterProjection()
+
+	def _namespaceValues(self, ns_uid):
+		"""
+		Returns the values of a namespace by address, read lazily from an iteration of
+		its part of the packet, or None if the metadata is projected.
+		"""
+		if self.projection is None:
+			return PacketValues(libxmp.XMPIterator(self._libxmp_metadata, schema_ns = ns_uid))
+
+	def _packetElements(self):
+		"""
+		Returns the elements of the packet that belong in the object tree.
+
+		Returns:
+			An ordered dict of libxmp elements by (namespace uid, address), in libxmp
+			iteration order. As in :meth:`_build`, descendants of values are excluded.
+		"""
+		elements = collections.OrderedDict()
+		for libxmp_tuple in self._iterPacket():
+			libxmp_element = LibXMPElement(libxmp_tuple)
+			if libxmp_element.is_namespace: continue
+
+			ns_uid = libxmp_element.namespace
+			parent_address = libxmp_element.parent_address
+			if parent_address is not None:
+				parent = elements.get((ns_uid, parent_address))
+				if parent is None or not parent.is_container: continue
+			elements[(ns_uid, libxmp_element.address)] = libxmp_element
+		return elements
+
+	def _treeElements(self):
+		""" Returns the elements of the object tree by (namespace uid, address). """
+		elements = {}
+		containers = list(self._namespaces.itervalues())
+		while containers:
+			for child in containers.pop().iterchildren():
+				elements[(child.namespace.uid, child.address)] = child
+				if child.is_container:
+					containers.append(child)
+		return elements
+
+	@staticmethod
+	def _divergences(packet_elements, tree_elements):
+		"""
+		Diffs packet elements against object tree elements.
+
+		Returns:
+			The keys of the roots of the divergent subtrees, packet elements first in
+			iteration order, then elements missing from the packet.
+		"""
+		divergent = []
+		for key, libxmp_element in packet_elements.iteritems():
+			element = tree_elements.get(key)
+			if element is None or elementKind(element) != elementKind(libxmp_element):
+				divergent.append(key)
+		divergent.extend(sorted(k for k in tree_elements if k not in packet_elements))
+
+		divergent_addresses = collections.defaultdict(list)
+		for ns_uid, address in divergent:
+			divergent_addresses[ns_uid].append(address)
+		return [(ns_uid, address) for ns_uid, address in divergent
+		        if not any(isDescendantAddress(address, a) for a in divergent_addresses[ns_uid])]
+
+	def _build(self, libxmp_tuples):
+		"""
+		Builds namespace trees from libxmp iteration tuples in a single pass.
+
+		Tuples must come in libxmp iteration order, parents before their children.
+		Descendants of values, such as qualifiers, are not part of the object tree.
+		"""
+		namespaces = {}
+		containers = {}
+		for libxmp_tuple in libxmp_tuples:
+			libxmp_element = LibXMPElement(libxmp_tuple)
+			if libxmp_element.is_namespace: continue
+
+			ns_uid = libxmp_element.namespace
+			parent_address = libxmp_element.parent_address
+			if parent_address is None:
+				try:
+					parent = namespaces[ns_uid]
+				except KeyError:
+					parent = namespaces[ns_uid] = XMPNamespace(self, ns_uid)
+			else:
+				try:
+					parent = containers[(ns_uid, parent_address)]
+				except KeyError:
+					continue
+
+			element = XMPElement.fromLibXMPNode(libxmp_element, parent.namespace)
+			parent._attach(element)
+			if libxmp_element.is_container:
+				containers[(ns_uid, libxmp_element.address)] = element
+
+		for ns_uid, namespace in namespaces.iteritems():
+			self._namespaces[ns_uid] = namespace
+
+	def _iterProjection(self):
+		"""
+		Yields the libxmp iteration tuples selected by the projection.
+
+		Each top-level property is iterated once for all the paths it contains, and
+		subtrees outside of the projection are skipped by libxmp.
+		"""
+		paths_by_namespace = collections.OrderedDict()
+		for ns_uid, path in self.projection:
+			paths_by_namespace.setdefault(ns_uid, []).append(path)
+
+		for ns_uid, paths in paths_by_namespace.iteritems():
+			if "*" in paths:
+				for libxmp_tuple in libxmp.XMPIterator(self._libxmp_metadata, schema_ns = ns_uid):
+					yield libxmp_tuple
+				continue
+
+			try:
+				prefix = libxmp.exempi.namespace_prefix(ns_uid)[:-1]
+			except libxmp.XMPError:
+				# An unknown namespace can't have properties in the packet
+				continue
+
+			addresses_by_root = collections.OrderedDict()
+			for path in paths:
+				address = qualifyPath(path, prefix)
+				addresses_by_root.setdefault(rootAddress(address), []).append(address)
+
+			for root_address, addresses in addresses_by_root.iteritems():
+				if not self._libxmp_metadata.does_property_exist(schema_ns = ns_uid,
+				                                                prop_name = root_address):
+					continue
+				iterator = libxmp.XMPIterator(self._libxmp_metadata,
+				                              schema_ns = ns_uid,
+				                              prop_name = root_address)
+				for libxmp_tuple in iterator:
+					element_address = libxmp_tuple[1]
+					if any(element_address == a
+					    or isDescendantAddress(element_address, a)
+					    or isDescendantAddress(a, element_address) for a in addresses):
+						yield libxmp_tuple
+					else:
+						iterator.skip(iter_skipsubtree = True)
+
 	@staticmethod
 	def textualizeXMPDict(x, indent = ""):
 		rep = ""
@@ -419,6 +1240,83 @@ class XMPMetadata(collections.Mapping):
 			return str(x)
 		return rep
 
+class PathResolver(object):
+	"""
+	Resolves many property paths in a metadata packet, sharing work between them.
+
+	Namespace prefixes, parsed paths and walked containers are cached for the
+	lifetime of the resolver, which should not outlive a batch of operations.
+	"""
+
+	def __init__(self, metadata):
+		self.metadata = metadata
+		self._prefixes = {}
+		self._steps = {}
+		self._resolved = {}
+
+	# ───────────
+	# General API
+
+	def get(self, ns_uid, path):
+		""" Returns the element at path in a namespace, or None if it doesn't exist. """
+		namespace, steps = self._parse(ns_uid, path)
+		return namespace._walk(steps, self._resolved[ns_uid])
+
+	def set(self, ns_uid, path, value):
+		""" Sets the element at path in a namespace, creating missing containers. """
+		namespace, steps = self._parse(ns_uid, path)
+		resolved = self._resolved[ns_uid]
+		parent = namespace._walk(steps[:-1], resolved, create_before = steps[-1])
+		parent._setChild(steps[-1], value)
+
+		if value is None or isinstance(value, (collections.Mapping, collections.Set)) \
+		   or isinstance(value, collections.Sequence) and not isinstance(value, basestring):
+			# Containers under the element may have been replaced or deleted
+			self._invalidate(ns_uid, appendStep(parent.address, steps[-1]))
+
+	def delete(self, ns_uid, path):
+		""" Deletes the element at path in a namespace; returns whether it existed. """
+		namespace, steps = self._parse(ns_uid, path)
+		parent = namespace._walk(steps[:-1], self._resolved[ns_uid])
+		if parent is None or parent._child(steps[-1]) is None:
+			return False
+		parent._deleteChild(steps[-1])
+
+		if isinstance(parent, (XMPArray, XMPSet)):
+			# Following items moved down by one index
+			self._invalidate(ns_uid, parent.address, keep_root = True)
+		else:
+			self._invalidate(ns_uid, appendStep(parent.address, steps[-1]))
+		return True
+
+	# ───────
+	# Helpers
+
+	def _invalidate(self, ns_uid, address, keep_root = False):
+		""" Forgets the cached containers at and under an address """
+		resolved = self._resolved[ns_uid]
+		for cached_address in resolved.keys():
+			if (cached_address == address and not keep_root) \
+			   or isDescendantAddress(cached_address, address):
+				del resolved[cached_address]
+
+	def _parse(self, ns_uid, path):
+		namespace = self.metadata[ns_uid]
+		try:
+			return namespace, self._steps[(ns_uid, path)]
+		except KeyError:
+			pass
+
+		try:
+			prefix = self._prefixes[ns_uid]
+		except KeyError:
+			prefix = self._prefixes[ns_uid] = namespace.prefix
+			self._resolved[ns_uid] = {}
+
+		steps = namespace._parsePath(path, prefix)
+		self._steps[(ns_uid, path)] = steps
+		return namespace, steps
+
 class TreePredicatesMixin:
 	"""
 	Defines tree operations for any element that has a namespace and address.
@@ -617,6 +1515,35 @@ class LibXMPElement(object, TreePredicatesMixin):
 		if self.value: rep += " = " + self.value
 		return rep
 
+class PacketValues(object):
+	"""
+	Values of the packet by address, empty values being empty strings, read from a
+	libxmp iteration as they are looked up.
+
+	The iteration is advanced until the looked up address is met, keeping the values
+	met before it, and values are dropped once read: looking up values in packet order
+	holds one value at a time rather than the whole packet.
+	"""
+
+	def __init__(self, libxmp_tuples):
+		self._libxmp_tuples = iter(libxmp_tuples)
+		self._pending = dict()
+
+	def __contains__(self, address):
+		while address not in self._pending:
+			libxmp_tuple = next(self._libxmp_tuples, None)
+			if libxmp_tuple is None:
+				return False
+			libxmp_element = LibXMPElement(libxmp_tuple)
+			if libxmp_element.is_value:
+				self._pending[libxmp_element.address] = libxmp_element.value
+		return True
+
+	def __getitem__(self, address):
+		if address not in self:
+			raise KeyError(address)
+		return self._pending.pop(address)
+
 class FreezeMixin:
 	@staticmethod
 	def marker(classname):
@@ -704,27 +1631,38 @@ class XMPElement(object, TreeManipulationMixin, FreezeMixin):
 		self.freeze(XMPElement)
 
 	@staticmethod
-	def fromLibXMP(libxmp_element, potential_descendents, namespace):
+	def fromLibXMPNode(libxmp_element, namespace):
+		""" Builds an element without children from a libxmp element. """
 		if libxmp_element.is_value:
 			return XMPValue(namespace, libxmp_element.address)
-		else:
-			# Container type elements
-			libxmp_descendents = libxmp_element.descendentsIn(potential_descendents)
-			libxmp_children    = libxmp_element.childrenIn(libxmp_descendents)
-
-			# Recursively build children
-			children_elements = [XMPElement.fromLibXMP(libxmp_child,
-			                                           libxmp_descendents,
-			                                           namespace) for libxmp_child \
-			                                                       in libxmp_children]
-
-			# Return the assembled tree
-			if libxmp_element.is_struct:
-				return XMPStructure(namespace, libxmp_element.address, children_elements)
-			elif libxmp_element.is_array:
-				return XMPArray(namespace, libxmp_element.address, children_elements)
-			elif libxmp_element.is_set:
-				return XMPSet(namespace, libxmp_element.address, children_elements)
+		elif libxmp_element.is_struct:
+			return XMPStructure(namespace, libxmp_element.address, [])
+		elif libxmp_element.is_array:
+			return XMPArray(namespace, libxmp_element.address, [])
+		elif libxmp_element.is_set:
+			return XMPSet(namespace, libxmp_element.address, [])
+
+	@staticmethod
+	def fromLibXMPNodes(libxmp_elements, namespace):
+		"""
+		Builds the subtree rooted in the first of libxmp elements in a single pass.
+
+		Elements must come in libxmp iteration order; those outside of containers of
+		the subtree are ignored.
+		"""
+		root = None
+		containers = {}
+		for libxmp_element in libxmp_elements:
+			element = XMPElement.fromLibXMPNode(libxmp_element, namespace)
+			if root is None:
+				root = element
+			else:
+				parent = containers.get(libxmp_element.parent_address)
+				if parent is None: continue
+				parent._attach(element)
+			if libxmp_element.is_container:
+				containers[libxmp_element.address] = element
+		return root
 
 	@staticmethod
 	def fromValue(namespace, address, value):
@@ -764,7 +1702,46 @@ class XMPElement(object, TreeManipulationMixin, FreezeMixin):
 		raise NotImplementedError("Must be overriden")
 
 	def _delete(self):
-		self.libxmp_metadata.delete_property(schema_ns=self.namespace.uid, prop_name=self.address)
+		self._libxmp_metadata.delete_property(schema_ns=self.namespace.uid, prop_name=self.address)
+		self._touch()
+
+	def _touch(self):
+		""" Drops the cached serializations of the packet, after changing it. """
+		self.namespace.xmp.touch()
+
+	def _move(self, address):
+		""" Changes the address of the element and of its descendants, after libxmp moved it. """
+		old_address = self.address
+		elements = [self]
+		while elements:
+			element = elements.pop()
+			element.address = address + element.address[len(old_address):]
+			if element.is_container:
+				elements.extend(element.iterchildren())
+
+	# ─────────────
+	# Path step API
+
+	# Path steps are qualified field names or 1-based array indices (see splitPath).
+
+	def _child(self, step):
+		""" Returns the child at a path step, or None if it doesn't exist. """
+		return None
+
+	def _createChild(self, step, next_step):
+		""" Creates an empty container at a path step, of the kind addressed by the next step. """
+		raise TypeError("Can't create {step} in {address}: not a container".format(step = step,
+		                                                                          address = self.address))
+
+	def _setChild(self, step, value):
+		""" Sets the child at a path step, creating it if needed. """
+		raise TypeError("Can't set {step} in {address}: not a container".format(step = step,
+		                                                                      address = self.address))
+
+	def _deleteChild(self, step):
+		""" Deletes the existing child at a path step. """
+		raise TypeError("Can't delete {step} in {address}: not a container".format(step = step,
+		                                                                         address = self.address))
 
 	# ───────────────────
 	# Descriptor protocol
@@ -784,7 +1761,9 @@ class XMPElement(object, TreeManipulationMixin, FreezeMixin):
 
 	@property
 	def is_container(self):
-		raise NotImplementedError("Must be overriden")
+		# ContainerMixin comes after XMPElement in containers' MRO, so its override
+		# is never reached
+		return isinstance(self, ContainerMixin)
 
 	@property
 	def namespace(self):
@@ -792,12 +1771,17 @@ class XMPElement(object, TreeManipulationMixin, FreezeMixin):
 
 	@property
 	def libxmp_metadata(self):
-		return self.namespace.libxmp_metadata
+		""" The libxmp packet of the element; see :attr:`XMPMetadata.libxmp_metadata` """
+		return self.namespace.xmp.libxmp_metadata
+
+	@property
+	def _libxmp_metadata(self):
+		return self.namespace.xmp._libxmp_metadata
 
 	@property
 	def desynchronized(self):
-		return self.libxmp_metadata.does_property_exist(schema_ns = self.namespace.uid,
-		                                                prop_name = self.address)
+		return not self._libxmp_metadata.does_property_exist(schema_ns = self.namespace.uid,
+		                                                    prop_name = self.address)
 
 	# ──────────────
 	# Textualization
@@ -821,7 +1805,7 @@ class XMPVirtualElement(object, TreeManipulationMixin, FreezeMixin):
 	# ────────────
 	# Constructors
 
-	def __init__(self, namespace, address):
+	def __init__(self, namespace, address, steps = None):
 		"""
 		Constructs a virtual XMP element.
 
@@ -830,6 +1814,9 @@ class XMPVirtualElement(object, TreeManipulationMixin, FreezeMixin):
 			           element is a namespace itself. No strong reference of it will be
 			           kept, only a weakref.
 			address: The fully-qualified, absolute address of the element in its namespace.
+			steps: The qualified field names and 1-based array indices leading to the
+			       element, of which address is made. By default, address is split
+			       into steps when the element is set, which it must then allow.
 		"""
 
 		if not isinstance(namespace, weakref.ReferenceType):
@@ -837,6 +1824,7 @@ class XMPVirtualElement(object, TreeManipulationMixin, FreezeMixin):
 		else:
 			self._namespace = namespace
 		self.address = address
+		self._steps = steps
 		self.freeze(XMPVirtualElement)
 
 	# ──────────
@@ -851,7 +1839,8 @@ class XMPVirtualElement(object, TreeManipulationMixin, FreezeMixin):
 		try:
 			return super(XMPVirtualElement, self).parent
 		except KeyError:
-			return XMPVirtualElement(self.namespace, self.parent_address)
+			steps = self._steps[:-1] if self._steps is not None else None
+			return XMPVirtualElement(self.namespace, self.parent_address, steps)
 
 	# ─────────────
 	# Attribute API
@@ -871,8 +1860,7 @@ class XMPVirtualElement(object, TreeManipulationMixin, FreezeMixin):
 		"""
 
 		# A subfield of a virtual element is also virtual
-		qualified_field_name = self.namespace.qualify(name)
-		return XMPVirtualElement(self.namespace, self.absoluteAddress(qualified_field_name))
+		return self._virtualChild(self.namespace.qualify(name))
 
 	def __setattr__(self, name, value):
 		if self.frozen and not self.__raw_hasattr__(name):
@@ -887,10 +1875,10 @@ class XMPVirtualElement(object, TreeManipulationMixin, FreezeMixin):
 
 	def __getitem__(self, key):
 		if isinstance(key, (int, long)):
-			return XMPVirtualElement(self.namespace, self.absoluteAddress("[%s]"%key))
+			# 0-based like XMPArray indices
+			return self._virtualChild(key+1)
 		elif isinstance(key, basestring):
-			qualified_field_name = self.namespace.qualify(key)
-			return XMPVirtualElement(self.namespace, self.absoluteAddress(qualified_field_name))
+			return self._virtualChild(self.namespace.qualify(key))
 		else:
 			raise TypeError("Wrong index type "+str(type(key)))
 
@@ -902,37 +1890,15 @@ class XMPVirtualElement(object, TreeManipulationMixin, FreezeMixin):
 		Sets the property in the associated libxmp metadata and adds an XMP element to
 		the object tree rooted in the virtual element's namespace.
 
+		The element's path is walked once from the namespace; the existing containers
+		along it are reused, and only the missing ones are created.
+
 		Attributes:
 			owner_object: object the
 		"""
 
-		parent = self.parent
-		if type(parent) is XMPVirtualElement:
-			# Set was called on chained virtual elements; go up the chain, recursing to the
-			# base case where the parent exists.
-
-			# There are only 2 ways to get a child virtual element from a parent virtual
-			# element:
-			# - with the . attribute operator or [] field-name lookup operator, in which
-			#   case the parent (virtual) element will be a struct;
-			# - with the [] integer-indexing operator, in which case the parent (virtual)
-			#   element is an array.
-
-			if self.is_array_element:
-				parent_value = [None] * self.index + [value]
-			else:
-				parent_value = {self.name : value}
-
-			parent.__set__(owner_object, parent_value)
-		else:
-			# The parent already exists ; we'll do out part by creating the element, and
-			# recursing downwards to let children create themselves if needed.
-
-			new_element = XMPElement.fromValue(self.namespace, self.address, value)
-			if self.is_array_element:
-				parent.set(self.index, value)
-			else:
-				parent[self.name] = value
+		steps = self._steps if self._steps is not None else splitPath(self.address)
+		self.namespace._setSteps(steps, value)
 
 	# ──────────────
 	# Textualization
@@ -944,6 +1910,14 @@ class XMPVirtualElement(object, TreeManipulationMixin, FreezeMixin):
 		return "{namespace}@{address} [virtual]".format(namespace = self.namespace.uid,
 		                                                  address = self.address)
 
+	# ───────
+	# Helpers
+
+	def _virtualChild(self, step):
+		""" Returns the virtual element at a path step below this one. """
+		steps = self._steps + [step] if self._steps is not None else None
+		return XMPVirtualElement(self.namespace, appendStep(self.address, step), steps)
+
 class XMPStructure(XMPElement, ContainerMixin, collections.Sequence, collections.Mapping):
 	""" Convenience wrapper around libXMP to manipulate an XMP struct. """
 
@@ -971,7 +1945,7 @@ class XMPStructure(XMPElement, ContainerMixin, collections.Sequence, collections
 
 	@property
 	def desynchronized(self):
-		if not self.libxmp_metadata.does_property_exist(schema_ns = self.namespace.uid,
+		if not self._libxmp_metadata.does_property_exist(schema_ns = self.namespace.uid,
 		                                                prop_name = self.address):
 			return True
 
@@ -1005,10 +1979,11 @@ class XMPStructure(XMPElement, ContainerMixin, collections.Sequence, collections
 		elif not isinstance(value, collections.Mapping):
 			raise TypeError("XMPStructure can only be set with collections.Mapping values; given " + str(type(value)))
 
-		self.libxmp_metadata.set_property(schema_ns = self.namespace.uid,
+		self._libxmp_metadata.set_property(schema_ns = self.namespace.uid,
 		                                  prop_name = self.address,
 		                                 prop_value = "",
 		                       prop_value_is_struct = True)
+		self._touch()
 		if value is not None:
 			self.update(value)
 
@@ -1040,6 +2015,40 @@ class XMPStructure(XMPElement, ContainerMixin, collections.Sequence, collections
 		""" Returns an iterator over children. """
 		return self._children.itervalues()
 
+	def _attach(self, child):
+		""" Adds an element already existing in the XMP packet as last child. """
+		self._children[child.name] = child
+
+	def _replace(self, old_child, new_child):
+		"""
+		Replaces a child in the object tree only, leaving the XMP packet untouched.
+
+		Either child may be None, to add or remove a child.
+		"""
+		if new_child is None:
+			del self._children[old_child.name]
+		else:
+			self._children[new_child.name] = new_child
+
+	def _child(self, step):
+		if isinstance(step, basestring):
+			return self._children.get(step)
+		return None
+
+	def _createChild(self, step, next_step):
+		if not isinstance(step, basestring):
+			return XMPElement._createChild(self, step, next_step)
+		self.set(step, [] if isinstance(next_step, (int, long)) else {})
+		return self._children[step]
+
+	def _setChild(self, step, value):
+		if not isinstance(step, basestring):
+			return XMPElement._setChild(self, step, value)
+		self.set(step, value)
+
+	def _deleteChild(self, step):
+		del self[step]
+
 	def set(self, key, value):
 		""" Sets the attribute named key, even if it doesn't exist, and do all book-keeping. """
 
@@ -1051,7 +2060,7 @@ class XMPStructure(XMPElement, ContainerMixin, collections.Sequence, collections
 			new_element._create(value)
 			self._children[qualified_key] = new_element
 		elif value is None:
-			self._children[qualified_key].delete()
+			self._children[qualified_key].__delete__()
 			del self._children[qualified_key]
 		else:
 			self._children[qualified_key].update(value)
@@ -1223,17 +2232,30 @@ class XMPStructure(XMPElement, ContainerMixin, collections.Sequence, collections
 	# Textualization
 
 	def __str__(self):
-		children = "\n".join([str(c) for c in self.children])
-		return self.name + "\n\t" + children.replace("\n", "\n\t")
+		return unicode(self).encode("utf-8")
 
 	def __unicode__(self):
-		if self:
-			mid_children_str = [TREE_MID_INDENT+unicode(c) for c in self[:-1]]
-			last_child_str = TREE_LAST_INDENT+unicode(self[-1])
-			children_str = mid_children_str + [last_child_str]
-		else:
-			children_str = []
-		return self.name + "\n" + "\n".join([c.replace("\n","\n"+INDENT)for c in children_str])
+		return textualize(self)
+
+	def textualize(self, stream, first = u"", rest = u"", values = None):
+		"""
+		Writes the textual tree of the element, as given by unicode(), to a stream.
+
+		Arguments:
+			stream: File-like object accepting unicode strings
+			first:  Prefix of the first line, e.g. the indentation in a parent's tree
+			rest:   Prefix of the other lines
+			values: Optional values of the leaves by address, read from the packet
+			        otherwise
+		"""
+		writeLines(stream, self.name, first, rest)
+		if not self._children:
+			stream.write(rest + u"\n")
+		children = self._children.values()
+		for child in children[:-1]:
+			child.textualize(stream, rest + TREE_MID_INDENT, rest + INDENT, values)
+		for child in children[-1:]:
+			child.textualize(stream, rest + TREE_LAST_INDENT, rest + INDENT, values)
 
 	# ───────
 	# Helpers
@@ -1269,12 +2291,17 @@ class XMPNamespace(XMPStructure):
 
 	@property
 	def libxmp_metadata(self):
+		""" The libxmp packet of the namespace; see :attr:`XMPMetadata.libxmp_metadata` """
 		return self.xmp.libxmp_metadata
 
+	@property
+	def _libxmp_metadata(self):
+		return self.xmp._libxmp_metadata
+
 	@property
 	def prefix(self):
 		try:
-			return self.libxmp_metadata.get_prefix_for_namespace(self.uid)[:-1]
+			return self._libxmp_metadata.get_prefix_for_namespace(self.uid)[:-1]
 		except libxmp.XMPError, e:
 			return None
 
@@ -1282,6 +2309,10 @@ class XMPNamespace(XMPStructure):
 	def exists(self):
 		return self.uid in self.xmp
 
+	@property
+	def desynchronized(self):
+		return any(c.desynchronized for c in self)
+
 	# ───────────────────────────────
 	# CRUD API (XMPElement overrides)
 
@@ -1295,7 +2326,7 @@ class XMPNamespace(XMPStructure):
 
 	def _delete(self):
 		for child in self:
-			child.delete()
+			child.__delete__()
 
 	# ──────────────
 	# Comparison API
@@ -1313,6 +2344,80 @@ class XMPNamespace(XMPStructure):
 		if self.prefix is not None: return qualify(name, self.prefix)
 		raise NameError("%s is unqualified and %s does not have a default prefix"%(name, self.uid))
 
+	def _parsePath(self, path, prefix = False):
+		"""
+		Splits a property path into qualified steps
+
+		The prefix may be passed by callers caching it; otherwise it is looked up at
+		most once, and only if the path has unqualified components.
+		"""
+		steps = splitPath(path)
+		for i, step in enumerate(steps):
+			if isinstance(step, basestring) and not isQualified(step):
+				if prefix is False:
+					prefix = self.prefix
+				if prefix is None:
+					raise NameError("%s is unqualified and %s does not have a default prefix"%(step, self.uid))
+				steps[i] = qualify(step, prefix)
+		return steps
+
+	# ────────
+	# Path API
+
+	def set_path(self, path, value):
+		"""
+		Sets the element at a property path, creating only the missing containers.
+
+		The path is walked once; existing containers are reused as is, and missing
+		ones are created as structs or arrays depending on the step that follows
+		them. Array indices are 1-based, as in XMP.
+
+		e.g. ``namespace.set_path("a/b[3]/c", 12)``
+
+		Arguments:
+			path:  A property path, the components of which are qualified with the
+			       namespace prefix if they are not already.
+			value: The value to set, in any form accepted by ``XMPElement.fromValue``.
+		"""
+		with tracing.span("set"):
+			self._setSteps(self._parsePath(path), value)
+
+	def _setSteps(self, steps, value):
+		parent = self._walk(steps[:-1], create_before = steps[-1])
+		parent._setChild(steps[-1], value)
+
+	def _walk(self, steps, resolved = None, create_before = None):
+		"""
+		Walks down the object tree along path steps.
+
+		Arguments:
+			steps:         Qualified field names and 1-based array indices.
+			resolved:      Optional dict of containers by address, used and filled to
+			               share walks between paths.
+			create_before: If given, missing containers are created instead of ending the
+			               walk; this is the step that will follow the last one, which
+			               gives the kind of the last container.
+
+		Returns:
+			The element at the end of the path, or None if it doesn't exist.
+		"""
+		element = self
+		address = ""
+		for depth, step in enumerate(steps):
+			address = appendStep(address, step)
+			child = resolved.get(address) if resolved is not None else None
+			if child is None:
+				child = element._child(step)
+				if child is None:
+					if create_before is None:
+						return None
+					next_step = steps[depth+1] if depth+1 < len(steps) else create_before
+					child = element._createChild(step, next_step)
+				if resolved is not None and child.is_container:
+					resolved[address] = child
+			element = child
+		return element
+
 	# ──────────────
 	# Textualization
 
@@ -1320,11 +2425,12 @@ class XMPNamespace(XMPStructure):
 		return unicode(self).encode("utf-8")
 
 	def __unicode__(self):
-		if self.children:
-			unicode_children = (unicode(e) for e in self.iterchildren())
-			return u"{}\n{}".format(self.uid, "\n".join(unicode_children)).replace("\n","\n\t")
-		else:
-			return self.uid
+		return textualize(self)
+
+	def textualize(self, stream, first = u"", rest = u"", values = None):
+		writeLines(stream, self.uid, first, rest)
+		for child in self.iterchildren():
+			child.textualize(stream, rest + u"\t", rest + u"\t", values)
 
 class XMPArray(XMPElement, ContainerMixin, collections.MutableSequence):
 	""" Convenience wrapper around libXMP to manipulate an XMP array (rdf:Seq). """
@@ -1342,13 +2448,13 @@ class XMPArray(XMPElement, ContainerMixin, collections.MutableSequence):
 
 	@property
 	def desynchronized(self):
-		if not self.libxmp_metadata.does_property_exist(schema_ns = self.namespace.uid,
+		if not self._libxmp_metadata.does_property_exist(schema_ns = self.namespace.uid,
 		                                                prop_name = self.address):
 			return True
 
-		any_child_desynchronized = any(children.desynchronized for c in self.children)
-		real_length = self.libxmp_metadata.count_array_items(schema_ns = self.namespace.uid,
-		                                                     prop_name = self.address)
+		any_child_desynchronized = any(c.desynchronized for c in self.children)
+		real_length = self._libxmp_metadata.count_array_items(schema_ns = self.namespace.uid,
+		                                                     array_name = self.address)
 		missing_elements = real_length != len(self)
 
 		return any_child_desynchronized or missing_elements
@@ -1370,11 +2476,12 @@ class XMPArray(XMPElement, ContainerMixin, collections.MutableSequence):
 		elif not isinstance(value, collections.Sequence):
 			raise TypeError("XMPArray can only be set with collections.Sequence values; given " + str(type(value)))
 
-		self.libxmp_metadata.set_property(schema_ns = self.namespace.uid,
+		self._libxmp_metadata.set_property(schema_ns = self.namespace.uid,
 		                                  prop_name = self.address,
 		                                 prop_value = "",
 		                        prop_value_is_array = True,
 		                      prop_array_is_ordered = True)
+		self._touch()
 
 		if value is not None:
 			self.update(value)
@@ -1403,6 +2510,46 @@ class XMPArray(XMPElement, ContainerMixin, collections.MutableSequence):
 	def children(self):
 		return self._children
 
+	def iterchildren(self):
+		""" Returns an iterator over children. """
+		return iter(self._children)
+
+	def _attach(self, child):
+		""" Adds an element already existing in the XMP packet as last child. """
+		self._children.append(child)
+
+	def _replace(self, old_child, new_child):
+		"""
+		Replaces a child in the object tree only, leaving the XMP packet untouched.
+
+		Either child may be None, to add a last child or remove a child.
+		"""
+		if old_child is None:
+			self._children.append(new_child)
+		elif new_child is None:
+			self._children.remove(old_child)
+		else:
+			self._children[self._children.index(old_child)] = new_child
+
+	def _child(self, step):
+		if isinstance(step, (int, long)) and 0 < step <= len(self._children):
+			return self._children[step-1]
+		return None
+
+	def _createChild(self, step, next_step):
+		if not isinstance(step, (int, long)) or step < 1:
+			return XMPElement._createChild(self, step, next_step)
+		self.set(step-1, [] if isinstance(next_step, (int, long)) else {})
+		return self._children[step-1]
+
+	def _setChild(self, step, value):
+		if not isinstance(step, (int, long)) or step < 1:
+			return XMPElement._setChild(self, step, value)
+		self.set(step-1, value)
+
+	def _deleteChild(self, step):
+		del self[step-1]
+
 	# ───────────────────
 	# Descriptor protocol
 
@@ -1426,7 +2573,7 @@ class XMPArray(XMPElement, ContainerMixin, collections.MutableSequence):
 			return self.children[i].__set__(self, value)
 		else:
 			# Pad with None elements if any needed
-			for x in range(len(self), i-1):
+			for x in range(len(self), i):
 				self.append(None)
 			# Set the extra element
 			self.append(value)
@@ -1448,10 +2595,7 @@ class XMPArray(XMPElement, ContainerMixin, collections.MutableSequence):
 			# Adjust the indices of all items that moved/"fell" from the deletion of the
 			# element before them
 			for k in range(i,len(self)):
-				array_indexing_match = TreePredicatesMixin.ARRAY_ELEMENT_REGEX.match(self[k].address)
-				assert(array_indexing_match)
-				previous_index = int(array_indexing_match.group(2))
-				self[k].address = array_indexing_match.group(1) + "[%s]"%(previous_index-1)
+				self[k]._move(appendStep(self.address, self[k].index - 1))
 
 			return child_to_delete
 		elif isinstance(i, slice):
@@ -1474,11 +2618,12 @@ class XMPArray(XMPElement, ContainerMixin, collections.MutableSequence):
 		                                   self.absoluteAddress("[%s]"%xmp_i),
 		                                   value)
 		if isinstance(new_element, XMPValue):
-			self.libxmp_metadata.set_array_item(schema_ns  = self.namespace.uid,
+			self._libxmp_metadata.set_array_item(schema_ns  = self.namespace.uid,
 			                                    array_name = self.address,
 			                                    item_index = xmp_i,
 			                                    item_value = None,
 			                                    prop_array_insert_before= True)
+			self._touch()
 		new_element._create(value)
 		self._children.insert(i, new_element)
 
@@ -1506,14 +2651,18 @@ class XMPArray(XMPElement, ContainerMixin, collections.MutableSequence):
 	# Textualization
 
 	def __str__(self):
-		children_strings = "\n".join(["- "+str(c).replace("\n", "\n  ")
-		                              for c in self.children])
-		return self.name + " [\n    " + children_strings.replace("\n", "\n    ") + "\n]"
+		return unicode(self).encode("utf-8")
 
 	def __unicode__(self):
-		children_strings = "\n".join([u"⁃ "+unicode(c).replace("\n", "\n  ")
-		                              for c in self.children])
-		return self.name + " [\n    " + children_strings.replace("\n", "\n    ") + "\n]"
+		return textualize(self)
+
+	def textualize(self, stream, first = u"", rest = u"", values = None):
+		writeLines(stream, self.name + u" [", first, rest)
+		if not self._children:
+			stream.write(rest + ARRAY_INDENT + u"\n")
+		for child in self.iterchildren():
+			child.textualize(stream, rest + ARRAY_ITEM_INDENT, rest + ITEM_INDENT, values)
+		stream.write(rest + u"]\n")
 
 class XMPSet(XMPElement, ContainerMixin, collections.MutableSet):
 	""" Convenience wrapper around libXMP to manipulate an XMP set (rdf:Bag). """
@@ -1531,13 +2680,13 @@ class XMPSet(XMPElement, ContainerMixin, collections.MutableSet):
 
 	@property
 	def desynchronized(self):
-		if not self.libxmp_metadata.does_property_exist(schema_ns = self.namespace.uid,
+		if not self._libxmp_metadata.does_property_exist(schema_ns = self.namespace.uid,
 		                                                prop_name = self.address):
 			return True
 
-		any_child_desynchronized = any(children.desynchronized for c in self.children)
-		real_length = self.libxmp_metadata.count_array_items(schema_ns = self.namespace.uid,
-		                                                     prop_name = self.address)
+		any_child_desynchronized = any(c.desynchronized for c in self.children)
+		real_length = self._libxmp_metadata.count_array_items(schema_ns = self.namespace.uid,
+		                                                     array_name = self.address)
 		missing_elements = real_length != len(self)
 
 		return any_child_desynchronized or missing_elements
@@ -1559,11 +2708,12 @@ class XMPSet(XMPElement, ContainerMixin, collections.MutableSet):
 		elif not isinstance(value, collections.Set):
 			raise TypeError("XMPSet can only be set with collections.Set values; given " + str(type(value)))
 
-		self.libxmp_metadata.set_property(schema_ns = self.namespace.uid,
+		self._libxmp_metadata.set_property(schema_ns = self.namespace.uid,
 		                                  prop_name = self.address,
 		                                 prop_value = "",
 		                        prop_value_is_array = True,
 		                    prop_array_is_unordered = True)
+		self._touch()
 
 		if value is not None:
 			self.update(value)
@@ -1588,6 +2738,34 @@ class XMPSet(XMPElement, ContainerMixin, collections.MutableSet):
 	def children(self):
 		return self._children
 
+	def iterchildren(self):
+		""" Returns an iterator over children. """
+		return iter(self._children)
+
+	def _attach(self, child):
+		""" Adds an element already existing in the XMP packet. """
+		self._children.add(child)
+
+	def _replace(self, old_child, new_child):
+		"""
+		Replaces a child in the object tree only, leaving the XMP packet untouched.
+
+		Either child may be None, to add or remove a child.
+		"""
+		if old_child is not None:
+			self._children.discard(old_child)
+		if new_child is not None:
+			self._children.add(new_child)
+
+	def _child(self, step):
+		if isinstance(step, (int, long)):
+			child_address = appendStep(self.address, step)
+			return next((c for c in self._children if c.address == child_address), None)
+		return None
+
+	def _deleteChild(self, step):
+		self.discard(self._child(step).name)
+
 	# ──────────────
 	# MutableSet API
 
@@ -1608,9 +2786,10 @@ class XMPSet(XMPElement, ContainerMixin, collections.MutableSet):
 		new_element = XMPElement.fromValue(self.namespace,
 		                                   self.absoluteAddress("[%s]"%xmp_index),
 		                                   value)
-		self.libxmp_metadata.append_array_item(schema_ns  = self.namespace.uid,
+		self._libxmp_metadata.append_array_item(schema_ns  = self.namespace.uid,
 		                                       array_name = self.address,
 		                                       item_value = None)
+		self._touch()
 		new_element._create(value)
 		self._children.add(new_element)
 
@@ -1618,6 +2797,10 @@ class XMPSet(XMPElement, ContainerMixin, collections.MutableSet):
 		element_to_delete = next(c for c in self.children if c.name == key)
 		element_to_delete.__delete__()
 		self._children.discard(element_to_delete)
+		# libxmp moved the following items down by one index
+		for child in self._children:
+			if child.index > element_to_delete.index:
+				child._move(appendStep(self.address, child.index - 1))
 
 	# Note: the following methods are automatically implemented as mixin methods
 	#       using the MutableSet ABC:
@@ -1645,14 +2828,18 @@ class XMPSet(XMPElement, ContainerMixin, collections.MutableSet):
 	# Textualization
 
 	def __str__(self):
-		children_strings = "\n".join(["* "+str(c).replace("\n", "\n  ")
-		                              for c in self.children])
-		return self.name + " {\n    " + children_strings.replace("\n", "\n    ") + "\n}"
+		return unicode(self).encode("utf-8")
 
 	def __unicode__(self):
-		children_strings = "\n".join([u"• "+unicode(c).replace("\n", "\n  ")
-		                              for c in self.children])
-		return self.name + " {\n    " + children_strings.replace("\n", "\n    ") + "\n}"
+		return textualize(self)
+
+	def textualize(self, stream, first = u"", rest = u"", values = None):
+		writeLines(stream, self.name + u" {", first, rest)
+		if not self._children:
+			stream.write(rest + ARRAY_INDENT + u"\n")
+		for child in self.iterchildren():
+			child.textualize(stream, rest + SET_ITEM_INDENT, rest + ITEM_INDENT, values)
+		stream.write(rest + u"}\n")
 
 class XMPValue(XMPElement):
 	""" Convenience wrapper around libXMP to manipulate an XMP value. """
@@ -1669,7 +2856,7 @@ class XMPValue(XMPElement):
 
 	@property
 	def desynchronized(self):
-		return not self.libxmp_metadata.does_property_exist(schema_ns = self.namespace.uid,
+		return not self._libxmp_metadata.does_property_exist(schema_ns = self.namespace.uid,
 		                                                    prop_name = self.address)
 
 	# ────────────────────
@@ -1696,7 +2883,7 @@ class XMPValue(XMPElement):
 	@property
 	def value(self):
 		try:
-			value = self.libxmp_metadata.get_property(schema_ns = self.namespace.uid,
+			value = self._libxmp_metadata.get_property(schema_ns = self.namespace.uid,
 			                                          prop_name = self.address)
 			if value:
 				return value
@@ -1711,9 +2898,10 @@ class XMPValue(XMPElement):
 		elif not isinstance(value, basestring):
 			value = unicode(value)
 
-		self.libxmp_metadata.set_property(schema_ns = self.namespace.uid,
+		self._libxmp_metadata.set_property(schema_ns = self.namespace.uid,
 		                                  prop_name = self.address,
 		                                 prop_value = value)
+		self._touch()
 
 	# ───────────────────
 	# Descriptor protocol
@@ -1722,9 +2910,10 @@ class XMPValue(XMPElement):
 		if not isinstance(value, basestring):
 			value = unicode(value)
 
-		self.libxmp_metadata.set_property(schema_ns = self.namespace.uid,
+		self._libxmp_metadata.set_property(schema_ns = self.namespace.uid,
 		                                  prop_name = self.address,
 		                                 prop_value = value)
+		self._touch()
 
 	# ──────────────
 	# Textualization
@@ -1737,4 +2926,11 @@ class XMPValue(XMPElement):
 			return self.name + " = " + str(self.value)
 
 	def __unicode__(self):
-		return self.name + " = " + unicode(self.value)
+		return textualize(self)
+
+	def textualize(self, stream, first = u"", rest = u"", values = None):
+		if values is not None and self.address in values:
+			value = values[self.address]
+		else:
+			value = self.value
+		writeLines(stream, self.name + u" = " + unicode(value or u""), first, rest)